@@ -1,15 +1,31 @@
-from flask import Flask, request, jsonify, send_file, render_template
-import sqlite3
+from flask import Flask, request, jsonify, send_file, render_template, make_response, Response, g, has_app_context
+from urllib.parse import urlencode
 import os
 from PIL import Image
 import io
-import requests
+import json
+import base64
+import hashlib
 from dotenv import load_dotenv
 from logger import get_logger, configure_from_env
+from db_pool import ConnectionPool
+from dimensions import DimensionCache
+from facet_index import CharFacetIndex
+from search_index import GlyphSearchIndex
+from thumb_cache import TieredThumbnailCache, thumbnail_key
+from thumb_store import ThumbStore
+from http_client import ImageHttpClient
+from download_engine import DownloadEngine
+from singleflight import SingleFlight
+from render_pool import create_render_backend, normalize_quality, DEFAULT_QUALITY
+from png_stream import stream_png
+from layout import GridLayout, parse_cols
+from export_encoding import resolve_encoding
+from export_cache import ExportCache, export_cache_key
+from prefetch import PrefetchQueue, PRIORITY_FIRST, PRIORITY_VARIANT
+from export_jobs import ExportJobManager, JobQueueFull, STAGE_DOWNLOADING, STAGE_COMPOSING, STAGE_ENCODING
 import time
 from collections import OrderedDict
-import concurrent.futures
-import threading
 from functools import lru_cache
 
 # 加载环境变量
@@ -68,41 +84,130 @@ class ImageCache:
 # 创建全局图片缓存实例
 image_cache = ImageCache()
 
-# 图片内容缓存（内存缓存，用于缓存已下载的图片内容）
-_image_content_cache = {}
-_image_content_cache_lock = threading.Lock()
+# 搜索结果总数缓存，数据库运行期间只读，同一查询条件的总数不会变化
+search_count_cache = ImageCache(max_size=2000, expire_time=600)
 
-def download_and_process_image(img_id, url, target_size=(120, 120)):
-    """下载并处理单张图片，支持缓存"""
+# 缩略图缓存：按字节数限制的内存LRU + 磁盘内容寻址存储，键包含图片ID和目标尺寸
+thumbnail_cache = TieredThumbnailCache()
+
+# 预生成的缩略图存储（tools/build_thumbs.py 构建），导出时直接读取像素，不访问源站
+thumb_store = ThumbStore()
+
+# 共享的图片下载客户端：按源站复用长连接，限制并发，并对磁盘上的原图副本做条件请求
+http_client = ImageHttpClient()
+
+# 进程级下载引擎：所有导出请求共享全局并发上限，按批次轮转调度
+download_engine = DownloadEngine()
+# 一次导出等待下载完成的最长时间（秒）
+EXPORT_DOWNLOAD_TIMEOUT = int(os.environ.get('MOTU_EXPORT_DOWNLOAD_TIMEOUT', 120))
+# 有图片下载失败、以占位图代替的导出和雪碧图：不写入缓存，也不允许浏览器和代理缓存，
+# 源站恢复后重新请求即可得到完整的图片
+DEGRADED_CACHE_CONTROL = "no-store"
+
+# 达到这个字数的导出通过 /api/export_jobs 在后台执行，更小的导出仍同步返回
+EXPORT_ASYNC_MIN = int(os.environ.get('MOTU_EXPORT_ASYNC_MIN', 100))
+# 后台导出任务等待下载完成的最长时间（秒）
+EXPORT_JOB_DOWNLOAD_TIMEOUT = int(os.environ.get('MOTU_EXPORT_JOB_TIMEOUT', 600))
+
+# 合并对同一缩略图的并发下载：常用字被多个导出同时请求时只下载、缩放一次
+image_flight = SingleFlight()
+
+# 缩略图渲染后端：thread 在请求线程中解码缩放，process 交给进程池利用多核
+render_backend = create_render_backend()
+
+# 导出结果缓存：相同排版的导出直接返回磁盘上的文件，并支持 ETag 条件请求
+export_cache = ExportCache()
+
+# 后台导出任务：大型导出提交后立即返回任务ID，由有上限的线程池执行
+export_jobs = ExportJobManager()
+
+# 搜索结果雪碧图缓存：图片存在磁盘上（与导出缓存同样的LRU字节上限），坐标映射存在内存中
+sprite_cache = ExportCache(
+    root=os.environ.get('MOTU_SPRITE_CACHE_DIR', os.path.join("cache", "sprites")),
+    max_bytes=int(os.environ.get('MOTU_SPRITE_CACHE_MB', 128)) * 1024 * 1024)
+sprite_map_cache = ImageCache(max_size=1000, expire_time=600)
+
+# /thumb/<图片ID> 返回的编码后缩略图文件，与导出缓存同样按字节数做LRU淘汰
+thumb_file_cache = ExportCache(
+    root=os.environ.get('MOTU_THUMB_FILE_CACHE_DIR', os.path.join("cache", "thumbfiles")),
+    max_bytes=int(os.environ.get('MOTU_THUMB_FILE_CACHE_MB', 256)) * 1024 * 1024)
+
+def _load_thumbnail(img_id, url, target_size, quality, on_fetched=None, speculative=False):
+    """下载原图并缩放为缩略图，返回 PixelBuffer；由 image_flight 保证同一缩略图同时只处理一次
+
+    speculative 为 True 表示后台预取，写入缓存的条目在被读取之前计为“预取未使用”。
+    """
+    # 排队期间其他调用可能已经写入了缓存
+    cached = thumbnail_cache.get(img_id, target_size, quality, speculative)
+    if cached is not None:
+        return cached
+
+    # 下载图片
+    logger.debug(f"下载图片ID {img_id}: {url}")
+    content = http_client.fetch(url)
+    if on_fetched is not None:
+        on_fetched()
+
+    # 解码并缩放（按配置在当前线程或进程池中执行）
+    buf = render_backend.render(content, target_size, quality)
+
+    # 写入缩略图缓存
+    thumbnail_cache.put(img_id, target_size, buf, quality, speculative)
+    logger.debug(f"缩略图已缓存: {img_id}")
+    return buf
+
+def download_and_process_image(img_id, url, target_size=(120, 120), quality=DEFAULT_QUALITY, progress=None):
+    """下载并处理单张图片，支持缓存；quality 为质量档位（preview 或 print）
+
+    progress 为导出任务时，在原图就绪和缩放完成时分别调用它的 fetched() 和 image_ready()。
+    """
     try:
-        # 检查内存缓存
-        cache_key = f"img_content_{img_id}"
-        with _image_content_cache_lock:
-            if cache_key in _image_content_cache:
-                logger.debug(f"从内存缓存获取图片内容: {img_id}")
-                cached_img = _image_content_cache[cache_key]
-                return cached_img.copy()  # 返回副本避免修改原图
-        
-        # 下载图片
-        logger.debug(f"下载图片ID {img_id}: {url}")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        # 处理图片
-        img = Image.open(io.BytesIO(response.content)).convert("RGBA")
-        img = img.resize(target_size, Image.LANCZOS)
-        
-        # 缓存到内存（限制缓存大小）
-        with _image_content_cache_lock:
-            if len(_image_content_cache) < 200:  # 限制缓存大小
-                _image_content_cache[cache_key] = img.copy()
-                logger.debug(f"图片内容已缓存: {img_id}")
-        
-        return img
+        # 预生成的缩略图存储：内存映射读取，无需下载和解码（按最高质量档位生成，适用于所有档位）
+        buf = thumb_store.get(img_id, target_size)
+        if buf is None:
+            # 检查缩略图缓存（内存 -> 磁盘）
+            buf = thumbnail_cache.get(img_id, target_size, quality)
+            if buf is not None:
+                logger.debug(f"从缓存获取缩略图: {img_id}")
+        if buf is not None:
+            if progress is not None:
+                progress.fetched()
+                progress.image_ready()
+            return buf.to_image()
+
+        # 同一张图片同一尺寸正在处理时，等待它的结果而不是重复下载
+        key = thumbnail_key(img_id, target_size, quality)
+        if progress is None:
+            buf = image_flight.do(key, _load_thumbnail, img_id, url, target_size, quality)
+            return buf.to_image()
+        fetched = []
+        def on_fetched():
+            fetched.append(True)
+            progress.fetched()
+        buf = image_flight.do(key, _load_thumbnail, img_id, url, target_size, quality, on_fetched)
+        if not fetched:
+            # 与其他调用合并时，原图由执行者下载
+            progress.fetched()
+        progress.image_ready()
+        return buf.to_image()
     except Exception as e:
         logger.warning(f"下载图片ID {img_id} 失败: {e}")
         return None
 
+def _prefetch_thumbnail(img_id, url, target_size, quality):
+    """后台预取一张缩略图：已在存储或缓存中时跳过，否则与导出共用单飞下载"""
+    if thumb_store.get(img_id, target_size) is not None:
+        return
+    if thumbnail_cache.get(img_id, target_size, quality, speculative=True) is not None:
+        return
+    key = thumbnail_key(img_id, target_size, quality)
+    image_flight.do(key, _load_thumbnail, img_id, url, target_size, quality, None, True)
+
+# 生成集字后在后台预取将要导出的图片；导出进行时让路。
+# 压力信号是预取后尚未被使用的缩略图占内存层的比例，而不是内存层的使用率：
+# LRU 装满是常态，只有预取的条目堆积而没人使用时才说明预取在挤占有用的缩略图
+prefetcher = PrefetchQueue(_prefetch_thumbnail, pressure=lambda: thumbnail_cache.memory.unused_ratio())
+
 def get_placeholder_image(target_size=(120, 120)):
     """获取占位图"""
     placeholder_path = os.path.join(app.static_folder, "placeholder.png")
@@ -114,11 +219,33 @@ def get_placeholder_image(target_size=(120, 120)):
         img = Image.new("RGBA", target_size, (200, 200, 200, 255))
         return img
 
+# 数据库连接池，连接长期存活并复用，conn.close() 会把连接归还到池中；
+# MOTU_DB_IN_MEMORY=true 时启动即把数据库加载到内存，文件变化后在后台重新加载
+db_pool = ConnectionPool(DB_PATH)
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = db_pool.acquire()
+    if has_app_context():
+        # 记录本次请求借出的连接，请求结束时归还调用方因出错未能归还的连接
+        g.setdefault("_db_leases", []).append(conn)
     return conn
 
+@app.teardown_appcontext
+def release_db_connections(exc):
+    """请求结束时归还本请求中尚未归还的数据库连接，已归还的会被忽略"""
+    for conn in g.pop("_db_leases", []):
+        conn.close()
+
+# 维度表（字体、书法家、典籍）缓存，连接池的数据版本变化时自动重新加载
+dimension_cache = DimensionCache(get_db, lambda: db_pool.data_version())
+
+# 单字分面索引（每个字的书法家、典籍及字形数量），跟随维度表缓存一起失效
+char_facet_index = CharFacetIndex(get_db, dimension_cache)
+
+# 可选的内存搜索索引（MOTU_SEARCH_INDEX=true），启用时搜索不再查询 glyphs 表，禁用时使用 SQL
+search_index = GlyphSearchIndex(get_db, dimension_cache)
+search_index.warm()
+
 # 首页
 @app.route("/")
 def index():
@@ -169,13 +296,15 @@ def settings():
 # 获取下拉选项
 @app.route("/api/options")
 def api_options():
-    logger.debug("api_options函数被调用，使用的是修改后的代码")
-    conn = get_db()
-    fonts = [row["name"] for row in conn.execute("SELECT name FROM fonts ORDER BY name").fetchall()]
-    authors = [row["name"] for row in conn.execute("SELECT name FROM authors ORDER BY name").fetchall()]
-    books = [row["title"] for row in conn.execute("SELECT title FROM books ORDER BY title").fetchall()]
-    conn.close()
-    return jsonify({"fonts": fonts, "authors": authors, "books": books})
+    dims = dimension_cache.get()
+    if request.if_none_match.contains(dims.etag):
+        logger.debug("下拉选项未变化，返回304")
+        response = make_response("", 304)
+    else:
+        response = jsonify(dims.options)
+    response.set_etag(dims.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # 获取特定字符的书法家和典籍选项
 @app.route("/api/char_options")
@@ -185,53 +314,21 @@ def char_options():
     if not han:
         return jsonify({"authors": [], "books": []})
     
-    conn = get_db()
-    
-    # 获取该字符的所有书法家
-    authors_query = """
-        SELECT DISTINCT a.name 
-        FROM glyphs g 
-        LEFT JOIN authors a ON g.author_id = a.id 
-        WHERE g.han = ? AND a.name IS NOT NULL 
-        ORDER BY a.name
-    """
-    authors = [row["name"] for row in conn.execute(authors_query, (han,)).fetchall()]
+    # 从预先计算的分面索引中查找，同时返回每个书法家、典籍的字形数量
+    facets = char_facet_index.get(han)
     
-    # 获取该字符的所有典籍
-    books_query = """
-        SELECT DISTINCT b.title 
-        FROM glyphs g 
-        LEFT JOIN books b ON g.book_id = b.id 
-        WHERE g.han = ? AND b.title IS NOT NULL 
-        ORDER BY b.title
-    """
-    books = [row["title"] for row in conn.execute(books_query, (han,)).fetchall()]
+    logger.debug(f"字符 '{han}' 的书法家数量: {len(facets.authors)}, 典籍数量: {len(facets.books)}")
     
-    conn.close()
-    
-    logger.debug(f"字符 '{han}' 的书法家数量: {len(authors)}, 典籍数量: {len(books)}")
-    
-    return jsonify({"authors": authors, "books": books})
+    return jsonify(facets.to_dict())
 
-# 搜索接口
-@app.route("/api/search")
-def search():
-    han = request.args.get("han", "").strip()
-    font = request.args.get("font", "").strip()
-    author = request.args.get("author", "").strip()
-    book = request.args.get("book", "").strip()
-    page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 20))
+# 名称在维度表中不存在时使用的ID，不会匹配任何字形
+UNKNOWN_DIMENSION_ID = -1
 
-    # 添加调试日志
-    logger.info(f"收到/api/search请求")
-    logger.debug(f"- han: {han}")
-    logger.debug(f"- font: {font}")
-    logger.debug(f"- author: {author}")
-    logger.debug(f"- book: {book}")
-    # 添加获取所有结果的参数
-    get_all = request.args.get("all", "false").lower() == "true"
+def _build_search_filters(han, font, author, book, dims):
+    """根据搜索条件构建WHERE子句和参数
 
+    字体、书法家、典籍名称通过维度表缓存翻译为ID，直接过滤glyphs表的列。
+    """
     where_clauses = []
     params = []
 
@@ -247,61 +344,453 @@ def search():
             where_clauses.append(f"g.han IN ({placeholders})")
             params.extend(han_chars)
     if font:
-        where_clauses.append("f.name = ?")
-        params.append(font)
+        where_clauses.append("g.font_id = ?")
+        params.append(dims.font_ids.get(font, UNKNOWN_DIMENSION_ID))
     if author:
-        where_clauses.append("a.name = ?")
-        params.append(author)
+        where_clauses.append("g.author_id = ?")
+        params.append(dims.author_ids.get(author, UNKNOWN_DIMENSION_ID))
     if book:
-        where_clauses.append("b.title = ?")
-        params.append(book)
+        where_clauses.append("g.book_id = ?")
+        params.append(dims.book_ids.get(book, UNKNOWN_DIMENSION_ID))
+
+    return where_clauses, params
+
+def _index_filters(han, font, author, book, dims):
+    """把搜索条件翻译为内存索引的查询参数"""
+    return {
+        "hans": list(han) if han else None,
+        "font_id": dims.font_ids.get(font, UNKNOWN_DIMENSION_ID) if font else None,
+        "author_id": dims.author_ids.get(author, UNKNOWN_DIMENSION_ID) if author else None,
+        "book_id": dims.book_ids.get(book, UNKNOWN_DIMENSION_ID) if book else None,
+    }
+
+def _glyph_row_to_dict(row, dims):
+    """把glyphs表的一行翻译为带名称的结果"""
+    return {
+        "id": row["id"],
+        "han": row["han"],
+        "font": dims.font_names.get(row["font_id"]),
+        "author": dims.author_names.get(row["author_id"]),
+        "book_title": dims.book_titles.get(row["book_id"]),
+    }
+
+def _search_filter_hash(han, font, author, book):
+    """计算搜索条件的哈希，用于游标校验和总数缓存"""
+    raw = json.dumps([han, font, author, book], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def _encode_cursor(last_id, filter_hash):
+    """生成不透明的分页游标"""
+    raw = json.dumps({"id": last_id, "h": filter_hash}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor, filter_hash):
+    """解析分页游标，返回上一页最后一个字形ID；游标无效或与查询条件不匹配时抛出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = int(data["id"])
+        cursor_hash = data["h"]
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if cursor_hash != filter_hash:
+        raise ValueError("分页游标与查询条件不匹配")
+    return last_id
+
+def _count_search_results(cur, where_sql, params, filter_hash, version):
+    """统计搜索结果总数，结果按数据库版本和查询条件缓存"""
+    cache_key = f"search_count_{version}_{filter_hash}"
+    total = search_count_cache.get(cache_key)
+    if total is None:
+        cur.execute(f"SELECT COUNT(*) FROM glyphs g {where_sql}", params)
+        total = cur.fetchone()[0]
+        search_count_cache.set(cache_key, total)
+    else:
+        logger.debug(f"从缓存获取搜索总数: {total}")
+    return total
 
-    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+def _query_search_page(conn, dims, han, font, author, book, page, per_page, cursor, with_count=True):
+    """按 /api/search 的分页规则查询一页结果，返回 (结果列表, 总数, 下一页游标)
 
-    conn = get_db()
+    cursor 为 None 时按 page/OFFSET 分页，否则按游标分页（空字符串表示第一页）。
+    游标无效时抛出 ValueError。
+    """
+    filter_hash = _search_filter_hash(han, font, author, book)
+
+    last_id = None
+    if cursor:
+        last_id = _decode_cursor(cursor, filter_hash)
+
+    if search_index.enabled:
+        # 内存索引：交集、精确总数和分页都在内存中完成
+        filters = _index_filters(han, font, author, book, dims)
+        next_cursor = None
+        if cursor is not None:
+            rows, total = search_index.query(**filters, limit=per_page + 1, after_id=last_id)
+            if len(rows) > per_page:
+                rows = rows[:per_page]
+                next_cursor = _encode_cursor(rows[-1]["id"], filter_hash)
+        else:
+            rows, total = search_index.query(**filters, offset=(page - 1) * per_page, limit=per_page)
+        results = [_glyph_row_to_dict(row, dims) for row in rows]
+        return results, total if with_count else None, next_cursor
+
+    where_clauses, params = _build_search_filters(han, font, author, book, dims)
     cur = conn.cursor()
 
     # 统计总数
-    cur.execute(f"SELECT COUNT(*) FROM glyphs g LEFT JOIN fonts f ON g.font_id = f.id LEFT JOIN authors a ON g.author_id = a.id LEFT JOIN books b ON g.book_id = b.id {where_sql}", params)
-    total = cur.fetchone()[0]
+    total = None
+    if with_count:
+        count_where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        total = _count_search_results(cur, count_where_sql, params, filter_hash, dims.version)
+
+    if last_id is not None:
+        where_clauses = where_clauses + ["g.id > ?"]
+        params = params + [last_id]
+    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
 
-    # 查询数据
+    # 查询数据，名称由维度表缓存翻译，不再JOIN维度表
     query_sql = f"""
-        SELECT g.id, g.han, f.name AS font, a.name AS author, b.title AS book_title
+        SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
         FROM glyphs g
-        LEFT JOIN fonts f ON g.font_id = f.id
-        LEFT JOIN authors a ON g.author_id = a.id
-        LEFT JOIN books b ON g.book_id = b.id
         {where_sql}
         ORDER BY g.id
     """
 
-    if get_all:
-        # 获取所有结果
-        cur.execute(query_sql, params)
-        results = [dict(row) for row in cur.fetchall()]
-        per_page = total  # 设置每页数量为总数
+    next_cursor = None
+    if cursor is not None:
+        # 游标分页，多取一条判断是否还有下一页
+        cur.execute(query_sql + " LIMIT ?", params + [per_page + 1])
+        results = [_glyph_row_to_dict(row, dims) for row in cur.fetchall()]
+        if len(results) > per_page:
+            results = results[:per_page]
+            next_cursor = _encode_cursor(results[-1]["id"], filter_hash)
     else:
         # 分页查询
         offset = (page - 1) * per_page
         cur.execute(query_sql + " LIMIT ? OFFSET ?", params + [per_page, offset])
-        results = [dict(row) for row in cur.fetchall()]
+        results = [_glyph_row_to_dict(row, dims) for row in cur.fetchall()]
 
-    conn.close()
+    return results, total, next_cursor
 
-    return jsonify({
+def _search_facets(conn, dims, han, font, author, book):
+    """当前搜索条件下各字体、书法家、典籍的字形数量，返回 {"fonts": {名称: 数量}, ...}
+
+    每个维度的计数不应用它自己的条件，下拉框可以显示切换到其他取值后的结果数。
+    启用内存索引时由位图交集计算，否则每个维度一条 GROUP BY 查询，结果按条件缓存。
+    """
+    if search_index.enabled:
+        counts = search_index.facet_counts(**_index_filters(han, font, author, book, dims))
+    else:
+        cache_key = f"search_facets_{dims.version}_{_search_filter_hash(han, font, author, book)}"
+        counts = search_count_cache.get(cache_key)
+        if counts is None:
+            counts = {}
+            for name, column in (("font", "font_id"), ("author", "author_id"), ("book", "book_id")):
+                where_clauses, params = _build_search_filters(
+                    han,
+                    "" if name == "font" else font,
+                    "" if name == "author" else author,
+                    "" if name == "book" else book,
+                    dims)
+                where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+                rows = conn.execute(
+                    f"SELECT g.{column}, COUNT(*) FROM glyphs g {where_sql} GROUP BY g.{column}", params)
+                counts[name] = {row[0]: row[1] for row in rows if row[0] is not None}
+            search_count_cache.set(cache_key, counts)
+
+    facets = {}
+    for key, name, names in (("fonts", "font", dims.font_names),
+                             ("authors", "author", dims.author_names),
+                             ("books", "book", dims.book_titles)):
+        # 不同 id 的记录可能同名，按名称累加，避免互相覆盖
+        named = {}
+        for id_, n in counts[name].items():
+            if id_ in names and n:
+                named[names[id_]] = named.get(names[id_], 0) + n
+        facets[key] = named
+    return facets
+
+def _attach_images(conn, results):
+    """在每条搜索结果中附带该字形的全部图片URL和图片ID"""
+    images_by_glyph = _fetch_images_for_glyphs(conn, [r["id"] for r in results])
+    for r in results:
+        rows = images_by_glyph[r["id"]]
+        r["image_urls"] = [url for _, url in rows]
+        r["image_ids"] = [image_id for image_id, _ in rows]
+
+# 搜索接口每页最多的结果数（all=true 时不受限制）
+MAX_SEARCH_PER_PAGE = 200
+
+# 搜索接口
+@app.route("/api/search")
+def search():
+    han = request.args.get("han", "").strip()
+    font = request.args.get("font", "").strip()
+    author = request.args.get("author", "").strip()
+    book = request.args.get("book", "").strip()
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", 20)), 1), MAX_SEARCH_PER_PAGE)
+    except ValueError:
+        return jsonify({"error": "page 和 per_page 必须是整数"}), 400
+    # 游标分页：传入cursor参数（第一页传空字符串）时按 g.id > ? 定位，不再使用OFFSET
+    cursor = request.args.get("cursor")
+    # 是否统计总数，总数按查询条件缓存
+    with_count = request.args.get("count", "true").lower() != "false"
+    # 是否在每条结果中直接附带图片URL，省去逐个请求 /images/<id>
+    with_images = request.args.get("with_images", "false").lower() == "true"
+    # 是否同时返回当前条件下各字体、书法家、典籍的字形数量
+    with_facets = request.args.get("facets", "false").lower() == "true"
+
+    # 添加调试日志
+    logger.info(f"收到/api/search请求")
+    logger.debug(f"- han: {han}")
+    logger.debug(f"- font: {font}")
+    logger.debug(f"- author: {author}")
+    logger.debug(f"- book: {book}")
+    # 添加获取所有结果的参数
+    get_all = request.args.get("all", "false").lower() == "true"
+
+    dims = dimension_cache.get()
+    conn = get_db()
+    try:
+        next_cursor = None
+        if get_all and search_index.enabled:
+            rows, total = search_index.query(**_index_filters(han, font, author, book, dims))
+            results = [_glyph_row_to_dict(row, dims) for row in rows]
+            per_page = total  # 设置每页数量为总数
+        elif get_all:
+            # 获取所有结果
+            where_clauses, params = _build_search_filters(han, font, author, book, dims)
+            where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            cur = conn.cursor()
+            total = _count_search_results(cur, where_sql, params, _search_filter_hash(han, font, author, book),
+                                          dims.version)
+            cur.execute(f"""
+                SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
+                FROM glyphs g
+                {where_sql}
+                ORDER BY g.id
+            """, params)
+            results = [_glyph_row_to_dict(row, dims) for row in cur.fetchall()]
+            per_page = total  # 设置每页数量为总数
+        else:
+            try:
+                results, total, next_cursor = _query_search_page(
+                    conn, dims, han, font, author, book, page, per_page, cursor, with_count)
+            except ValueError as e:
+                logger.warning(f"分页游标错误: {e}")
+                return jsonify({"error": str(e)}), 400
+
+        if with_images and results:
+            _attach_images(conn, results)
+        facets = _search_facets(conn, dims, han, font, author, book) if with_facets else None
+    finally:
+        conn.close()
+
+    response = {
         "total": total,
         "per_page": per_page,
         "results": results
-    })
+    }
+    if facets is not None:
+        response["facets"] = facets
+    if cursor is not None and not get_all:
+        response["next_cursor"] = next_cursor
+    return jsonify(response)
+
+
+# 雪碧图参数：单字边长可选值、每行字数、一页最多的字数
+SPRITE_CELL_SIZES = (60, 120, 240)
+SPRITE_DEFAULT_CELL = 120
+SPRITE_COLS = 10
+MAX_SPRITE_CELLS = 200
+
+def _sprite_page():
+    """按 /api/search 的参数查询一页结果并计算雪碧图坐标，返回 (页面数据, 缓存键, 编码设置)
+
+    页面数据按查询条件、分页位置、单字尺寸和编码缓存在内存中。参数无效时抛出 ValueError。
+    """
+    han = request.args.get("han", "").strip()
+    font = request.args.get("font", "").strip()
+    author = request.args.get("author", "").strip()
+    book = request.args.get("book", "").strip()
+    page = max(int(request.args.get("page", 1)), 1)
+    per_page = min(max(int(request.args.get("per_page", 20)), 1), MAX_SPRITE_CELLS)
+    cursor = request.args.get("cursor")
+    cell = int(request.args.get("size", SPRITE_DEFAULT_CELL))
+    if cell not in SPRITE_CELL_SIZES:
+        raise ValueError(f"size 只能是 {', '.join(str(c) for c in SPRITE_CELL_SIZES)}")
+    encoding = resolve_encoding(request.args.get("format", "webp"), request.args.get("preset", "fast"))
+
+    dims = dimension_cache.get()
+    raw = json.dumps([dims.version, han, font, author, book, page, per_page, cursor, cell, encoding.name],
+                     ensure_ascii=False)
+    key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    payload = sprite_map_cache.get(key)
+    if payload is not None:
+        return payload, key, encoding
+
+    conn = get_db()
+    try:
+        results, total, next_cursor = _query_search_page(
+            conn, dims, han, font, author, book, page, per_page, cursor)
+        if results:
+            _attach_images(conn, results)
+    finally:
+        conn.close()
+
+    layout = GridLayout(len(results), SPRITE_COLS, "horizontal", (cell, cell))
+    for r, position in zip(results, layout.positions):
+        # 没有图片的字形在雪碧图中留空
+        r["sprite_xy"] = list(position) if r["image_ids"] else None
+    width, height = layout.size if results else (0, 0)
+    payload = {
+        "total": total,
+        "per_page": per_page,
+        "results": results,
+        "sprite": {
+            "cell": cell,
+            "cols": layout.grid_cols,
+            "rows": layout.grid_rows,
+            "width": width,
+            "height": height,
+            "format": encoding.format,
+        },
+    }
+    if cursor is not None:
+        payload["next_cursor"] = next_cursor
+    sprite_map_cache.set(key, payload)
+    return payload, key, encoding
+
+def _render_sprite(payload, encoding):
+    """下载一页结果的第一张图片并拼成雪碧图，返回 (编码后的字节串, 以占位图代替的图片数)"""
+    cell = payload["sprite"]["cell"]
+    results = payload["results"]
+    target_size = (cell, cell)
+    # 页面预览使用 preview 档位
+    jobs = [(download_and_process_image, (r["image_ids"][0], r["image_urls"][0], target_size, "preview"))
+            for r in results if r["image_ids"]]
+    batch = download_engine.submit(jobs)
+    try:
+        # 超时未完成的图片按下载失败处理，以占位图代替
+        downloaded = batch.wait_partial(timeout=EXPORT_DOWNLOAD_TIMEOUT)
+    finally:
+        batch.cancel()
+
+    layout = GridLayout(len(results), SPRITE_COLS, "horizontal", target_size)
+    canvas = Image.new("RGBA", layout.size, (255, 255, 255, 0))
+    downloaded_iter = iter(downloaded)
+    failed = 0
+    for r, position in zip(results, layout.positions):
+        if not r["image_ids"]:
+            continue
+        img = next(downloaded_iter)
+        if img is None:
+            failed += 1
+            img = get_placeholder_image(target_size)
+        canvas.paste(img, position)
+    return encoding.encode(canvas), failed
+
+@app.route("/api/search/sprite")
+def search_sprite():
+    """与 /api/search 相同的参数，返回一页结果、雪碧图地址和每个字在雪碧图中的坐标
+
+    额外参数：size（单字边长，60/120/240）、format、preset（雪碧图编码，默认 webp/fast）。
+    页面上所有字的缩略图只需要一次图片请求。
+    """
+    try:
+        payload, key, _ = _sprite_page()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = dict(payload)
+    sprite = dict(payload["sprite"])
+    if payload["results"]:
+        query = [(k, v) for k, v in request.args.items(multi=True) if k != "v"]
+        sprite["url"] = "/api/search/sprite/image?" + urlencode(query + [("v", key[:16])])
+    else:
+        sprite["url"] = None
+    response["sprite"] = sprite
+    if request.args.get("facets", "false").lower() == "true":
+        conn = get_db()
+        try:
+            response["facets"] = _search_facets(
+                conn, dimension_cache.get(),
+                *(request.args.get(name, "").strip() for name in ("han", "font", "author", "book")))
+        finally:
+            conn.close()
+    return jsonify(response)
 
+@app.route("/api/search/sprite/image")
+def search_sprite_image():
+    """返回一页搜索结果的雪碧图，按查询条件和分页缓存，支持 ETag 条件请求"""
+    try:
+        payload, key, encoding = _sprite_page()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not payload["results"]:
+        return jsonify({"error": "没有搜索结果"}), 404
+
+    entry = sprite_cache.get(key)
+    if entry is None:
+        start_time = time.perf_counter()
+        body, failed = _render_sprite(payload, encoding)
+        logger.info(f"雪碧图已生成: {len(payload['results'])} 个字，耗时 {time.perf_counter() - start_time:.2f} 秒")
+        if failed:
+            # 含有占位图的雪碧图不缓存，浏览器和代理也不能缓存，源站恢复后重新生成
+            logger.warning(f"雪碧图中有 {failed} 张图片下载失败，以占位图代替，结果不缓存")
+            response = send_file(io.BytesIO(body), mimetype=encoding.mimetype)
+            response.headers["Cache-Control"] = DEGRADED_CACHE_CONTROL
+            response.headers["X-Sprite-Missing-Images"] = str(failed)
+            return response
+        entry = sprite_cache.put(key, body, encoding.extension)
+        if entry is None:
+            # 雪碧图缓存被禁用时直接返回
+            response = send_file(io.BytesIO(body), mimetype=encoding.mimetype)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+    if request.if_none_match.contains(entry.etag):
+        response = make_response("", 304)
+    else:
+        response = send_file(entry.path, mimetype=encoding.mimetype, conditional=False)
+    response.set_etag(entry.etag)
+    if request.args.get("v") == key[:16]:
+        # 地址中带有版本号，数据库变化后地址随之变化
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# 批量查询图片时每条SQL最多绑定的参数数量，低于旧版SQLite的999个变量限制
+IMAGE_LOOKUP_CHUNK = 500
+# 批量图片接口一次最多接受的字形ID数量
+MAX_BATCH_GLYPH_IDS = 1000
+
+def _fetch_images_for_glyphs(conn, glyph_ids):
+    """一次查询多个字形的全部图片，返回 {glyph_id: [(image_id, url), ...]}"""
+    images_by_glyph = {glyph_id: [] for glyph_id in glyph_ids}
+    unique_ids = list(images_by_glyph)
+    for start in range(0, len(unique_ids), IMAGE_LOOKUP_CHUNK):
+        chunk = unique_ids[start:start + IMAGE_LOOKUP_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT glyph_id, id, url FROM images WHERE glyph_id IN ({placeholders}) ORDER BY glyph_id, id",
+            chunk).fetchall()
+        for row in rows:
+            images_by_glyph[row["glyph_id"]].append((row["id"], row["url"]))
+    return images_by_glyph
 
 # 图片接口 - 返回单个图片
 @app.route("/image/<int:glyph_id>")
 def image(glyph_id):
     conn = get_db()
-    row = conn.execute("SELECT url FROM images WHERE glyph_id = ? LIMIT 1", (glyph_id,)).fetchone()
-    conn.close()
+    try:
+        row = conn.execute("SELECT url FROM images WHERE glyph_id = ? LIMIT 1", (glyph_id,)).fetchone()
+    finally:
+        conn.close()
 
     if row:
         # 直接返回图片URL，让客户端自行下载
@@ -312,14 +801,150 @@ def image(glyph_id):
 @app.route("/images/<int:glyph_id>")
 def images(glyph_id):
     conn = get_db()
-    rows = conn.execute("SELECT url FROM images WHERE glyph_id = ?", (glyph_id,)).fetchall()
-    conn.close()
+    try:
+        rows = conn.execute("SELECT url FROM images WHERE glyph_id = ?", (glyph_id,)).fetchall()
+    finally:
+        conn.close()
 
     if rows:
         # 返回所有图片URL
         return jsonify({"image_urls": [row["url"] for row in rows]})
     return jsonify({"image_urls": []}), 404
 
+# 缩略图代理接口：单字边长可选值和默认值、可选格式
+THUMB_SIZES = (60, 120, 240)
+THUMB_DEFAULT_SIZE = 120
+THUMB_FORMATS = ("webp", "png")
+# 缩略图地址对应的内容不会变化，浏览器和 nginx 可以长期缓存
+THUMB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.route("/thumb/<int:image_id>")
+def thumb(image_id):
+    """返回服务器缩放后的缩略图，浏览器不必从源站下载原图
+
+    参数：size（边长，60/120/240，默认120）、format（webp 或 png，默认 webp）。
+    编码结果缓存在磁盘上，响应带有 immutable 的 Cache-Control、ETag 和 Last-Modified
+    （数据库文件的修改时间），支持 If-None-Match / If-Modified-Since 条件请求。
+    """
+    try:
+        size = int(request.args.get("size", THUMB_DEFAULT_SIZE))
+    except ValueError:
+        size = None
+    if size not in THUMB_SIZES:
+        return jsonify({"error": f"size 只能是 {', '.join(str(s) for s in THUMB_SIZES)}"}), 400
+    fmt = request.args.get("format", "webp").lower()
+    if fmt not in THUMB_FORMATS:
+        return jsonify({"error": f"format 只能是 {', '.join(THUMB_FORMATS)}"}), 400
+    encoding = resolve_encoding(fmt)
+
+    conn = get_db()
+    try:
+        row = conn.execute("SELECT url FROM images WHERE id = ?", (image_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return jsonify({"error": "图片不存在"}), 404
+
+    try:
+        last_modified = os.path.getmtime(db_pool.db_path)
+    except OSError:
+        last_modified = None
+    # 缓存键包含原图URL，数据库中的地址变化后生成新的缩略图
+    key = hashlib.sha256(
+        f"{image_id}|{row['url']}|{size}|{DEFAULT_QUALITY}|{encoding.name}".encode("utf-8")).hexdigest()
+
+    entry = thumb_file_cache.get(key)
+    if entry is not None:
+        response = send_file(entry.path, mimetype=encoding.mimetype, etag=entry.etag,
+                             last_modified=last_modified, conditional=True)
+        response.headers["X-Thumb-Cache"] = "hit"
+    else:
+        img = download_and_process_image(image_id, row["url"], (size, size), DEFAULT_QUALITY)
+        if img is None:
+            return jsonify({"error": "图片下载失败"}), 502
+        body = encoding.encode(img)
+        entry = thumb_file_cache.put(key, body, encoding.extension)
+        etag = entry.etag if entry is not None else hashlib.sha256(body).hexdigest()[:32]
+        response = send_file(io.BytesIO(body), mimetype=encoding.mimetype, etag=etag,
+                             last_modified=last_modified, conditional=True)
+        response.headers["X-Thumb-Cache"] = "miss"
+    response.headers["Cache-Control"] = THUMB_CACHE_CONTROL
+    return response
+
+# 批量图片接口 - 一次返回多个glyph的所有图片
+@app.route("/api/images", methods=["GET", "POST"])
+def batch_images():
+    if request.method == "POST":
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "request body must be a JSON object"}), 400
+        raw_ids = data.get("glyph_ids", [])
+    else:
+        raw_ids = [x for x in request.args.get("ids", "").split(",") if x.strip()]
+
+    if not isinstance(raw_ids, list):
+        return jsonify({"error": "'glyph_ids' must be a list"}), 400
+    try:
+        glyph_ids = [int(x) for x in raw_ids]
+    except (ValueError, TypeError):
+        return jsonify({"error": "glyph id must be an integer"}), 400
+    if len(glyph_ids) > MAX_BATCH_GLYPH_IDS:
+        return jsonify({"error": f"at most {MAX_BATCH_GLYPH_IDS} glyph ids per request"}), 400
+
+    conn = get_db()
+    try:
+        images_by_glyph = _fetch_images_for_glyphs(conn, glyph_ids)
+    finally:
+        conn.close()
+
+    logger.debug(f"批量查询 {len(images_by_glyph)} 个字形的图片")
+    return jsonify({
+        "images": {
+            str(glyph_id): {
+                "image_urls": [url for _, url in rows],
+                "image_ids": [image_id for image_id, _ in rows]
+            }
+            for glyph_id, rows in images_by_glyph.items()
+        }
+    })
+
+def _resolve_first_glyphs(conn, characters, dims, font="", calligrapher="", book=""):
+    """为每个不重复的字符找到满足筛选条件的第一个字形（按g.id排序）
+
+    使用窗口函数在一条查询中完成，返回 {han: 结果字典}。
+    """
+    unique_chars = list(dict.fromkeys(characters))
+    filter_sql = ""
+    filter_params = []
+    if font:
+        filter_sql += " AND g.font_id = ?"
+        filter_params.append(dims.font_ids.get(font, UNKNOWN_DIMENSION_ID))
+    if calligrapher:
+        filter_sql += " AND g.author_id = ?"
+        filter_params.append(dims.author_ids.get(calligrapher, UNKNOWN_DIMENSION_ID))
+    if book:
+        filter_sql += " AND g.book_id = ?"
+        filter_params.append(dims.book_ids.get(book, UNKNOWN_DIMENSION_ID))
+
+    glyph_by_han = {}
+    for start in range(0, len(unique_chars), IMAGE_LOOKUP_CHUNK):
+        chunk = unique_chars[start:start + IMAGE_LOOKUP_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        query = f"""
+            SELECT id, han, font_id, author_id, book_id FROM (
+                SELECT g.id, g.han, g.font_id, g.author_id, g.book_id,
+                       ROW_NUMBER() OVER (PARTITION BY g.han ORDER BY g.id) AS rn
+                FROM glyphs g
+                WHERE g.han IN ({placeholders}){filter_sql}
+            )
+            WHERE rn = 1
+        """
+        for row in conn.execute(query, chunk + filter_params).fetchall():
+            glyph_by_han[row["han"]] = _glyph_row_to_dict(row, dims)
+    return glyph_by_han
+
 # 生成集字API
 @app.route("/api/generate_calligraphy")
 def generate_calligraphy():
@@ -337,55 +962,32 @@ def generate_calligraphy():
     characters = list(text)
     result = []
 
+    dims = dimension_cache.get()
     conn = get_db()
+    try:
+        # 一次性解析所有不重复的字符，再一次性查询这些字形的图片
+        glyph_by_han = _resolve_first_glyphs(conn, characters, dims, font, calligrapher, book)
+        images_by_glyph = _fetch_images_for_glyphs(conn, [row["id"] for row in glyph_by_han.values()])
+    finally:
+        conn.close()
 
-    for char in characters:
-        # 查询该字符的图片
-        query = """
-            SELECT g.id, g.han, f.name AS font, a.name AS author, b.title AS book
-            FROM glyphs g
-            LEFT JOIN fonts f ON g.font_id = f.id
-            LEFT JOIN authors a ON g.author_id = a.id
-            LEFT JOIN books b ON g.book_id = b.id
-            WHERE g.han = ?
-        """
-        params = [char]
-
-        if font:
-            query += " AND f.name = ?"
-            params.append(font)
-
-        if calligrapher:
-            query += " AND a.name = ?"
-            params.append(calligrapher)
-
-        if book:
-            query += " AND b.title = ?"
-            params.append(book)
-
-        query += " ORDER BY g.id LIMIT 1"
-
-        row = conn.execute(query, params).fetchone()
+    # 将图片ID到URL的映射缓存起来，避免导出时重复查询
+    for image_rows in images_by_glyph.values():
+        for image_id, url in image_rows:
+            image_cache.set(f"image_url_{image_id}", url)
 
+    for char in characters:
+        row = glyph_by_han.get(char)
         if row:
             # 获取该字符的图片URLs和IDs
-            image_rows = conn.execute("SELECT id, url FROM images WHERE glyph_id = ?", (row["id"],)).fetchall()
-            image_urls = [img_row["url"] for img_row in image_rows]
-            image_ids = [img_row["id"] for img_row in image_rows]
-
-            # 将图片ID到URL的映射缓存起来，避免导出时重复查询
-            for img_row in image_rows:
-                cache_key = f"image_url_{img_row['id']}"
-                image_cache.set(cache_key, img_row["url"])
-                logger.debug(f"缓存图片ID {img_row['id']} -> URL: {img_row['url']}")
-
+            image_rows = images_by_glyph[row["id"]]
             result.append({
                 "han": row["han"],
                 "font": row["font"],
                 "author": row["author"],
                 "glyph_id": row["id"],
-                "image_urls": image_urls,
-                "image_ids": image_ids
+                "image_urls": [url for _, url in image_rows],
+                "image_ids": [image_id for image_id, _ in image_rows]
             })
         else:
             # 没有找到该字符的图片
@@ -398,7 +1000,14 @@ def generate_calligraphy():
                 "image_ids": []
             })
 
-    conn.close()
+    logger.debug(f"集字共 {len(characters)} 个字符，{len(glyph_by_han)} 个不重复字符找到字形")
+
+    # 后台预取导出默认使用的缩略图：先每个字的第一张图片，再其他候选图片
+    prefetch_items = []
+    for item in result:
+        for index, (image_id, url) in enumerate(zip(item["image_ids"], item["image_urls"])):
+            prefetch_items.append((image_id, url, PRIORITY_FIRST if index == 0 else PRIORITY_VARIANT))
+    prefetcher.submit(prefetch_items, (120, 120), DEFAULT_QUALITY)
 
     return jsonify({
         "success": True,
@@ -428,6 +1037,211 @@ def save_calligraphy():
 
 
 # 优化版导出图片API - 使用图片ID
+def _compose_export_response(pil_images, cols, direction, target_size, encoding, stream=False, export_key=None):
+    """按排列方向拼接单字图片并返回导出响应，两个导出接口共用
+
+    stream 为真时按行带流式编码 PNG，否则整张拼接后按 encoding 编码。
+    """
+    layout = GridLayout(len(pil_images), cols, direction, target_size)
+    width, height = layout.size
+    logger.info(f"开始处理 {len(pil_images)} 张图片，排列方向: {layout.direction}，画布 {width}x{height}")
+
+    if stream:
+        # 边拼接边编码边发送，内存占用只与行带大小有关
+        response = Response(stream_png(width, height, layout.iter_bands(pil_images),
+                                       compress_level=encoding.compress_level),
+                            mimetype=encoding.mimetype)
+        response.headers["Content-Disposition"] = "attachment; filename=calligraphy_set.png"
+        response.headers["X-Export-Encoding"] = encoding.name
+        return response
+
+    start_time = time.perf_counter()
+    output_img = layout.compose(pil_images)
+    logger.debug(f"拼接完成，耗时 {(time.perf_counter() - start_time) * 1000:.1f} 毫秒")
+    return _encoded_export_response(output_img, encoding, export_key)
+
+def _encoded_export_response(output_img, encoding, export_key=None):
+    """按请求的格式和预设编码导出图片，在响应头中报告编码耗时和输出大小
+
+    指定 export_key 时把结果写入导出缓存，并以内容摘要作为 ETag。
+    """
+    start_time = time.perf_counter()
+    body = encoding.encode(output_img)
+    encode_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(f"导出图片编码完成: {encoding.name}，{len(body)} 字节，耗时 {encode_ms:.1f} 毫秒")
+    response = send_file(io.BytesIO(body), mimetype=encoding.mimetype, as_attachment=True,
+                         download_name=f"calligraphy_set.{encoding.extension}")
+    response.headers["X-Export-Encoding"] = encoding.name
+    response.headers["X-Encode-Time"] = f"{encode_ms:.1f}"
+    response.headers["X-Output-Size"] = str(len(body))
+    if export_key is not None:
+        entry = export_cache.put(export_key, body, encoding.extension)
+        if entry is not None:
+            response.set_etag(entry.etag)
+            response.headers["X-Export-Cache"] = "miss"
+    return response
+
+def _cached_export_response(entry, encoding):
+    """返回导出缓存中的文件；客户端的 If-None-Match 匹配时返回 304"""
+    if request.if_none_match.contains(entry.etag):
+        response = make_response("", 304)
+    else:
+        response = send_file(entry.path, mimetype=encoding.mimetype, as_attachment=True,
+                             download_name=f"calligraphy_set.{encoding.extension}", conditional=False)
+        response.headers["X-Output-Size"] = str(entry.size)
+    response.set_etag(entry.etag)
+    response.headers["X-Export-Encoding"] = encoding.name
+    response.headers["X-Export-Cache"] = "hit"
+    return response
+
+def _parse_export_request(data):
+    """解析按图片ID导出的请求参数，参数无效时抛出 ValueError（消息直接返回给客户端）"""
+    # 验证数据格式
+    if data is not None and not isinstance(data, dict):
+        raise ValueError("Invalid request data, body must be a JSON object")
+    if not data or "image_ids" not in data:
+        raise ValueError("Invalid request data, 'image_ids' field is required")
+
+    image_ids = data["image_ids"]
+    cols = parse_cols(data.get("cols", 10))  # 每行多少个字（竖排时为每列）
+    direction = data.get("direction", "horizontal")  # 排列方向
+    quality = normalize_quality(data.get("quality"))  # 质量档位：preview 或 print
+    stream = bool(data.get("stream", False))  # 流式输出：按行带编码并边编码边发送（仅PNG）
+    # 输出格式和预设，如 png/fast、webp/default、jpeg/small
+    encoding = resolve_encoding(data.get("format"), data.get("preset"))
+    if stream and not encoding.streamable:
+        logger.info(f"编码 {encoding.name} 不支持流式输出，改为整张编码")
+        stream = False
+    logger.debug(f"接收到的排列方向: {direction}")
+
+    # 验证image_ids是列表且不为空
+    if not isinstance(image_ids, list) or len(image_ids) == 0:
+        raise ValueError("'image_ids' must be a non-empty list")
+
+    # 设置统一的图片尺寸 - 增大尺寸以获得更好的效果
+    target_size = (120, 120)  # 增大图片尺寸
+    return {
+        "image_ids": image_ids,
+        "cols": cols,
+        "direction": direction,
+        "quality": quality,
+        "stream": stream,
+        "encoding": encoding,
+        "target_size": target_size,
+        "export_key": export_cache_key(image_ids, cols, direction, target_size, quality, encoding.name),
+    }
+
+def _resolve_export_downloads(image_ids):
+    """把导出请求中的图片ID解析为下载任务列表 [(图片ID, URL)]，占位符和不存在的ID为 ('placeholder', None)
+
+    返回 (下载任务列表, 数据库中不存在或无效的图片ID数)；请求中本来就是占位符的不计入。
+    """
+    # 优先从缓存获取图片URL，减少数据库查询
+    id_to_url = {}
+    cache_miss_ids = []  # 缓存中没有的ID
+    
+    # 过滤掉None值和占位符，并转换为整数类型
+    valid_image_ids = []
+    for img_id in image_ids:
+        if img_id is not None and img_id != 'placeholder':
+            try:
+                img_id_int = int(img_id)
+                valid_image_ids.append(img_id_int)
+                
+                # 先尝试从缓存获取
+                cache_key = f"image_url_{img_id_int}"
+                cached_url = image_cache.get(cache_key)
+                if cached_url:
+                    id_to_url[img_id_int] = cached_url
+                    logger.debug(f"从缓存获取图片ID {img_id_int} -> URL: {cached_url}")
+                else:
+                    cache_miss_ids.append(img_id_int)
+                    logger.debug(f"缓存中未找到图片ID {img_id_int}，需要查询数据库")
+            except (ValueError, TypeError):
+                logger.warning(f"无法转换图片ID为整数: {img_id}")
+    
+    # 只查询缓存中没有的图片ID
+    if cache_miss_ids:
+        logger.info(f"需要从数据库查询 {len(cache_miss_ids)} 个图片ID: {cache_miss_ids}")
+        placeholders = ','.join(['?' for _ in cache_miss_ids])
+        query = f"SELECT id, url FROM images WHERE id IN ({placeholders})"
+        conn = get_db()
+        try:
+            image_rows = conn.execute(query, cache_miss_ids).fetchall()
+        finally:
+            conn.close()
+        
+        # 将查询结果添加到映射中，并缓存起来
+        for row in image_rows:
+            id_to_url[row["id"]] = row["url"]
+            cache_key = f"image_url_{row['id']}"
+            image_cache.set(cache_key, row["url"])
+            logger.debug(f"从数据库查询并缓存图片ID {row['id']} -> URL: {row['url']}")
+    else:
+        logger.info("所有图片URL都从缓存中获取，无需查询数据库")
+    
+    logger.info(f"缓存命中率: {(len(valid_image_ids) - len(cache_miss_ids)) / len(valid_image_ids) * 100:.1f}%" if valid_image_ids else "N/A")
+    logger.info(f"当前缓存大小: {image_cache.size()} 个条目")
+
+    # 准备下载任务
+    download_tasks = []
+    missing = 0
+    for img_id in image_ids:
+        if img_id is None or img_id == 'placeholder':
+            download_tasks.append(('placeholder', None))
+        else:
+            try:
+                img_id_int = int(img_id)
+                if img_id_int in id_to_url:
+                    url = id_to_url[img_id_int]
+                    download_tasks.append((img_id_int, url))
+                else:
+                    logger.warning(f"图片ID {img_id} 在数据库中不存在，使用占位图")
+                    download_tasks.append(('placeholder', None))
+                    missing += 1
+            except (ValueError, TypeError):
+                logger.warning(f"无效的图片ID: {img_id}")
+                download_tasks.append(('placeholder', None))
+                missing += 1
+    return download_tasks, missing
+
+def _download_export_images(download_tasks, target_size, quality, timeout=None, progress=None):
+    """并发下载和缩放导出用的图片
+
+    返回 (与 download_tasks 顺序一致的图片列表, 下载失败的图片数)，失败处为占位图。
+    超时后未完成的图片同样按下载失败处理。
+    """
+    logger.info(f"开始并发下载 {len(download_tasks)} 张图片")
+    start_time = time.time()
+    
+    # 提交到共享下载引擎，占位图直接在当前线程生成
+    jobs = [(download_and_process_image, (img_id, url, target_size, quality, progress))
+            for img_id, url in download_tasks if img_id != 'placeholder']
+    # 导出期间暂停后台预取，下载并发全部留给前台
+    with prefetcher.foreground():
+        batch = download_engine.submit(jobs)
+        try:
+            downloaded = batch.wait_partial(timeout=timeout or EXPORT_DOWNLOAD_TIMEOUT)
+        finally:
+            # 出错时丢弃尚未开始的下载任务
+            batch.cancel()
+
+    pil_images = []
+    failed = 0
+    downloaded_iter = iter(downloaded)
+    for img_id, url in download_tasks:
+        img = None if img_id == 'placeholder' else next(downloaded_iter)
+        if img is None:
+            # 占位符或下载失败，使用占位图
+            if img_id != 'placeholder':
+                failed += 1
+            img = get_placeholder_image(target_size)
+        pil_images.append(img)
+    
+    download_time = time.time() - start_time
+    logger.info(f"并发下载完成，耗时: {download_time:.2f}秒，成功处理 {len(pil_images) - failed} 张图片，失败 {failed} 张")
+    return pil_images, failed
+
 @app.route("/export_image_by_ids", methods=["POST"])
 def export_image_by_ids():
     try:
@@ -435,186 +1249,135 @@ def export_image_by_ids():
         logger.info("收到导出请求数据（使用图片ID）")
         logger.debug(f"请求数据: {data}")
 
-        # 验证数据格式
-        if not data or "image_ids" not in data:
-            logger.error("请求数据格式错误，缺少image_ids字段")
-            return "Invalid request data, 'image_ids' field is required", 400
+        try:
+            params = _parse_export_request(data)
+        except ValueError as e:
+            logger.error(str(e))
+            return str(e), 400
+        encoding = params["encoding"]
+        target_size = params["target_size"]
+        export_key = params["export_key"]
 
-        image_ids = data["image_ids"]
-        cols = data.get("cols", 10)  # 每行多少个字
-        direction = data.get("direction", "horizontal")  # 排列方向
-        logger.debug(f"接收到的排列方向: {direction}")
+        # 相同排版已经导出过时直接返回缓存的文件
+        cached_export = export_cache.get(export_key)
+        if cached_export is not None:
+            logger.info(f"导出缓存命中: {export_key[:12]}")
+            return _cached_export_response(cached_export, encoding)
 
-        # 验证image_ids是列表且不为空
-        if not isinstance(image_ids, list) or len(image_ids) == 0:
-            logger.error("image_ids必须是非空列表")
-            return "'image_ids' must be a non-empty list", 400
-
-        # 优先从缓存获取图片URL，减少数据库查询
-        id_to_url = {}
-        cache_miss_ids = []  # 缓存中没有的ID
-        
-        # 过滤掉None值和占位符，并转换为整数类型
-        valid_image_ids = []
-        for img_id in image_ids:
-            if img_id is not None and img_id != 'placeholder':
-                try:
-                    img_id_int = int(img_id)
-                    valid_image_ids.append(img_id_int)
-                    
-                    # 先尝试从缓存获取
-                    cache_key = f"image_url_{img_id_int}"
-                    cached_url = image_cache.get(cache_key)
-                    if cached_url:
-                        id_to_url[img_id_int] = cached_url
-                        logger.debug(f"从缓存获取图片ID {img_id_int} -> URL: {cached_url}")
-                    else:
-                        cache_miss_ids.append(img_id_int)
-                        logger.debug(f"缓存中未找到图片ID {img_id_int}，需要查询数据库")
-                except (ValueError, TypeError):
-                    logger.warning(f"无法转换图片ID为整数: {img_id}")
-        
-        # 只查询缓存中没有的图片ID
-        if cache_miss_ids:
-            logger.info(f"需要从数据库查询 {len(cache_miss_ids)} 个图片ID: {cache_miss_ids}")
-            conn = get_db()
-            placeholders = ','.join(['?' for _ in cache_miss_ids])
-            query = f"SELECT id, url FROM images WHERE id IN ({placeholders})"
-            image_rows = conn.execute(query, cache_miss_ids).fetchall()
-            
-            # 将查询结果添加到映射中，并缓存起来
-            for row in image_rows:
-                id_to_url[row["id"]] = row["url"]
-                cache_key = f"image_url_{row['id']}"
-                image_cache.set(cache_key, row["url"])
-                logger.debug(f"从数据库查询并缓存图片ID {row['id']} -> URL: {row['url']}")
-            
-            conn.close()
-        else:
-            logger.info("所有图片URL都从缓存中获取，无需查询数据库")
-        
-        logger.info(f"缓存命中率: {(len(valid_image_ids) - len(cache_miss_ids)) / len(valid_image_ids) * 100:.1f}%" if valid_image_ids else "N/A")
-        logger.info(f"当前缓存大小: {image_cache.size()} 个条目")
-
-        # 设置统一的图片尺寸 - 增大尺寸以获得更好的效果
-        target_size = (120, 120)  # 增大图片尺寸
-        
-        # 准备下载任务
-        download_tasks = []
-        for img_id in image_ids:
-            if img_id is None or img_id == 'placeholder':
-                download_tasks.append(('placeholder', None))
-            else:
-                try:
-                    img_id_int = int(img_id)
-                    if img_id_int in id_to_url:
-                        url = id_to_url[img_id_int]
-                        download_tasks.append((img_id_int, url))
-                    else:
-                        logger.warning(f"图片ID {img_id} 在数据库中不存在，使用占位图")
-                        download_tasks.append(('placeholder', None))
-                except (ValueError, TypeError):
-                    logger.warning(f"无效的图片ID: {img_id}")
-                    download_tasks.append(('placeholder', None))
-        
-        # 并发下载和处理图片
-        logger.info(f"开始并发下载 {len(download_tasks)} 张图片")
-        start_time = time.time()
-        
-        pil_images = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            # 提交所有下载任务
-            future_to_index = {}
-            for index, (img_id, url) in enumerate(download_tasks):
-                if img_id == 'placeholder':
-                    # 直接处理占位图，不需要下载
-                    future = executor.submit(get_placeholder_image, target_size)
-                else:
-                    future = executor.submit(download_and_process_image, img_id, url, target_size)
-                future_to_index[future] = index
-            
-            # 收集结果，保持顺序
-            results = [None] * len(download_tasks)
-            for future in concurrent.futures.as_completed(future_to_index):
-                index = future_to_index[future]
-                try:
-                    img = future.result()
-                    if img is not None:
-                        results[index] = img
-                    else:
-                        # 下载失败，使用占位图
-                        results[index] = get_placeholder_image(target_size)
-                except Exception as e:
-                    logger.warning(f"处理图片任务失败: {e}")
-                    results[index] = get_placeholder_image(target_size)
-            
-            # 按顺序添加到pil_images
-            for img in results:
-                if img is not None:
-                    pil_images.append(img)
-        
-        download_time = time.time() - start_time
-        logger.info(f"并发下载完成，耗时: {download_time:.2f}秒，成功处理 {len(pil_images)} 张图片")
+        download_tasks, missing = _resolve_export_downloads(params["image_ids"])
+        pil_images, failed = _download_export_images(download_tasks, target_size, params["quality"])
 
         if not pil_images:
             logger.error("没有成功加载任何图片")
             return "No images could be loaded", 400
 
-        w, h = target_size
-        
-        # 根据排列方向调整行列计算和输出图像尺寸
-        if direction in ['vertical-left', 'vertical-right']:
-            rows_per_col = cols
-            cols_used = (len(pil_images) + rows_per_col - 1) // rows_per_col
-            rows_used = min(rows_per_col, len(pil_images))
-            output_img = Image.new("RGBA", (w * cols_used, h * rows_per_col), (255, 255, 255, 0))
-        else:
-            rows_used = (len(pil_images) + cols - 1) // cols
-            output_img = Image.new("RGBA", (w * cols, h * rows_used), (255, 255, 255, 0))
-
-        # 根据排列方向调整图片位置
-        logger.info(f"开始处理 {len(pil_images)} 张图片，排列方向: {direction}")
-        if direction == "horizontal":
-            for idx, img in enumerate(pil_images):
-                x = (idx % cols) * w
-                y = (idx // cols) * h
-                output_img.paste(img, (x, y))
-        elif direction == "horizontal-reverse":
-            for idx, img in enumerate(pil_images):
-                row = idx // cols
-                col = cols - 1 - (idx % cols)
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        elif direction == "vertical-left":
-            for idx, img in enumerate(pil_images):
-                col = idx // rows_per_col
-                row = idx % rows_per_col
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        elif direction == "vertical-right":
-            for idx, img in enumerate(pil_images):
-                col = (cols_used - 1) - (idx // rows_per_col)
-                row = idx % rows_per_col
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        else:
-            for idx, img in enumerate(pil_images):
-                x = (idx % cols) * w
-                y = (idx // cols) * h
-                output_img.paste(img, (x, y))
-
-        buf = io.BytesIO()
-        output_img.save(buf, format="PNG")
-        buf.seek(0)
+        degraded = missing + failed
+        if degraded:
+            # 含有占位图的结果不写入导出缓存
+            logger.warning(f"导出中有 {degraded} 张图片以占位图代替，结果不缓存")
+            export_key = None
+        response = _compose_export_response(pil_images, params["cols"], params["direction"], target_size, encoding,
+                                            stream=params["stream"], export_key=export_key)
+        if degraded:
+            response.headers["Cache-Control"] = DEGRADED_CACHE_CONTROL
+            response.headers["X-Export-Missing-Images"] = str(degraded)
         logger.info("图片导出成功（使用图片ID）")
-        return send_file(buf, mimetype="image/png", as_attachment=True, download_name="calligraphy_set.png")
+        return response
     except Exception as e:
         logger.error(f"导出图片时发生错误: {e}")
         return f"Error exporting image: {str(e)}", 500
 
+def _render_export_job(job, params):
+    """在后台任务中完成一次导出，返回 (字节串, 编码设置)"""
+    target_size = params["target_size"]
+    encoding = params["encoding"]
+    job.set_stage(STAGE_DOWNLOADING)
+    download_tasks, missing = _resolve_export_downloads(params["image_ids"])
+    pil_images, failed = _download_export_images(download_tasks, target_size, params["quality"],
+                                                 timeout=EXPORT_JOB_DOWNLOAD_TIMEOUT, progress=job)
+    job.missing_images = missing + failed
+
+    job.set_stage(STAGE_COMPOSING)
+    layout = GridLayout(len(pil_images), params["cols"], params["direction"], target_size)
+    output_img = layout.compose(pil_images)
+
+    job.set_stage(STAGE_ENCODING)
+    body = encoding.encode(output_img)
+    if job.missing_images:
+        logger.warning(f"导出任务 {job.id} 中有 {job.missing_images} 张图片以占位图代替，结果不缓存")
+    else:
+        # 同样的排版之后可以直接从导出缓存同步返回
+        export_cache.put(params["export_key"], body, encoding.extension)
+    return body, encoding
+
+def _export_job_response(job, status=200):
+    result = job.to_dict()
+    result["status_url"] = f"/api/export_jobs/{job.id}"
+    result["download_url"] = f"/api/export_jobs/{job.id}/download" if job.state == "done" else None
+    response = jsonify(result)
+    response.status_code = status
+    if status == 202:
+        response.headers["Location"] = result["status_url"]
+    return response
+
+@app.route("/api/export_jobs", methods=["POST"])
+def create_export_job():
+    """提交导出任务，参数与 /export_image_by_ids 相同
+
+    字数少于 MOTU_EXPORT_ASYNC_MIN 或排版已在导出缓存中时同步返回图片（200），
+    否则立即返回任务信息（202），客户端轮询 status_url，完成后从 download_url 下载。
+    """
+    data = request.get_json(silent=True)
+    try:
+        params = _parse_export_request(data)
+    except ValueError as e:
+        logger.error(str(e))
+        return jsonify({"error": str(e)}), 400
+
+    image_ids = params["image_ids"]
+    if len(image_ids) < EXPORT_ASYNC_MIN:
+        return export_image_by_ids()
+    cached_export = export_cache.get(params["export_key"])
+    if cached_export is not None:
+        logger.info(f"导出缓存命中: {params['export_key'][:12]}")
+        return _cached_export_response(cached_export, params["encoding"])
+
+    total = sum(1 for img_id in image_ids if img_id is not None and img_id != 'placeholder')
+    try:
+        job = export_jobs.submit(lambda job: _render_export_job(job, params), total)
+    except JobQueueFull as e:
+        logger.warning(str(e))
+        return jsonify({"error": str(e)}), 503
+    return _export_job_response(job, 202)
+
+@app.route("/api/export_jobs/<job_id>")
+def export_job_status(job_id):
+    """查询导出任务的状态和进度"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "导出任务不存在或已过期"}), 404
+    return _export_job_response(job)
+
+@app.route("/api/export_jobs/<job_id>/download")
+def export_job_download(job_id):
+    """下载已完成的导出任务文件，过期后返回404"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "导出任务不存在或已过期"}), 404
+    if job.state == "failed":
+        return jsonify({"error": f"导出任务失败: {job.error}"}), 500
+    if job.state != "done":
+        return jsonify({"error": "导出任务尚未完成", "progress": job.progress()}), 409
+    response = send_file(job.path, mimetype=job.encoding.mimetype, as_attachment=True,
+                         download_name=f"calligraphy_set.{job.encoding.extension}")
+    response.headers["X-Export-Encoding"] = job.encoding.name
+    if job.missing_images:
+        response.headers["Cache-Control"] = DEGRADED_CACHE_CONTROL
+        response.headers["X-Export-Missing-Images"] = str(job.missing_images)
+    else:
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
 # 原有导出图片API（保持兼容性）
 @app.route("/export_image", methods=["POST"])
 def export_image():
@@ -629,8 +1392,23 @@ def export_image():
             return "Invalid request data, 'images' field is required", 400
 
         images = data["images"]
-        cols = data.get("cols", 10)  # 每行多少个字
+        try:
+            cols = parse_cols(data.get("cols", 10))  # 每行多少个字（竖排时为每列）
+        except ValueError as e:
+            logger.error(str(e))
+            return str(e), 400
         direction = data.get("direction", "horizontal")  # 排列方向
+        quality = normalize_quality(data.get("quality"))  # 质量档位：preview 或 print
+        stream = bool(data.get("stream", False))  # 流式输出：按行带编码并边编码边发送（仅PNG）
+        try:
+            # 输出格式和预设，如 png/fast、webp/default、jpeg/small
+            encoding = resolve_encoding(data.get("format"), data.get("preset"))
+        except ValueError as e:
+            logger.error(str(e))
+            return str(e), 400
+        if stream and not encoding.streamable:
+            logger.info(f"编码 {encoding.name} 不支持流式输出，改为整张编码")
+            stream = False
         logger.debug(f"接收到的排列方向: {direction}")
 
         # 验证images是列表且不为空
@@ -641,95 +1419,36 @@ def export_image():
         # 设置统一的图片尺寸 - 增大尺寸以获得更好的效果
         target_size = (120, 120)  # 增大图片尺寸
         pil_images = []
-        original_sizes = []  # 记录原始图片尺寸用于调试
-        for url in images:
-            try:
-                # 去除可能的引号和空格
-                clean_url = url.strip().strip('"').strip('\'')
-                logger.debug(f"尝试加载图片: {clean_url}")
-                resp = requests.get(clean_url, stream=True, timeout=10)
-                resp.raise_for_status()  # 抛出HTTP错误
-                img = Image.open(io.BytesIO(resp.content)).convert("RGBA")
-                original_sizes.append(img.size)  # 记录原始尺寸
-                # 调整图片大小到统一尺寸
-                img = img.resize(target_size, Image.LANCZOS)
-                pil_images.append(img)
-            except Exception as e:
-                logger.warning(f"加载图片失败: {url}, 错误: {e}")
-                # 使用占位图替代
-                placeholder_path = os.path.join(app.static_folder, "placeholder.png")
-                if os.path.exists(placeholder_path):
-                    img = Image.open(placeholder_path).convert("RGBA")
-                    original_sizes.append(img.size)  # 记录占位图原始尺寸
-                    # 调整占位图大小到统一尺寸
-                    img = img.resize(target_size, Image.LANCZOS)
+        # 导出期间暂停后台预取
+        with prefetcher.foreground():
+            for url in images:
+                try:
+                    # 去除可能的引号和空格
+                    clean_url = url.strip().strip('"').strip('\'')
+                    logger.debug(f"尝试加载图片: {clean_url}")
+                    content = http_client.fetch(clean_url)
+                    # 调整图片大小到统一尺寸（大图先缩小解码再重采样）
+                    img = render_backend.render(content, target_size, quality).to_image()
                     pil_images.append(img)
-                else:
-                    logger.warning("占位图不存在，跳过该图片")
+                except Exception as e:
+                    logger.warning(f"加载图片失败: {url}, 错误: {e}")
+                    # 使用占位图替代
+                    placeholder_path = os.path.join(app.static_folder, "placeholder.png")
+                    if os.path.exists(placeholder_path):
+                        img = Image.open(placeholder_path).convert("RGBA")
+                        # 调整占位图大小到统一尺寸
+                        img = img.resize(target_size, Image.LANCZOS)
+                        pil_images.append(img)
+                    else:
+                        logger.warning("占位图不存在，跳过该图片")
 
         if not pil_images:
             logger.error("没有成功加载任何图片")
             return "No images could be loaded", 400
 
-        w, h = target_size  # 使用统一的尺寸
-        
-        # 根据排列方向调整行列计算和输出图像尺寸
-        if direction in ['vertical-left', 'vertical-right']:
-            # 垂直排列时，cols表示每列的字符数
-            rows_per_col = cols  # 每列显示的行数
-            cols_used = (len(pil_images) + rows_per_col - 1) // rows_per_col  # 计算需要多少列
-            rows_used = min(rows_per_col, len(pil_images))
-            # 垂直排列时，宽度和高度需要交换
-            output_img = Image.new("RGBA", (w * cols_used, h * rows_per_col), (255, 255, 255, 0))
-        else:
-            # 水平排列时，cols表示每行的字符数
-            rows_used = (len(pil_images) + cols - 1) // cols
-            output_img = Image.new("RGBA", (w * cols, h * rows_used), (255, 255, 255, 0))
-
-        # 根据排列方向调整图片位置
-        logger.info(f"开始处理 {len(pil_images)} 张图片，排列方向: {direction}")
-        if direction == "horizontal":
-            # 从左到右，从上到下（默认）
-            for idx, img in enumerate(pil_images):
-                x = (idx % cols) * w
-                y = (idx // cols) * h
-                output_img.paste(img, (x, y))
-        elif direction == "horizontal-reverse":
-            # 从右到左，从上到下
-            for idx, img in enumerate(pil_images):
-                row = idx // cols
-                col = cols - 1 - (idx % cols)
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        elif direction == "vertical-left":
-            # 从左上角开始，向下填充，达到字数限制换列
-            for idx, img in enumerate(pil_images):
-                col = idx // rows_per_col
-                row = idx % rows_per_col
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        elif direction == "vertical-right":
-            # 从右上角开始，向下填充，达到字数限制换列
-            for idx, img in enumerate(pil_images):
-                col = (cols_used - 1) - (idx // rows_per_col)
-                row = idx % rows_per_col
-                x = col * w
-                y = row * h
-                output_img.paste(img, (x, y))
-        else:
-            # 默认使用水平排列
-            for idx, img in enumerate(pil_images):
-                x = (idx % cols) * w
-                y = (idx // cols) * h
-                output_img.paste(img, (x, y))
-
-        buf = io.BytesIO()
-        output_img.save(buf, format="PNG")
-        buf.seek(0)
+        response = _compose_export_response(pil_images, cols, direction, target_size, encoding, stream=stream)
         logger.info("图片导出成功")
-        return send_file(buf, mimetype="image/png", as_attachment=True, download_name="calligraphy_set.png")
+        return response
     except Exception as e:
         logger.error(f"导出图片时发生错误: {e}")
         return f"Error exporting image: {str(e)}", 500
@@ -741,14 +1460,43 @@ def cache_status():
     return jsonify({
         "cache_size": image_cache.size(),
         "max_size": image_cache.max_size,
-        "expire_time": image_cache.expire_time
+        "expire_time": image_cache.expire_time,
+        "thumbnails": thumbnail_cache.stats(),
+        "exports": export_cache.stats(),
+        "thumb_store": thumb_store.stats(),
+        "sprites": sprite_cache.stats(),
+        "thumb_files": thumb_file_cache.stats()
     })
 
+@app.route("/api/db/status")
+def db_status():
+    """获取数据库连接池（含内存模式的副本大小）和内存搜索索引状态"""
+    result = db_pool.stats()
+    result["search_index"] = search_index.stats()
+    return jsonify(result)
+
+@app.route("/api/http/status")
+def http_status():
+    """获取图片下载客户端的统计信息（连接复用率、下载字节数等）"""
+    return jsonify(http_client.stats())
+
+@app.route("/api/download/status")
+def download_status():
+    """获取下载引擎状态，以及被合并的重复下载数"""
+    result = download_engine.stats()
+    result["single_flight"] = image_flight.stats()
+    result["render"] = render_backend.stats()
+    result["prefetch"] = prefetcher.stats()
+    result["export_jobs"] = export_jobs.stats()
+    return jsonify(result)
+
 @app.route("/api/cache/clear", methods=["POST"])
 def clear_cache():
     """清理缓存"""
     old_size = image_cache.size()
     image_cache.clear()
+    # 只清理缩略图内存层，磁盘层可以在重启后继续使用
+    thumbnail_cache.memory.clear()
     logger.info(f"缓存已清理，清理前大小: {old_size}")
     return jsonify({
         "success": True,
@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQLite 连接池
+
+书法数据库在运行时基本只读，每个请求都重新 sqlite3.connect() 会反复打开文件、
+解析 schema，并且每次都从冷的页缓存开始。这个模块维护一组长期存活的只读连接，
+在创建时一次性完成 PRAGMA 调优，之后在请求之间复用。
+
+只读连接无法切换 journal_mode，WAL 需要由可写连接对数据库文件设置一次；
+数据库文件在运行期间完全不变时，可以开启 immutable 模式省去文件锁开销。
+
+内存模式（MOTU_DB_IN_MEMORY=true）下，启动时用备份 API 把整个数据库复制到一个
+共享缓存的内存数据库中，池中的连接都连接到这份副本（PRAGMA query_only 保证只读），
+查询不再经过文件 I/O。后台线程按修改时间监视数据库文件，文件变化后在新的内存副本中
+重新加载，加载完成后再切换：正在使用的旧连接归还时关闭，旧副本随最后一个连接释放。
+
+使用方法：
+    pool = ConnectionPool("data/shufadb.db")
+    conn = pool.acquire()
+    try:
+        conn.execute("SELECT ...")
+    finally:
+        conn.close()  # 归还到连接池，而不是真正关闭；重复 close() 会被忽略
+
+    with pool.connection() as conn:  # 离开 with 块时自动归还
+        conn.execute("SELECT ...")
+
+环境变量：
+    MOTU_DB_POOL_SIZE: 连接池最大连接数（默认 8）
+    MOTU_DB_IMMUTABLE: 是否以 immutable 模式打开数据库（默认 false）
+    MOTU_DB_MMAP_SIZE: mmap_size，单位字节（默认 256MB）
+    MOTU_DB_CACHE_SIZE: 每个连接的页缓存大小，单位 KB（默认 64MB）
+    MOTU_DB_IN_MEMORY: 是否把数据库加载到内存中提供查询（默认 false）
+    MOTU_DB_RELOAD_INTERVAL: 内存模式下检查数据库文件变化的间隔，单位秒（默认 5）
+"""
+
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+
+from logger import get_logger
+
+logger = get_logger()
+
+# 默认配置
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024  # 256MB
+DEFAULT_CACHE_SIZE_KB = 64 * 1024  # 64MB
+DEFAULT_STATEMENT_CACHE = 256  # 每个连接缓存的预编译语句数量
+DEFAULT_ACQUIRE_TIMEOUT = 30  # 秒
+DEFAULT_RELOAD_INTERVAL = 5.0  # 秒
+
+# 连接创建后执行一次的预热语句，让常用语句进入预编译缓存并把 schema 读入内存
+WARMUP_STATEMENTS = [
+    "SELECT id, name FROM fonts",
+    "SELECT id, name FROM authors",
+    "SELECT id, title FROM books",
+    "SELECT url FROM images WHERE glyph_id = ? LIMIT 1",
+    "SELECT url FROM images WHERE glyph_id = ?",
+]
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接
+
+    close() 被重写为归还连接，真正关闭连接请使用 really_close()。
+    每次借出时 lease 加一，调用方拿到的是记录了这次 lease 的 LeasedConnection，
+    不直接持有连接本身。
+    """
+
+    _pool = None
+    _generation = 0
+    _leased = False
+    _lease = 0
+    _finalizer = None
+
+    def close(self, lease=None):
+        pool = self._pool
+        if pool is None:
+            super().close()
+        else:
+            pool.release(self, lease)
+
+    def really_close(self):
+        self._pool = None
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        super().close()
+
+
+class LeasedConnection:
+    """一次借出的连接句柄
+
+    acquire() 每次返回一个新句柄，句柄在创建时记录这次借出的 lease，
+    close() 只归还这一次借出：重复调用 close()，或者连接已被其他请求再次借走后
+    用旧句柄调用 close()，都会被忽略。归还后再通过句柄使用连接会抛出
+    sqlite3.ProgrammingError，旧句柄不会读写别的请求正在使用的连接。
+    其他属性和方法（execute、cursor、row_factory 等）转发给底层连接。
+    """
+
+    __slots__ = ("_conn", "_lease")
+
+    def __init__(self, conn, lease):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_lease", lease)
+
+    @property
+    def released(self):
+        """这次借出是否已经归还"""
+        conn = self._conn
+        return not conn._leased or conn._lease != self._lease
+
+    @property
+    def connection(self):
+        """底层连接，已归还时抛出 sqlite3.ProgrammingError"""
+        if self.released:
+            raise sqlite3.ProgrammingError("数据库连接已归还到连接池")
+        return self._conn
+
+    def close(self):
+        self._conn.close(self._lease)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.connection, name, value)
+
+    def __enter__(self):
+        self.connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+
+def file_version(path):
+    """数据库文件版本：路径、主文件和 WAL 文件的大小与修改时间"""
+    version = [path]
+    for suffix in ("", "-wal"):
+        try:
+            st = os.stat(path + suffix)
+            version.extend([st.st_mtime_ns, st.st_size])
+        except OSError:
+            version.extend([None, None])
+    return tuple(version)
+
+
+class ConnectionPool:
+    """只读 SQLite 连接池"""
+
+    def __init__(self, db_path, max_size=None, immutable=None, mmap_size=None,
+                 cache_size_kb=None, timeout=DEFAULT_ACQUIRE_TIMEOUT, in_memory=None,
+                 reload_interval=None):
+        self.db_path = db_path
+        self.max_size = max_size or int(os.environ.get('MOTU_DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+        if immutable is None:
+            immutable = os.environ.get('MOTU_DB_IMMUTABLE', 'false').lower() == 'true'
+        self.immutable = immutable
+        self.mmap_size = mmap_size if mmap_size is not None else int(
+            os.environ.get('MOTU_DB_MMAP_SIZE', DEFAULT_MMAP_SIZE))
+        self.cache_size_kb = cache_size_kb if cache_size_kb is not None else int(
+            os.environ.get('MOTU_DB_CACHE_SIZE', DEFAULT_CACHE_SIZE_KB))
+        self.timeout = timeout
+        if in_memory is None:
+            in_memory = os.environ.get('MOTU_DB_IN_MEMORY', 'false').lower() == 'true'
+        self.in_memory = in_memory
+        self.reload_interval = reload_interval if reload_interval is not None else float(
+            os.environ.get('MOTU_DB_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
+
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用最热的连接
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._closed = False
+
+        # 统计信息
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._created = 0
+        self._leaked = 0
+
+        # 内存模式：当前副本的URI、保持副本存活的连接、加载副本时的文件版本。
+        # 每次重新加载 generation 加一，连接记录自己所属的 generation
+        self._generation = 0
+        self._memory_uri = None
+        self._memory_holder = None
+        self._loaded_version = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._loads = 0
+        self._load_time = 0.0
+        self._loaded_at = None
+        self._reload_errors = 0
+        self._memory_bytes = 0
+        self._file_bytes = 0
+
+        if self.in_memory:
+            try:
+                self.reload()
+            except Exception as e:
+                # 加载失败时先直接查询数据库文件，监视线程会继续尝试加载
+                self._reload_errors += 1
+                logger.error(f"加载内存数据库失败，暂时使用数据库文件: {e}")
+            if self.reload_interval > 0:
+                self._watcher = threading.Thread(target=self._watch, name="db-reload-watcher", daemon=True)
+                self._watcher.start()
+
+    def _file_uri(self):
+        path = os.path.abspath(self.db_path).replace('\\', '/')
+        if not path.startswith('/'):
+            path = '/' + path  # Windows 盘符路径
+        uri = f"file:{path}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        return uri
+
+    def _connect(self):
+        """创建一个新连接并完成一次性调优"""
+        with self._lock:
+            memory = self._memory_uri is not None
+            uri = self._memory_uri if memory else self._file_uri()
+            generation = self._generation
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,  # 连接会在不同的请求线程之间传递
+            cached_statements=DEFAULT_STATEMENT_CACHE,
+            factory=PooledConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        if memory:
+            # 内存副本的URI无法以 mode=ro 打开，用 query_only 禁止写入
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        self._warm_up(conn)
+        conn._pool = self
+        conn._generation = generation
+        # 借出后未归还就被回收的连接（调用方出错时丢失了引用）释放其占用的名额
+        conn._finalizer = weakref.finalize(conn, self._reclaim)
+        conn._finalizer.atexit = False
+        with self._lock:
+            self._created += 1
+        logger.debug(f"创建数据库连接: {self.db_path}，当前打开连接数: {self._open_count}")
+        return conn
+
+    def _warm_up(self, conn):
+        """预编译常用语句，失败不影响使用（例如表结构不完整的测试库）"""
+        for sql in WARMUP_STATEMENTS:
+            try:
+                if "?" in sql:
+                    conn.execute(sql, (0,)).fetchall()
+                else:
+                    conn.execute(sql + " LIMIT 0").fetchall()
+            except sqlite3.Error as e:
+                logger.debug(f"预热语句失败: {sql}, 错误: {e}")
+
+    def acquire(self):
+        """从连接池获取一个连接，池满时阻塞等待，返回记录了本次借出的 LeasedConnection"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+
+        conn = self._checkout()
+        while conn._generation != self._generation:
+            # 内存副本已重新加载，丢弃连接到旧副本的连接
+            self._retire(conn)
+            conn = self._checkout()
+
+        with self._lock:
+            self._checkouts += 1
+            conn._leased = True
+            conn._lease += 1
+            lease = conn._lease
+        return LeasedConnection(conn, lease)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """借出一个连接，离开 with 块时无论是否出错都归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _reclaim(self):
+        with self._lock:
+            self._open_count -= 1
+            self._leaked += 1
+        logger.warning("数据库连接未归还就被回收，已释放其占用的连接池名额")
+
+    def _checkout(self):
+        """取出一个空闲连接，或在未达上限时新建连接，否则等待"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._open_count < self.max_size:
+                    self._open_count += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open_count -= 1
+                    raise
+            else:
+                start = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"等待数据库连接超时（{self.timeout}秒）")
+                waited = time.perf_counter() - start
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time_total += waited
+                    self._wait_time_max = max(self._wait_time_max, waited)
+        return conn
+
+    def _retire(self, conn):
+        """真正关闭一个连接"""
+        conn.really_close()
+        with self._lock:
+            self._open_count -= 1
+
+    def _drain_idle(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(conn)
+
+    def release(self, conn, lease=None):
+        """归还连接；指定 lease 时只在连接仍处于那次借出时归还，重复归还会被忽略"""
+        with self._lock:
+            if not conn._leased or (lease is not None and lease != conn._lease):
+                return
+            conn._leased = False
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._retire(conn)
+            return
+        if conn._generation != self._generation:
+            # 连接到旧副本：换成新副本的连接放回池中，等待中的请求不必等到超时
+            self._retire(conn)
+            with self._lock:
+                self._open_count += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._lock:
+                    self._open_count -= 1
+                logger.warning(f"重新创建数据库连接失败: {e}")
+                return
+        self._idle.put(conn)
+
+    def reload(self):
+        """把数据库文件复制到新的内存副本，复制完成后切换过去"""
+        with self._reload_lock:
+            version = file_version(self.db_path)
+            start = time.perf_counter()
+            uri = f"file:motu-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                source = sqlite3.connect(self._file_uri(), uri=True)
+                try:
+                    source.backup(holder)
+                finally:
+                    source.close()
+                page_count = holder.execute("PRAGMA page_count").fetchone()[0]
+                page_size = holder.execute("PRAGMA page_size").fetchone()[0]
+            except Exception:
+                holder.close()
+                raise
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                old_holder = self._memory_holder
+                self._memory_uri = uri
+                self._memory_holder = holder
+                self._loaded_version = version
+                self._generation += 1
+                self._loads += 1
+                self._load_time = elapsed
+                self._loaded_at = time.time()
+                self._memory_bytes = page_count * page_size
+                self._file_bytes = version[2] or 0
+            # 旧副本的空闲连接立即关闭，使用中的连接归还时关闭，
+            # 旧副本在最后一个连接关闭后由 SQLite 释放
+            self._drain_idle()
+            if old_holder is not None:
+                old_holder.close()
+        logger.info(f"数据库已加载到内存: {self._memory_bytes / 1024 / 1024:.1f}MB"
+                    f"（文件 {self._file_bytes / 1024 / 1024:.1f}MB），耗时 {elapsed:.2f} 秒")
+
+    def check_reload(self):
+        """内存模式下数据库文件版本与副本不一致时重新加载，返回是否重新加载"""
+        if not self.in_memory or self._closed:
+            return False
+        version = file_version(self.db_path)
+        if version == self._loaded_version or version[1] is None:
+            # 文件不存在（例如正在替换）时继续使用当前副本
+            return False
+        if self._loaded_version is not None:
+            logger.info("数据库文件已变化，重新加载内存副本")
+        self.reload()
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.check_reload()
+            except Exception as e:
+                self._reload_errors += 1
+                logger.error(f"重新加载内存数据库失败: {e}")
+
+    def data_version(self):
+        """查询所见数据的版本：内存模式下为加载副本时的文件版本，否则为文件当前的版本"""
+        version = self._loaded_version
+        if self._memory_uri is not None and version is not None:
+            return version
+        return file_version(self.db_path)
+
+    def close(self):
+        """关闭连接池中所有空闲连接，之后归还的连接也会被关闭"""
+        self._closed = True
+        self._stop.set()
+        self._drain_idle()
+        with self._lock:
+            holder = self._memory_holder
+            self._memory_holder = None
+        if holder is not None:
+            holder.close()
+
+    def memory_stats(self):
+        """内存模式的加载情况和内存副本大小"""
+        with self._lock:
+            return {
+                "enabled": self.in_memory,
+                "loaded": self._memory_uri is not None,
+                "bytes": self._memory_bytes,
+                "mb": round(self._memory_bytes / 1024 / 1024, 2),
+                "file_bytes": self._file_bytes,
+                "generation": self._generation,
+                "loads": self._loads,
+                "last_load_time_ms": round(self._load_time * 1000, 3),
+                "loaded_at": self._loaded_at,
+                "reload_interval": self.reload_interval,
+                "reload_errors": self._reload_errors,
+            }
+
+    def stats(self):
+        """返回连接池统计信息，用于确定合适的连接池大小"""
+        with self._lock:
+            result = {
+                "db_path": self.db_path,
+                "max_size": self.max_size,
+                "open_connections": self._open_count,
+                "idle_connections": self._idle.qsize(),
+                "created": self._created,
+                "leaked": self._leaked,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "immutable": self.immutable,
+                "mmap_size": self.mmap_size,
+                "cache_size_kb": self.cache_size_kb,
+            }
+        result["in_memory"] = self.memory_stats()
+        return result
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+维度表缓存
+
+fonts、authors、books 三张维度表在运行期间几乎不变，却在每次加载页面时被整表读取，
+搜索时还要通过 LEFT JOIN 按名称过滤。这个模块在进程内缓存维度表：
+
+- 为 /api/options 提供现成的选项列表和 ETag
+- 把名称过滤条件翻译为整数ID，让查询直接命中 glyphs 表的列
+- 把查询结果中的ID翻译回名称，不再需要 JOIN 维度表
+
+缓存以连接池报告的数据版本（数据库文件以及 WAL 文件的修改时间，内存模式下为
+加载内存副本时的版本）作为版本，版本变化后自动重新加载。
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from logger import get_logger
+
+logger = get_logger()
+
+# 两次检查数据库文件版本的最小间隔（秒）
+DEFAULT_CHECK_INTERVAL = 1.0
+
+
+class Dimensions:
+    """某一时刻的维度表快照，创建后不再修改"""
+
+    def __init__(self, fonts, authors, books, version):
+        # fonts/authors/books: {id: name}
+        self.font_names = fonts
+        self.author_names = authors
+        self.book_titles = books
+        self.font_ids = {name: id_ for id_, name in fonts.items()}
+        self.author_ids = {name: id_ for id_, name in authors.items()}
+        self.book_ids = {title: id_ for id_, title in books.items()}
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.options = {
+            "fonts": sorted(self.font_ids),
+            "authors": sorted(self.author_ids),
+            "books": sorted(self.book_ids),
+        }
+        raw = json.dumps(self.options, ensure_ascii=False, sort_keys=True)
+        self.etag = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DimensionCache:
+    """进程内维度表缓存"""
+
+    def __init__(self, get_connection, get_version, check_interval=DEFAULT_CHECK_INTERVAL):
+        self._get_connection = get_connection
+        self._get_version = get_version
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_check = 0.0
+        self.loads = 0
+
+    def _load(self, version):
+        conn = self._get_connection()
+        try:
+            fonts = {row["id"]: row["name"] for row in conn.execute("SELECT id, name FROM fonts")}
+            authors = {row["id"]: row["name"] for row in conn.execute("SELECT id, name FROM authors")}
+            books = {row["id"]: row["title"] for row in conn.execute("SELECT id, title FROM books")}
+        finally:
+            conn.close()
+        self.loads += 1
+        logger.info(f"维度表已加载: 字体 {len(fonts)}，书法家 {len(authors)}，典籍 {len(books)}")
+        return Dimensions(fonts, authors, books, version)
+
+    def get(self):
+        """返回当前的维度表快照，必要时重新加载"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            self._last_check = now
+            version = self._get_version()
+            if self._snapshot is None or self._snapshot.version != version:
+                if self._snapshot is not None:
+                    logger.info("数据库已变化，重新加载维度表")
+                self._snapshot = self._load(version)
+            return self._snapshot
+
+    def invalidate(self):
+        """丢弃缓存，下次访问时重新加载"""
+        with self._lock:
+            self._snapshot = None
+            self._last_check = 0.0
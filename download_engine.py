@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+"""
+进程级下载引擎
+
+原来每次导出都会新建一个 ThreadPoolExecutor(max_workers=10)，十个并发导出就会
+产生一百个线程争抢同一个源站。这个模块在后台线程中运行一个 asyncio 事件循环，
+所有请求共享：
+
+- 全局并发上限：同一时刻最多执行 max_concurrency 个任务，线程数不随负载增长
+- 公平调度：每个请求提交的一批任务排成一个队列，调度器在各批次之间轮转取任务，
+  大批次不会饿死小批次
+- 取消：请求超时、出错或客户端断开时取消批次，尚未开始的任务直接丢弃
+
+任务本身（下载、解码、缩放）是阻塞调用，由事件循环放到共享线程池中执行。
+
+使用方法：
+    batch = download_engine.submit([(download_and_process_image, (img_id, url, size)), ...])
+    try:
+        results = batch.wait(timeout=60)  # 按提交顺序返回结果，失败的任务为 None
+    finally:
+        batch.cancel()
+
+需要部分结果时用 batch.wait_partial(timeout)：超时后取消未完成的任务，返回已完成的结果，
+未完成的位置为 None。
+
+环境变量：
+    MOTU_DOWNLOAD_CONCURRENCY: 全局并发上限（默认 16）
+"""
+
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+from collections import deque
+
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_CONCURRENCY = 16
+
+
+class Batch:
+    """一次请求提交的一批任务"""
+
+    def __init__(self, batch_id, jobs, engine):
+        self.id = batch_id
+        self.total = len(jobs)
+        self.results = [None] * self.total
+        self.completed = 0
+        self.errors = 0
+        self.cancelled = False
+        self._pending = deque(enumerate(jobs))
+        self._engine = engine
+        self._done = threading.Event()
+        if self.total == 0:
+            self._done.set()
+
+    def _job_finished(self, index, result, error):
+        # 只在事件循环线程中调用
+        if error is not None:
+            self.errors += 1
+            logger.warning(f"下载任务失败（批次 {self.id}，序号 {index}）: {error}")
+        else:
+            self.results[index] = result
+        self.completed += 1
+        if self.completed == self.total:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待批次完成，按提交顺序返回结果；超时抛出 TimeoutError"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"下载批次 {self.id} 超时，已完成 {self.completed}/{self.total}")
+        return list(self.results)
+
+    def wait_partial(self, timeout=None):
+        """等待批次完成；超时则取消未完成的任务，返回已完成的结果，其余为 None"""
+        try:
+            return self.wait(timeout)
+        except TimeoutError as e:
+            self.cancel()
+            logger.warning(f"{e}，未完成的任务按失败处理")
+            return list(self.results)
+
+    def cancel(self):
+        """取消批次中尚未开始的任务；已完成的批次调用无副作用"""
+        if self._done.is_set() or self.cancelled:
+            return
+        self.cancelled = True
+        self._engine._cancel(self)
+
+
+class DownloadEngine:
+    """在后台 asyncio 事件循环上调度下载任务的共享引擎"""
+
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get('MOTU_DOWNLOAD_CONCURRENCY', DEFAULT_CONCURRENCY))
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # 以下状态只在事件循环线程中访问
+        self._active = deque()  # 有待执行任务的批次，按轮转顺序排列
+        self._wakeup = None
+        self._running = 0
+        self._tasks = set()  # 持有正在运行的任务的引用，避免被垃圾回收
+
+        # 统计信息
+        self.submitted_batches = 0
+        self.completed_jobs = 0
+        self.cancelled_jobs = 0
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="download")
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._wakeup = asyncio.Event()
+                self._dispatcher = loop.create_task(self._dispatch())
+                ready.set()
+                loop.run_forever()
+                # 停止后取消剩余任务再关闭事件循环
+                pending = asyncio.all_tasks(loop)
+                for task in pending:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                loop.close()
+
+            self._thread = threading.Thread(target=run, name="download-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            logger.info(f"下载引擎已启动，全局并发上限: {self.max_concurrency}")
+
+    def submit(self, jobs):
+        """提交一批任务，jobs 为 (函数, 参数元组) 列表，返回 Batch"""
+        self._ensure_started()
+        batch = Batch(next(self._ids), list(jobs), self)
+        self.submitted_batches += 1
+        if batch.total:
+            self._loop.call_soon_threadsafe(self._enqueue, batch)
+        return batch
+
+    def _enqueue(self, batch):
+        if batch.cancelled:
+            return
+        self._active.append(batch)
+        self._wakeup.set()
+
+    def _cancel(self, batch):
+        def drop():
+            dropped = len(batch._pending)
+            batch._pending.clear()
+            if batch in self._active:
+                self._active.remove(batch)
+            self.cancelled_jobs += dropped
+            if dropped:
+                logger.info(f"下载批次 {batch.id} 已取消，丢弃 {dropped} 个未开始的任务")
+            batch._done.set()
+
+        self._loop.call_soon_threadsafe(drop)
+
+    def _next_job(self):
+        """轮转地从各批次中取下一个任务"""
+        while self._active:
+            batch = self._active.popleft()
+            if batch.cancelled or not batch._pending:
+                continue
+            index, job = batch._pending.popleft()
+            if batch._pending:
+                self._active.append(batch)
+            return batch, index, job
+        return None
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        while True:
+            await slots.acquire()
+            item = self._next_job()
+            while item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                item = self._next_job()
+            batch, index, (fn, args) = item
+            self._running += 1
+            task = loop.create_task(self._run(slots, batch, index, fn, args))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, slots, batch, index, fn, args):
+        loop = asyncio.get_running_loop()
+        result = None
+        error = None
+        try:
+            result = await loop.run_in_executor(self._executor, fn, *args)
+        except Exception as e:
+            error = e
+        finally:
+            self._running -= 1
+            self.completed_jobs += 1
+            slots.release()
+        if not batch.cancelled:
+            batch._job_finished(index, result, error)
+
+    def stats(self):
+        """返回下载引擎状态"""
+        active = list(self._active)
+        return {
+            "started": self._loop is not None,
+            "max_concurrency": self.max_concurrency,
+            "running_jobs": self._running,
+            "active_batches": len(active),
+            "pending_jobs": sum(len(batch._pending) for batch in active),
+            "submitted_batches": self.submitted_batches,
+            "completed_jobs": self.completed_jobs,
+            "cancelled_jobs": self.cancelled_jobs,
+        }
+
+    def shutdown(self):
+        """停止事件循环和线程池"""
+        with self._start_lock:
+            loop = self._loop
+            if loop is None:
+                return
+            self._loop = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+导出结果缓存
+
+用户调整界面后经常重新导出同样的排版，每次都要重新查询、下载、缩放、拼接和编码。
+这个模块把编码好的导出文件保存在磁盘上：
+
+- 缓存键是导出参数（图片ID序列、每行/列字数、排列方向、单字尺寸、质量档位、
+  格式和预设）的 SHA-256，相同的排版得到相同的键
+- 文件名为 <键>.<内容摘要>.<扩展名>，内容摘要同时作为强 ETag，
+  进程重启后从文件名即可恢复索引
+- 按字节数限制总大小，超出时淘汰最久未使用的文件（命中时更新文件修改时间）
+
+环境变量：
+    MOTU_EXPORT_CACHE_DIR: 缓存目录（默认 cache/exports，设为空字符串则禁用）
+    MOTU_EXPORT_CACHE_MB: 缓存大小上限，单位 MB（默认 256）
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "exports")
+DEFAULT_CACHE_MB = 256
+
+
+def export_cache_key(image_ids, cols, direction, target_size, quality, encoding_name):
+    """根据导出参数计算缓存键"""
+    ids = []
+    for img_id in image_ids:
+        if img_id is None or img_id == 'placeholder':
+            ids.append(None)
+        else:
+            try:
+                ids.append(int(img_id))
+            except (ValueError, TypeError):
+                ids.append(str(img_id))
+    raw = json.dumps({
+        "ids": ids,
+        "cols": cols,
+        "direction": direction,
+        "size": list(target_size),
+        "quality": quality,
+        "encoding": encoding_name,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CachedExport:
+    """磁盘上的一个导出文件"""
+
+    __slots__ = ("key", "path", "etag", "size")
+
+    def __init__(self, key, path, etag, size):
+        self.key = key
+        self.path = path
+        self.etag = etag
+        self.size = size
+
+
+class ExportCache:
+    """按字节数限制大小的磁盘导出缓存"""
+
+    def __init__(self, root=None, max_bytes=None):
+        if root is None:
+            root = os.environ.get('MOTU_EXPORT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('MOTU_EXPORT_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 * 1024
+        self.root = root or None
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.root:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                self._load()
+            except OSError as e:
+                logger.warning(f"无法使用导出缓存目录 {self.root}: {e}，导出缓存已禁用")
+                self.root = None
+
+    @property
+    def enabled(self):
+        return self.root is not None
+
+    def _load(self):
+        """扫描缓存目录重建索引，按修改时间从旧到新排列"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                parts = filename.split(".")
+                if len(parts) != 3:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, CachedExport(parts[0], path, parts[1], st.st_size)))
+        found.sort(key=lambda item: item[0])
+        for _, entry in found:
+            self._index[entry.key] = entry
+            self.current_bytes += entry.size
+        if found:
+            logger.info(f"导出缓存已加载: {len(found)} 个文件，{self.current_bytes} 字节")
+        self._evict()
+
+    def get(self, key):
+        """查找导出文件，返回 CachedExport 或 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if not os.path.exists(entry.path):
+                # 文件被外部删除
+                del self._index[key]
+                self.current_bytes -= entry.size
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(entry.path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, body, extension):
+        """保存导出文件，返回 CachedExport；缓存禁用或文件超过上限时返回 None"""
+        if not self.enabled or len(body) > self.max_bytes:
+            return None
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        directory = os.path.join(self.root, key[:2])
+        path = os.path.join(directory, f"{key}.{etag}.{extension}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入导出缓存失败: {e}")
+            return None
+
+        entry = CachedExport(key, path, etag, len(body))
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+                if old.path != path:
+                    self._remove_file(old.path)
+            self._index[key] = entry
+            self.current_bytes += entry.size
+            self._evict()
+        return entry
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._index:
+            _, entry = self._index.popitem(last=False)
+            self.current_bytes -= entry.size
+            self.evictions += 1
+            self._remove_file(entry.path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for entry in self._index.values():
+                self._remove_file(entry.path)
+            self._index.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "dir": self.root,
+                "items": len(self._index),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+异步导出任务
+
+几百个字的导出在一个请求内同步完成，耗时可能超过 nginx 的 60 秒 proxy_read_timeout。
+这个模块把大型导出放到有上限的后台线程池中执行：
+
+- 提交后立即返回任务ID，客户端轮询任务状态
+- 任务状态报告所处阶段和进度：已下载、已缩放的图片数，是否已编码
+- 完成的文件保存在任务目录中，过期（完成后超过 TTL）后连同文件一起清理
+- 排队的任务数有上限，超过时拒绝新任务，避免无限堆积
+
+使用方法：
+    job = export_jobs.submit(render, total=len(image_ids))   # render(job) 返回 (字节串, 编码设置)
+    job = export_jobs.get(job_id)
+    job.to_dict()
+
+环境变量：
+    MOTU_EXPORT_JOB_WORKERS: 同时执行的导出任务数（默认 2）
+    MOTU_EXPORT_JOB_MAX_QUEUED: 排队和执行中的任务数上限（默认 20）
+    MOTU_EXPORT_JOB_TTL: 完成的导出文件保留时间，单位秒（默认 600）
+    MOTU_EXPORT_JOB_DIR: 导出文件目录（默认 cache/jobs）
+"""
+
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUED = 20
+DEFAULT_TTL = 600
+DEFAULT_JOB_DIR = os.path.join("cache", "jobs")
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 执行阶段
+STAGE_DOWNLOADING = "downloading"
+STAGE_COMPOSING = "composing"
+STAGE_ENCODING = "encoding"
+
+
+class JobQueueFull(Exception):
+    """排队的导出任务已达上限"""
+
+
+class ExportJob:
+    """一个后台导出任务及其进度"""
+
+    def __init__(self, job_id, total):
+        self.id = job_id
+        self.total = total
+        self.state = QUEUED
+        self.stage = None
+        self.downloaded = 0
+        self.resized = 0
+        self.encoded = False
+        # 下载失败或不存在、以占位图代替的图片数
+        self.missing_images = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.expires_at = None
+        self.path = None
+        self.size = 0
+        self.encoding = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    def fetched(self):
+        """一张图片的原图已就绪（下载完成或命中缓存）"""
+        with self._lock:
+            self.downloaded += 1
+
+    def image_ready(self):
+        """一张图片已缩放完成"""
+        with self._lock:
+            self.resized += 1
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def progress(self):
+        """0~1 的总体进度：下载和缩放各占四成，进入拼接、编码阶段后继续推进，完成时为 1"""
+        if self.state == DONE:
+            return 1.0
+        value = 0.0
+        if self.total:
+            value += 0.4 * min(self.downloaded, self.total) / self.total
+            value += 0.4 * min(self.resized, self.total) / self.total
+        value += {STAGE_COMPOSING: 0.05, STAGE_ENCODING: 0.1}.get(self.stage, 0.0)
+        return round(value, 3)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "stage": self.stage,
+            "total": self.total,
+            "downloaded": self.downloaded,
+            "resized": self.resized,
+            "encoded": self.encoded,
+            "missing_images": self.missing_images,
+            "progress": self.progress(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.expires_at,
+            "size": self.size if self.state == DONE else None,
+            "format": self.encoding.name if self.encoding is not None else None,
+        }
+
+
+class ExportJobManager:
+    """有上限的后台导出线程池，完成的文件按 TTL 过期"""
+
+    def __init__(self, workers=None, max_queued=None, ttl=None, root=None):
+        if workers is None:
+            workers = int(os.environ.get('MOTU_EXPORT_JOB_WORKERS', DEFAULT_WORKERS))
+        if max_queued is None:
+            max_queued = int(os.environ.get('MOTU_EXPORT_JOB_MAX_QUEUED', DEFAULT_MAX_QUEUED))
+        if ttl is None:
+            ttl = int(os.environ.get('MOTU_EXPORT_JOB_TTL', DEFAULT_TTL))
+        if root is None:
+            root = os.environ.get('MOTU_EXPORT_JOB_DIR') or DEFAULT_JOB_DIR
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.root = root
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _ensure_executor(self):
+        # 调用时已持有 self._lock
+        if self._executor is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="export-job")
+
+    def submit(self, render, total):
+        """提交导出任务，render(job) 返回 (字节串, 编码设置)；队列已满时抛出 JobQueueFull"""
+        self.purge_expired()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_queued:
+                self.rejected += 1
+                raise JobQueueFull(f"导出任务已达上限 {self.max_queued}，请稍后重试")
+            self._ensure_executor()
+            job = ExportJob(uuid.uuid4().hex, total)
+            self._jobs[job.id] = job
+            self.submitted += 1
+            self._executor.submit(self._run, job, render)
+        logger.info(f"导出任务 {job.id} 已提交，共 {total} 张图片")
+        return job
+
+    def _run(self, job, render):
+        job.state = RUNNING
+        job.started_at = time.time()
+        path = None
+        state = FAILED
+        try:
+            body, encoding = render(job)
+            path = os.path.join(self.root, f"{job.id}.{encoding.extension}")
+            with open(path, "wb") as f:
+                f.write(body)
+            job.path = path
+            job.size = len(body)
+            job.encoding = encoding
+            job.encoded = True
+            state = DONE
+            self.completed += 1
+            logger.info(f"导出任务 {job.id} 完成: {len(body)} 字节，耗时 {time.time() - job.started_at:.2f} 秒")
+        except Exception as e:
+            job.error = str(e)
+            self.failed += 1
+            logger.error(f"导出任务 {job.id} 失败: {e}")
+            if path is not None:
+                self._remove_file(path)
+        finally:
+            # 先记录过期时间再公布状态，轮询方看到完成时过期时间已确定
+            job.finished_at = time.time()
+            job.expires_at = job.finished_at + self.ttl
+            job.state = state
+
+    def get(self, job_id):
+        """查找任务，不存在或已过期时返回 None"""
+        self.purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def purge_expired(self):
+        """清理已过期的任务及其文件"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.expires_at is not None and job.expires_at <= now]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.path:
+                self._remove_file(job.path)
+        if expired:
+            self.expired += len(expired)
+            logger.debug(f"已清理 {len(expired)} 个过期的导出任务")
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "ttl": self.ttl,
+            "queued": sum(1 for job in jobs if job.state == QUEUED),
+            "running": sum(1 for job in jobs if job.state == RUNNING),
+            "finished": sum(1 for job in jobs if job.finished),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+    def shutdown(self):
+        """停止线程池并删除所有任务文件"""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for job in jobs:
+            if job.path:
+                self._remove_file(job.path)
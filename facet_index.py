@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+单字分面索引
+
+集字页面中每点击一个字都会请求 /api/char_options，原来每次都要对 glyphs 表执行
+两条 DISTINCT + LEFT JOIN 查询。这个模块用一次 GROUP BY 扫描预先计算出每个字
+对应的书法家列表和典籍列表（含各自的字形数量），之后的查找只是一次字典访问。
+
+索引跟随维度表缓存的版本，数据库文件变化后会自动重建。
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from logger import get_logger
+
+logger = get_logger()
+
+
+class CharFacets:
+    """单个字的分面数据，列表按名称排序，数量与名称一一对应"""
+
+    __slots__ = ("authors", "author_counts", "books", "book_counts")
+
+    def __init__(self, author_counts, book_counts):
+        self.authors = sorted(author_counts)
+        self.author_counts = [author_counts[name] for name in self.authors]
+        self.books = sorted(book_counts)
+        self.book_counts = [book_counts[title] for title in self.books]
+
+    def to_dict(self):
+        return {
+            "authors": self.authors,
+            "books": self.books,
+            "author_counts": dict(zip(self.authors, self.author_counts)),
+            "book_counts": dict(zip(self.books, self.book_counts)),
+        }
+
+
+EMPTY_FACETS = CharFacets({}, {})
+
+
+class CharFacetIndex:
+    """每个字到书法家、典籍分面的内存索引"""
+
+    def __init__(self, get_connection, dimension_cache):
+        self._get_connection = get_connection
+        self._dimension_cache = dimension_cache
+        self._lock = threading.Lock()
+        self._facets = None
+        self._version = None
+        self.build_time = 0.0
+
+    def _build(self, dims):
+        start = time.perf_counter()
+        author_counts = defaultdict(lambda: defaultdict(int))
+        book_counts = defaultdict(lambda: defaultdict(int))
+
+        conn = self._get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT han, author_id, book_id, COUNT(*) AS n
+                FROM glyphs
+                GROUP BY han, author_id, book_id
+            """)
+            for han, author_id, book_id, n in rows:
+                author = dims.author_names.get(author_id)
+                if author is not None:
+                    author_counts[han][author] += n
+                book = dims.book_titles.get(book_id)
+                if book is not None:
+                    book_counts[han][book] += n
+        finally:
+            conn.close()
+
+        facets = {}
+        for han in author_counts.keys() | book_counts.keys():
+            facets[han] = CharFacets(author_counts.get(han, {}), book_counts.get(han, {}))
+
+        self.build_time = time.perf_counter() - start
+        logger.info(f"单字分面索引已构建: {len(facets)} 个字，耗时 {self.build_time:.2f} 秒")
+        return facets
+
+    def _current(self):
+        dims = self._dimension_cache.get()
+        if self._facets is not None and self._version == dims.version:
+            return self._facets
+        with self._lock:
+            if self._facets is None or self._version != dims.version:
+                self._facets = self._build(dims)
+                self._version = dims.version
+            return self._facets
+
+    def get(self, han):
+        """返回某个字的分面数据，字不存在时返回空分面"""
+        return self._current().get(han, EMPTY_FACETS)
+
+    def invalidate(self):
+        """丢弃索引，下次访问时重建"""
+        with self._lock:
+            self._facets = None
+            self._version = None
+
+    def size(self):
+        facets = self._facets
+        return len(facets) if facets is not None else 0
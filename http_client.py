@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""
+共享的图片下载客户端
+
+原来每张图片都通过 requests.get() 下载，每次都要重新建立 TCP/TLS 连接。
+这个模块提供进程内共享的下载客户端：
+
+- 每个源站一个 requests.Session，连接池保持长连接并在请求之间复用
+- 每个源站有并发上限，避免大量导出同时压向同一个源站
+- 原图保存在磁盘上，再次下载时带上 ETag/Last-Modified 做条件请求，
+  源站返回 304 时直接使用磁盘上的副本；副本与导出缓存一样按字节数限制总大小，
+  超出时淘汰最久未使用的原图
+- 统计请求数、新建连接数（据此计算连接复用率）和下载字节数
+
+环境变量：
+    MOTU_HTTP_POOL_SIZE: 每个源站的连接池大小（默认 10）
+    MOTU_HTTP_PER_HOST: 每个源站的最大并发请求数（默认 8）
+    MOTU_HTTP_TIMEOUT: 请求超时时间，单位秒（默认 10）
+    MOTU_ORIGINAL_CACHE_DIR: 原图磁盘缓存目录（默认 cache/originals，设为空字符串则禁用）
+    MOTU_ORIGINAL_CACHE_MB: 原图磁盘缓存大小上限，单位 MB（默认 1024）
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from export_cache import ExportCache
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_PER_HOST_LIMIT = 8
+DEFAULT_TIMEOUT = 10
+DEFAULT_ORIGINAL_CACHE_DIR = os.path.join("cache", "originals")
+DEFAULT_ORIGINAL_CACHE_MB = 1024
+
+
+class _HostClient:
+    """单个源站的会话和并发限制"""
+
+    def __init__(self, prefix, pool_size, per_host_limit):
+        self.prefix = prefix
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount(prefix, self.adapter)
+        self.semaphore = threading.BoundedSemaphore(per_host_limit)
+
+    def connections_created(self):
+        """该源站累计新建的连接数"""
+        pools = self.adapter.poolmanager.pools
+        total = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+        return total
+
+    def close(self):
+        self.session.close()
+
+
+class ImageHttpClient:
+    """带连接复用、并发限制和条件请求的图片下载客户端"""
+
+    def __init__(self, pool_size=None, per_host_limit=None, timeout=None, cache_dir=None, cache_bytes=None):
+        self.pool_size = pool_size or int(os.environ.get('MOTU_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.per_host_limit = per_host_limit or int(os.environ.get('MOTU_HTTP_PER_HOST', DEFAULT_PER_HOST_LIMIT))
+        self.timeout = timeout or float(os.environ.get('MOTU_HTTP_TIMEOUT', DEFAULT_TIMEOUT))
+        if cache_dir is None:
+            cache_dir = os.environ.get('MOTU_ORIGINAL_CACHE_DIR', DEFAULT_ORIGINAL_CACHE_DIR)
+        if cache_bytes is None:
+            cache_bytes = int(os.environ.get('MOTU_ORIGINAL_CACHE_MB', DEFAULT_ORIGINAL_CACHE_MB)) * 1024 * 1024
+        self.cache_dir = cache_dir or None
+        self.originals = None
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._remove_legacy_copies()
+            # 原图文件由 ExportCache 按字节数做LRU淘汰，旁边的 .json 只保存校验信息
+            self.originals = ExportCache(self.cache_dir, cache_bytes)
+            if not self.originals.enabled:
+                self.cache_dir = None
+                self.originals = None
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def _host_client(self, url):
+        parts = urlsplit(url)
+        prefix = f"{parts.scheme}://{parts.netloc}/"
+        with self._lock:
+            client = self._hosts.get(prefix)
+            if client is None:
+                client = _HostClient(prefix, self.pool_size, self.per_host_limit)
+                self._hosts[prefix] = client
+            return client
+
+    def _remove_legacy_copies(self):
+        """删除旧版本不受大小限制的 <URL哈希>.bin 副本，它们不在LRU的管理范围内"""
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if len(filename.split(".")) == 2 and filename.endswith(".bin"):
+                    try:
+                        os.remove(os.path.join(dirpath, filename))
+                        removed += 1
+                    except OSError:
+                        pass
+        if removed:
+            logger.info(f"已删除 {removed} 个旧格式的原图副本")
+
+    @staticmethod
+    def _cache_key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _read_cached(self, url):
+        """读取磁盘上的原图副本和校验信息"""
+        if not self.cache_dir:
+            return None, {}
+        key = self._cache_key(url)
+        meta_path = self._meta_path(key)
+        entry = self.originals.get(key)
+        try:
+            if entry is None:
+                # 原图已被淘汰，校验信息随之失效
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                return None, {}
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(entry.path, "rb") as f:
+                return f.read(), meta
+        except (OSError, ValueError):
+            return None, {}
+
+    def _write_cached(self, url, body, response):
+        meta = {}
+        if response.headers.get("ETag"):
+            meta["etag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            meta["last_modified"] = response.headers["Last-Modified"]
+        if not self.cache_dir or not meta:
+            # 源站没有提供校验信息时无法做条件请求，不保存副本
+            return
+        key = self._cache_key(url)
+        if self.originals.put(key, body, "bin") is None:
+            # 超过上限的原图不保存
+            return
+        meta_path = self._meta_path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8"))
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            logger.warning(f"保存原图校验信息失败: {url}, 错误: {e}")
+
+    def fetch(self, url):
+        """下载图片内容，返回字节串；失败时抛出 requests 的异常"""
+        client = self._host_client(url)
+        cached_body, meta = self._read_cached(url)
+        headers = {}
+        if cached_body is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        with client.semaphore:
+            try:
+                response = client.session.get(url, headers=headers, timeout=self.timeout)
+                with self._lock:
+                    self.requests += 1
+                if response.status_code == 304 and cached_body is not None:
+                    with self._lock:
+                        self.not_modified += 1
+                    logger.debug(f"原图未变化，使用磁盘副本: {url}")
+                    return cached_body
+                response.raise_for_status()
+                body = response.content
+            except requests.RequestException:
+                with self._lock:
+                    self.errors += 1
+                raise
+
+        with self._lock:
+            self.bytes_fetched += len(body)
+        self._write_cached(url, body, response)
+        return body
+
+    def stats(self):
+        """返回下载统计信息"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+            requests_count = self.requests
+            result = {
+                "requests": requests_count,
+                "bytes_fetched": self.bytes_fetched,
+                "not_modified": self.not_modified,
+                "errors": self.errors,
+                "hosts": len(hosts),
+                "pool_size": self.pool_size,
+                "per_host_limit": self.per_host_limit,
+            }
+        if self.originals is not None:
+            result["original_cache"] = self.originals.stats()
+        connections = sum(client.connections_created() for client in hosts)
+        result["connections_created"] = connections
+        result["reuse_rate"] = round(1 - connections / requests_count, 4) if requests_count else 0.0
+        return result
+
+    def close(self):
+        with self._lock:
+            hosts = list(self._hosts.values())
+            self._hosts.clear()
+        for client in hosts:
+            client.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+集字导出的网格排版
+
+两个导出接口原来各自带着一份相同的五分支排列代码。这个模块统一计算排版：
+先按排列方向用闭式公式一次算出所有格子的像素坐标，再把单字图片贴到预先分配的
+画布上（整张拼接或按行带拼接）。
+
+排列方向：
+    horizontal          从左到右，从上到下（默认）；cols 为每行字数
+    horizontal-reverse  从右到左，从上到下
+    vertical-left       从上到下，从左到右换列；cols 为每列字数
+    vertical-right      从上到下，从右到左换列
+
+使用方法：
+    layout = GridLayout(len(images), cols, direction, (120, 120))
+    canvas = layout.compose(images)
+    # 或者按行带产出，交给流式编码器
+    for band in layout.iter_bands(images): ...
+"""
+
+from PIL import Image
+
+DIRECTIONS = ("horizontal", "horizontal-reverse", "vertical-left", "vertical-right")
+DEFAULT_DIRECTION = "horizontal"
+# 画布背景色：透明的白色
+BACKGROUND = (255, 255, 255, 0)
+
+
+def parse_cols(cols):
+    """把每行/列字数转换为正整数，无效时抛出 ValueError"""
+    try:
+        cols = int(cols)
+    except (TypeError, ValueError):
+        raise ValueError(f"每行/列字数必须是整数: {cols!r}")
+    if cols < 1:
+        raise ValueError(f"每行/列字数必须大于0: {cols}")
+    return cols
+
+
+class GridLayout:
+    """一次导出的网格排版：网格大小、画布尺寸和每个格子的位置"""
+
+    def __init__(self, count, cols, direction=DEFAULT_DIRECTION, cell_size=(120, 120)):
+        cols = parse_cols(cols)
+        if direction not in DIRECTIONS:
+            # 与原来的行为一致，未知方向按水平排列
+            direction = DEFAULT_DIRECTION
+
+        self.count = count
+        self.cols = cols
+        self.direction = direction
+        self.cell_size = tuple(cell_size)
+
+        vertical = direction in ("vertical-left", "vertical-right")
+        if vertical:
+            # 竖排时 cols 表示每列字数
+            self.grid_cols = (count + cols - 1) // cols
+            self.grid_rows = cols
+        else:
+            self.grid_cols = cols
+            self.grid_rows = (count + cols - 1) // cols
+
+        # 每个格子的 (列, 行)
+        indices = range(count)
+        if vertical:
+            cells_col = [i // cols for i in indices]
+            cells_row = [i % cols for i in indices]
+            if direction == "vertical-right":
+                last = self.grid_cols - 1
+                cells_col = [last - c for c in cells_col]
+        else:
+            cells_col = [i % cols for i in indices]
+            cells_row = [i // cols for i in indices]
+            if direction == "horizontal-reverse":
+                cells_col = [cols - 1 - c for c in cells_col]
+        self.cells = list(zip(cells_col, cells_row))
+
+    @property
+    def size(self):
+        """画布尺寸"""
+        w, h = self.cell_size
+        return w * self.grid_cols, h * self.grid_rows
+
+    @property
+    def positions(self):
+        """每个格子左上角的像素坐标"""
+        w, h = self.cell_size
+        return [(col * w, row * h) for col, row in self.cells]
+
+    def rows(self):
+        """按网格行分组，返回每行的 [(列, 序号), ...]"""
+        rows = [[] for _ in range(self.grid_rows)]
+        for idx, (col, row) in enumerate(self.cells):
+            rows[row].append((col, idx))
+        return rows
+
+    def compose(self, images):
+        """把所有单字图片贴到一张预先分配的画布上"""
+        canvas = Image.new("RGBA", self.size, BACKGROUND)
+        paste = canvas.paste
+        for img, position in zip(images, self.positions):
+            paste(img, position)
+        return canvas
+
+    def iter_bands(self, images):
+        """按网格行逐个产出行带图像，每个行带是一行字的高度"""
+        w, h = self.cell_size
+        width = self.size[0]
+        for cells in self.rows():
+            band = Image.new("RGBA", (width, h), BACKGROUND)
+            for col, idx in cells:
+                band.paste(images[idx], (col * w, 0))
+            yield band
+
+    def to_dict(self):
+        """排版信息，供接口返回或调试使用"""
+        width, height = self.size
+        return {
+            "direction": self.direction,
+            "cols": self.cols,
+            "grid_cols": self.grid_cols,
+            "grid_rows": self.grid_rows,
+            "width": width,
+            "height": height,
+            "cell_size": list(self.cell_size),
+            "positions": [list(p) for p in self.positions],
+        }
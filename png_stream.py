@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+流式 PNG 编码
+
+导出长文本时，原来的做法是先拼出完整的 RGBA 画布，再整张编码进 BytesIO，
+最后一次性发送：内存中同时存在画布和编码结果，客户端要等编码全部完成才能收到
+第一个字节。这个模块按行带（一行字的高度）拼接和编码：
+
+- 文件头（签名 + IHDR）立即发出
+- 每拼好一个行带就把它的扫描线送入 zlib，压缩输出攒够一块就作为 IDAT 块发出
+- 内存占用只与行带大小有关，与总行数无关
+
+只支持 PNG：WebP、JPEG 编码器需要完整的图像，无法按行带增量输出。
+
+使用方法：
+    layout = GridLayout(len(images), cols, direction, (120, 120))
+    width, height = layout.size
+    return Response(stream_png(width, height, layout.iter_bands(images)), mimetype="image/png")
+"""
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 攒够这么多压缩数据就发出一个 IDAT 块
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _chunk(tag, data):
+    """打包一个 PNG 块：长度 + 类型 + 数据 + CRC"""
+    crc = zlib.crc32(data, zlib.crc32(tag))
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc & 0xFFFFFFFF)
+
+
+def stream_png(width, height, bands, compress_level=6, chunk_size=DEFAULT_CHUNK_SIZE):
+    """把 RGBA 行带序列编码为 PNG，逐块产出字节串
+
+    bands 中每个行带的宽度必须为 width，高度之和必须为 height。
+    扫描线不做预测滤波（滤波类型 0）。
+    """
+    yield PNG_SIGNATURE + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    compressor = zlib.compressobj(compress_level)
+    stride = width * 4
+    pending = []
+    pending_size = 0
+    rows = 0
+
+    for band in bands:
+        if band.mode != "RGBA":
+            band = band.convert("RGBA")
+        if band.width != width:
+            raise ValueError(f"行带宽度 {band.width} 与图像宽度 {width} 不一致")
+        raw = band.tobytes()
+        # 每条扫描线前加滤波类型字节 0
+        lines = bytearray()
+        for offset in range(0, len(raw), stride):
+            lines.append(0)
+            lines += raw[offset:offset + stride]
+        rows += band.height
+
+        data = compressor.compress(bytes(lines))
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+        if pending_size >= chunk_size:
+            yield _chunk(b"IDAT", b"".join(pending))
+            pending = []
+            pending_size = 0
+
+    if rows != height:
+        raise ValueError(f"行带总高度 {rows} 与图像高度 {height} 不一致")
+
+    pending.append(compressor.flush())
+    yield _chunk(b"IDAT", b"".join(pending)) + _chunk(b"IEND", b"")
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+后台预取队列
+
+/api/generate_calligraphy 返回时已经知道用户接下来要导出哪些图片，但原来什么也不下载，
+导出时所有网络延迟都落在前台。这个模块在生成集字后把这些图片放进低优先级的后台队列，
+提前下载并缩放进缩略图缓存，随后的导出可以全部从缓存中读取。
+
+- 两级优先级：每个字的第一张图片（默认导出的那张）先于其他候选图片
+- 让路：有导出正在进行时（foreground() 上下文内）后台线程暂停取新任务，
+  已经开始的任务继续完成
+- 缓存压力：压力值达到阈值时丢弃所有尚未开始的预取任务，避免挤掉正在使用的缩略图。
+  应用中压力值是预取后尚未被使用的缩略图占内存缓存的比例；不要用缓存使用率，
+  LRU 装满后使用率一直接近 1，预取会被永久关闭
+- 同一张图片同一尺寸只排队一次；真正的下载由调用方提供的 loader 完成
+  （应用中经过单飞合并，与导出同时请求同一张图片时只下载一次）
+
+使用方法：
+    prefetcher = PrefetchQueue(loader, pressure=lambda: cache.unused_ratio())
+    prefetcher.submit([(img_id, url, priority), ...], (120, 120), "print")
+    with prefetcher.foreground():
+        ...  # 导出期间暂停预取
+
+环境变量：
+    MOTU_PREFETCH_WORKERS: 后台预取线程数（默认 2，设为 0 则禁用预取）
+    MOTU_PREFETCH_MAX_PENDING: 队列中最多等待的任务数（默认 2000）
+    MOTU_PREFETCH_MAX_USAGE: 预取后尚未使用的缩略图占内存缓存的比例达到这个值时取消预取（默认 0.5）
+"""
+
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 2000
+DEFAULT_MAX_USAGE = 0.5
+# 优先级：每个字的第一张图片、其余候选图片
+PRIORITY_FIRST = 0
+PRIORITY_VARIANT = 1
+
+
+class PrefetchQueue:
+    """低优先级的后台缩略图预取队列"""
+
+    def __init__(self, loader, pressure=None, workers=None, max_pending=None, max_usage=None):
+        if workers is None:
+            workers = int(os.environ.get('MOTU_PREFETCH_WORKERS', DEFAULT_WORKERS))
+        if max_pending is None:
+            max_pending = int(os.environ.get('MOTU_PREFETCH_MAX_PENDING', DEFAULT_MAX_PENDING))
+        if max_usage is None:
+            max_usage = float(os.environ.get('MOTU_PREFETCH_MAX_USAGE', DEFAULT_MAX_USAGE))
+        self.loader = loader
+        self.pressure = pressure
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_usage = max_usage
+
+        self._queues = (deque(), deque())
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._foreground = 0
+        self._running = 0
+        self._threads = []
+        self._stopped = False
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.preempted = 0
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def pending(self):
+        return sum(len(q) for q in self._queues)
+
+    def _under_pressure(self):
+        if self.pressure is None:
+            return False
+        try:
+            return self.pressure() >= self.max_usage
+        except Exception as e:
+            logger.warning(f"读取预取压力失败: {e}")
+            return False
+
+    def submit(self, items, target_size, quality):
+        """加入预取任务，items 为 (图片ID, URL, 优先级) 列表，返回实际排队的任务数"""
+        if not self.enabled or self._stopped:
+            return 0
+        if self._under_pressure():
+            logger.debug("预取后尚未使用的缩略图过多，跳过预取")
+            return 0
+        added = 0
+        with self._cond:
+            self._ensure_started()
+            for img_id, url, priority in items:
+                if self.pending() >= self.max_pending:
+                    break
+                key = (img_id, tuple(target_size), quality)
+                if key in self._queued:
+                    continue
+                self._queued.add(key)
+                queue = self._queues[PRIORITY_FIRST if priority == PRIORITY_FIRST else PRIORITY_VARIANT]
+                queue.append((key, url))
+                added += 1
+            self.submitted += added
+            if added:
+                self._cond.notify_all()
+        if added:
+            logger.debug(f"已加入 {added} 个预取任务，队列中共 {self.pending()} 个")
+        return added
+
+    def _ensure_started(self):
+        # 调用时已持有 self._cond
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"prefetch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @contextmanager
+    def foreground(self):
+        """前台任务（导出）期间暂停预取"""
+        with self._cond:
+            self._foreground += 1
+            if self.pending():
+                self.preempted += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                if self._foreground == 0:
+                    self._cond.notify_all()
+
+    def cancel_all(self):
+        """丢弃所有尚未开始的预取任务，返回丢弃的数量"""
+        with self._cond:
+            dropped = self.pending()
+            for queue in self._queues:
+                queue.clear()
+            self._queued.clear()
+            self.cancelled += dropped
+            self._cond.notify_all()
+        if dropped:
+            logger.info(f"已取消 {dropped} 个预取任务")
+        return dropped
+
+    def _next_task(self):
+        """等待并取出下一个任务；停止时返回 None"""
+        while True:
+            with self._cond:
+                while not self._stopped and (self._foreground or not self.pending()):
+                    self._cond.wait()
+                if self._stopped:
+                    return None
+            # 在锁外读取压力值，避免与缓存的锁嵌套
+            if self._under_pressure():
+                self.cancel_all()
+                continue
+            with self._cond:
+                if self._stopped:
+                    return None
+                if self._foreground:
+                    continue
+                for queue in self._queues:
+                    if queue:
+                        key, url = queue.popleft()
+                        self._queued.discard(key)
+                        self._running += 1
+                        return key, url
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            (img_id, target_size, quality), url = task
+            try:
+                self.loader(img_id, url, target_size, quality)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"预取图片ID {img_id} 失败: {e}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """等待队列清空且没有正在执行的任务，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.pending() and not self._running, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "workers": self.workers,
+                "pending": self.pending(),
+                "pending_first": len(self._queues[PRIORITY_FIRST]),
+                "running": self._running,
+                "paused": self._foreground > 0,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "preempted": self.preempted,
+            }
+
+    def shutdown(self):
+        """停止后台线程，丢弃尚未开始的任务"""
+        self.cancel_all()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
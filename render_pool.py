@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+缩略图渲染后端
+
+下载命中缓存之后，导出的主要开销是解码原图和 LANCZOS 缩放。这些工作原来都在
+Flask 的请求线程里完成，一个 Python 进程基本只能用满一个核。这个模块把
+"原图字节 -> 缩略图像素" 这一步抽象为渲染后端：
+
+- thread（默认）：在调用线程中直接渲染，行为与原来相同
+- process：交给进程池渲染，多个核并行解码和缩放
+
+进程之间只传递原图字节和紧凑的像素缓冲区（模式、尺寸、原始字节），
+不序列化 PIL 对象。
+
+解码时先用 JPEG draft() 和 reduce() 把大图缩小到接近目标尺寸，再按质量档位
+重采样：preview（BILINEAR，较快）或 print（LANCZOS，默认）。
+
+环境变量：
+    MOTU_RENDER_BACKEND: 渲染后端，thread 或 process（默认 thread）
+    MOTU_RENDER_WORKERS: process 后端的工作进程数（默认为 CPU 核数）
+    MOTU_RENDER_QUALITY: 默认质量档位，preview 或 print（默认 print）
+"""
+
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import threading
+
+from PIL import Image, ImageChops
+
+from logger import get_logger
+from thumb_cache import PixelBuffer
+
+logger = get_logger()
+
+DEFAULT_BACKEND = "thread"
+
+# 质量档位：preview 用于页面预览，print 用于导出打印
+QUALITY_FILTERS = {
+    "preview": Image.BILINEAR,
+    "print": Image.LANCZOS,
+}
+# 缩小阶段保留的余量（目标尺寸的倍数），余量越大最终重采样的质量越接近直接缩放
+REDUCING_GAP = {
+    "preview": 1,
+    "print": 2,
+}
+DEFAULT_QUALITY = os.environ.get('MOTU_RENDER_QUALITY', 'print')
+if DEFAULT_QUALITY not in QUALITY_FILTERS:
+    DEFAULT_QUALITY = "print"
+
+
+def decode_thumbnail(content, target_size, quality=DEFAULT_QUALITY):
+    """把原图字节解码并缩放到目标尺寸，返回 RGBA 的 PIL 图片（灰度原图保持 L/LA）
+
+    大图不在原始分辨率上直接重采样：
+    - JPEG 用 draft() 让解码器按 1/2、1/4、1/8 缩放解码，像素量和内存峰值随之下降
+    - 其他格式用 reduce() 按整数倍做盒式缩小
+    两步都保留目标尺寸的 REDUCING_GAP 倍余量，再用质量档位对应的滤镜做最后一次重采样。
+    """
+    target_size = tuple(target_size)
+    resample = QUALITY_FILTERS.get(quality, QUALITY_FILTERS[DEFAULT_QUALITY])
+    gap = REDUCING_GAP.get(quality, REDUCING_GAP[DEFAULT_QUALITY])
+    tw, th = target_size
+
+    img = Image.open(io.BytesIO(content))
+    if img.format == "JPEG":
+        img.draft("RGB", (tw * gap, th * gap))
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        # reduce() 不支持调色板等模式
+        img = img.convert("RGBA")
+
+    factor = min(img.width // (tw * gap), img.height // (th * gap))
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    if img.mode not in ("L", "LA"):
+        img = img.convert("RGBA")
+    if img.size != target_size:
+        img = img.resize(target_size, resample)
+    return img
+
+
+def compact_mode(img, tolerance=0):
+    """把缩略图转为能表示它的最小模式，用于长期存储
+
+    alpha 通道完全不透明时去掉；RGB 三个通道与灰度值相差都不超过 tolerance 时转为 L/LA。
+    """
+    if img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema()[0] == 255:
+        img = img.convert("RGB" if img.mode == "RGBA" else "L")
+    if img.mode in ("RGB", "RGBA"):
+        rgb = img.convert("RGB")
+        gray = rgb.convert("L")
+        diff = ImageChops.difference(rgb, Image.merge("RGB", (gray, gray, gray)))
+        if max(high for _, high in diff.getextrema()) <= tolerance:
+            img = Image.merge("LA", (gray, img.getchannel("A"))) if img.mode == "RGBA" else gray
+    return img
+
+
+def render_thumbnail(content, target_size, quality=DEFAULT_QUALITY):
+    """渲染缩略图，返回 (模式, 尺寸, 像素字节)
+
+    定义在模块顶层，可以被工作进程按名称导入执行。
+    """
+    img = decode_thumbnail(content, target_size, quality)
+    return img.mode, img.size, img.tobytes()
+
+
+def normalize_quality(quality):
+    """把请求中的质量档位规范化，未知值使用默认档位"""
+    quality = (quality or "").lower()
+    return quality if quality in QUALITY_FILTERS else DEFAULT_QUALITY
+
+
+class ThreadRenderBackend:
+    """在调用线程中渲染"""
+
+    name = "thread"
+
+    def __init__(self):
+        self.rendered = 0
+        self._lock = threading.Lock()
+
+    def render(self, content, target_size, quality=DEFAULT_QUALITY):
+        buf = PixelBuffer(*render_thumbnail(content, target_size, quality))
+        with self._lock:
+            self.rendered += 1
+        return buf
+
+    def stats(self):
+        return {"backend": self.name, "rendered": self.rendered}
+
+    def shutdown(self):
+        pass
+
+
+class ProcessRenderBackend:
+    """在进程池中渲染，调用线程阻塞等待结果"""
+
+    name = "process"
+
+    def __init__(self, workers=None):
+        self.workers = workers or int(os.environ.get('MOTU_RENDER_WORKERS', 0)) or os.cpu_count() or 1
+        # 请求线程中可能持有锁，fork 出的子进程会继承这些锁的状态，
+        # 因此优先使用 forkserver，工作进程由一个干净的服务进程派生
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context)
+        self.rendered = 0
+        self._lock = threading.Lock()
+        logger.info(f"渲染进程池已创建，工作进程数: {self.workers}")
+
+    def render(self, content, target_size, quality=DEFAULT_QUALITY):
+        future = self._executor.submit(render_thumbnail, content, tuple(target_size), quality)
+        buf = PixelBuffer(*future.result())
+        with self._lock:
+            self.rendered += 1
+        return buf
+
+    def stats(self):
+        return {"backend": self.name, "workers": self.workers, "rendered": self.rendered}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def create_render_backend(name=None, workers=None):
+    """按名称或环境变量创建渲染后端"""
+    name = (name or os.environ.get('MOTU_RENDER_BACKEND', DEFAULT_BACKEND)).lower()
+    if name == "process":
+        return ProcessRenderBackend(workers)
+    if name != "thread":
+        logger.warning(f"未知的渲染后端 {name}，使用 thread")
+    return ThreadRenderBackend()
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""
+内存搜索索引
+
+字形目录几乎只读，但每次 /api/search 都要在 SQLite 中重新过滤 glyphs 表。
+这个模块把 glyphs 表一次性读入内存，之后的搜索不再访问数据库：
+
+- 列存：按 id 排序的 id、han、font_id、author_id、book_id 五列（array 紧凑存储）
+- 倒排：每个字、字体、书法家、典籍对应一个有序的行号数组（array('I')，每行 4 字节）；
+  只有行数超过总行数 1/DENSE_RATIO 的取值改用位图（Python 整数，第 i 位表示第 i 行，
+  N/8 字节），这样每个维度的倒排总共不超过约 4N 字节，不随取值数量增长
+- 精确总数：行号列表的长度，或位图的 bit_count()
+- 分页：按行号顺序取出结果，行号顺序就是 id 顺序，与 SQL 的 ORDER BY id 一致
+- 分面：字体、书法家、典籍各取值在当前条件下的数量
+
+按字或稀疏取值过滤时，从最短的行号数组出发逐行比较其余条件的维度列；
+只按稠密取值过滤时对位图求交集，按 64 位字块跳过不需要的置位。
+
+索引跟随维度表缓存的版本，数据库文件变化后自动重建。
+
+环境变量：
+    MOTU_SEARCH_INDEX: 设为 true 时启用内存索引（默认 false，使用 SQL 查询）
+"""
+
+import heapq
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from itertools import compress
+
+from logger import get_logger
+
+logger = get_logger()
+
+# 列中表示 NULL 的值，不会与任何真实ID或未知名称的ID相等
+NULL_ID = -(1 << 63)
+# 取值的行数超过总行数的 1/DENSE_RATIO 时，位图（N/8 字节）比行号数组（每行 4 字节）更省内存
+DENSE_RATIO = 32
+_EMPTY = array("I")
+# 把位图的二进制字符串转换为每行一个 0/1 字节
+_BIT_SELECTORS = bytes.maketrans(b"01", b"\x00\x01")
+# 每个快照缓存的分面结果数量（翻页时条件不变，分面只需计算一次）
+FACET_CACHE_SIZE = 256
+
+
+def _bitset(positions):
+    """把行号序列转换为位图"""
+    data = bytearray((max(positions) >> 3) + 1) if positions else bytearray()
+    for p in positions:
+        data[p >> 3] |= 1 << (p & 7)
+    return int.from_bytes(data, "little")
+
+
+def iter_bits(bitset, start=0, skip=0):
+    """按从小到大的顺序产出位图中 >= start 的置位，先跳过 skip 个"""
+    bitset >>= start
+    if not bitset:
+        return
+    nbytes = (bitset.bit_length() + 63) // 64 * 8
+    words = memoryview(bitset.to_bytes(nbytes, "little")).cast("Q")
+    base = start
+    for word in words:
+        if word:
+            if skip:
+                n = word.bit_count()
+                if n <= skip:
+                    skip -= n
+                    base += 64
+                    continue
+            while word:
+                low = word & -word
+                if skip:
+                    skip -= 1
+                else:
+                    yield base + low.bit_length() - 1
+                word ^= low
+        base += 64
+
+
+class IndexSnapshot:
+    """某一版本的 glyphs 表内存索引，创建后不再修改"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.ids = array("q")
+        self.font_ids = array("q")
+        self.author_ids = array("q")
+        self.book_ids = array("q")
+        self.hans = []
+        by_han = defaultdict(lambda: array("I"))
+        by_font = defaultdict(list)
+        by_author = defaultdict(list)
+        by_book = defaultdict(list)
+        interned = {}
+
+        for pos, (glyph_id, han, font_id, author_id, book_id) in enumerate(rows):
+            han = interned.setdefault(han, han)
+            self.ids.append(glyph_id)
+            self.hans.append(han)
+            self.font_ids.append(NULL_ID if font_id is None else font_id)
+            self.author_ids.append(NULL_ID if author_id is None else author_id)
+            self.book_ids.append(NULL_ID if book_id is None else book_id)
+            by_han[han].append(pos)
+            by_font[font_id].append(pos)
+            by_author[author_id].append(pos)
+            by_book[book_id].append(pos)
+
+        self.by_han = dict(by_han)
+        self.by_font = self._postings(by_font)
+        self.by_author = self._postings(by_author)
+        self.by_book = self._postings(by_book)
+        self.all_rows = (1 << len(self.ids)) - 1
+        self._facet_cache = OrderedDict()
+        self._facet_lock = threading.Lock()
+        # 没有其他条件时的分面计数
+        self.dimension_counts = {
+            "font": {key: len(positions) for key, positions in by_font.items() if key is not None},
+            "author": {key: len(positions) for key, positions in by_author.items() if key is not None},
+            "book": {key: len(positions) for key, positions in by_book.items() if key is not None},
+        }
+
+    def _postings(self, by_value):
+        """稠密的取值存为位图，其余存为有序行号数组"""
+        threshold = len(self.ids) // DENSE_RATIO
+        return {key: _bitset(positions) if len(positions) > threshold else array("I", positions)
+                for key, positions in by_value.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """列存和倒排占用的内存（估算，不含 Python 对象开销）"""
+        total = sum(column.itemsize * len(column)
+                    for column in (self.ids, self.font_ids, self.author_ids, self.book_ids))
+        total += sum(positions.itemsize * len(positions) for positions in self.by_han.values())
+        for index in (self.by_font, self.by_author, self.by_book):
+            for posting in index.values():
+                if isinstance(posting, int):
+                    total += (posting.bit_length() + 7) // 8
+                else:
+                    total += posting.itemsize * len(posting)
+        return total
+
+    def row(self, pos):
+        font_id = self.font_ids[pos]
+        author_id = self.author_ids[pos]
+        book_id = self.book_ids[pos]
+        return {
+            "id": self.ids[pos],
+            "han": self.hans[pos],
+            "font_id": None if font_id == NULL_ID else font_id,
+            "author_id": None if author_id == NULL_ID else author_id,
+            "book_id": None if book_id == NULL_ID else book_id,
+        }
+
+    def match(self, hans=None, font_id=None, author_id=None, book_id=None):
+        """返回满足条件的行集合：("rows", 有序行号列表) 或 ("bits", 位图)"""
+        filters = [(column, index.get(key, _EMPTY), key)
+                   for column, index, key in ((self.font_ids, self.by_font, font_id),
+                                              (self.author_ids, self.by_author, author_id),
+                                              (self.book_ids, self.by_book, book_id))
+                   if key is not None]
+        if hans:
+            lists = [self.by_han[h] for h in dict.fromkeys(hans) if h in self.by_han]
+            positions = lists[0].tolist() if len(lists) == 1 else list(heapq.merge(*lists))
+        else:
+            sparse = [i for i, (_, posting, _) in enumerate(filters) if not isinstance(posting, int)]
+            if not sparse:
+                # 只有稠密条件（或没有条件）：位图求交集
+                bits = self.all_rows
+                for _, posting, _ in filters:
+                    bits &= posting
+                return "bits", bits
+            # 从最短的行号数组出发
+            start = min(sparse, key=lambda i: len(filters[i][1]))
+            positions = filters.pop(start)[1].tolist()
+        # 候选行很少，直接比较其余条件的维度列
+        for column, _, key in filters:
+            positions = [p for p in positions if column[p] == key]
+        return "rows", positions
+
+    def _count_bits(self, base, column, index):
+        """统计位图中的行在某个维度上各取值的数量"""
+        if all(isinstance(bits, int) for bits in index.values()):
+            # 取值都是稠密的（最多 DENSE_RATIO 个）：与每个取值的位图求交集
+            counts = {}
+            for key, bits in index.items():
+                if key is None:
+                    continue
+                n = (base & bits).bit_count()
+                if n:
+                    counts[key] = n
+            return counts
+        # 把位图展开为每行一个字节的选择器，在 C 层筛选维度列后计数
+        selectors = format(base, f"0{len(self.ids)}b")[::-1].encode("ascii").translate(_BIT_SELECTORS)
+        counts = Counter(compress(column, selectors))
+        counts.pop(NULL_ID, None)
+        return counts
+
+    def facet_counts(self, hans=None, font_id=None, author_id=None, book_id=None):
+        """各维度取值的字形数量：{"font": {ID: 数量}, "author": {...}, "book": {...}}
+
+        每个维度的计数应用其余所有条件，但不应用它自己的条件，
+        这样选中一个书法家后仍能看到切换到其他书法家时的结果数。
+        结果按条件缓存在快照中，调用方不要修改返回的字典。
+        """
+        cache_key = (tuple(dict.fromkeys(hans)) if hans else None, font_id, author_id, book_id)
+        with self._facet_lock:
+            cached = self._facet_cache.get(cache_key)
+            if cached is not None:
+                self._facet_cache.move_to_end(cache_key)
+                return cached
+
+        filters = {"font": font_id, "author": author_id, "book": book_id}
+        dimensions = (("font", self.font_ids, self.by_font),
+                      ("author", self.author_ids, self.by_author),
+                      ("book", self.book_ids, self.by_book))
+        result = {}
+        for name, column, index in dimensions:
+            others = {f"{key}_id": (None if key == name else value) for key, value in filters.items()}
+            if not hans and all(value is None for value in others.values()):
+                counts = self.dimension_counts[name]
+            else:
+                kind, matched = self.match(hans, **others)
+                if kind == "rows":
+                    counts = Counter(map(column.__getitem__, matched))
+                    counts.pop(NULL_ID, None)
+                else:
+                    counts = self._count_bits(matched, column, index)
+            result[name] = dict(counts)
+
+        with self._facet_lock:
+            self._facet_cache[cache_key] = result
+            if len(self._facet_cache) > FACET_CACHE_SIZE:
+                self._facet_cache.popitem(last=False)
+        return result
+
+    def query(self, hans=None, font_id=None, author_id=None, book_id=None,
+              offset=0, limit=None, after_id=None):
+        """按条件查询一页结果，返回 (行字典列表, 精确总数)
+
+        after_id 不为 None 时返回 id 大于它的结果（游标分页），否则跳过 offset 条。
+        limit 为 None 时返回全部结果。
+        """
+        kind, matched = self.match(hans, font_id, author_id, book_id)
+        start = 0 if after_id is None else bisect_right(self.ids, after_id)
+        if kind == "rows":
+            total = len(matched)
+            if after_id is not None:
+                offset = bisect_left(matched, start)
+            end = None if limit is None else offset + limit
+            positions = matched[offset:end]
+        else:
+            total = matched.bit_count()
+            positions = []
+            bits = iter_bits(matched, start, 0 if after_id is not None else offset)
+            for pos in bits:
+                if limit is not None and len(positions) >= limit:
+                    break
+                positions.append(pos)
+        return [self.row(pos) for pos in positions], total
+
+
+class GlyphSearchIndex:
+    """glyphs 表的内存搜索索引，按维度表缓存的版本重建"""
+
+    def __init__(self, get_connection, dimension_cache, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get('MOTU_SEARCH_INDEX', 'false').lower() == 'true'
+        self.enabled = enabled
+        self._get_connection = get_connection
+        self._dimension_cache = dimension_cache
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.build_time = 0.0
+        self.queries = 0
+
+    def _build(self, version):
+        start = time.perf_counter()
+        conn = self._get_connection()
+        try:
+            rows = conn.execute(
+                "SELECT id, han, font_id, author_id, book_id FROM glyphs ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        snapshot = IndexSnapshot((tuple(row) for row in rows), version)
+        self.build_time = time.perf_counter() - start
+        logger.info(f"内存搜索索引已构建: {len(snapshot)} 个字形，{len(snapshot.by_han)} 个字，"
+                    f"耗时 {self.build_time:.2f} 秒")
+        return snapshot
+
+    def current(self):
+        """返回当前版本的索引快照，数据库变化后先重建"""
+        dims = self._dimension_cache.get()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == dims.version:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != dims.version:
+                self._snapshot = self._build(dims.version)
+            return self._snapshot
+
+    def query(self, *args, **kwargs):
+        """在当前快照上查询，参数见 IndexSnapshot.query"""
+        self.queries += 1
+        return self.current().query(*args, **kwargs)
+
+    def facet_counts(self, *args, **kwargs):
+        """在当前快照上计算分面计数，参数见 IndexSnapshot.facet_counts"""
+        return self.current().facet_counts(*args, **kwargs)
+
+    def warm(self):
+        """在后台线程中预先构建索引，启动后的第一个搜索请求不必等待"""
+        if not self.enabled:
+            return
+
+        def build():
+            try:
+                self.current()
+            except Exception as e:
+                logger.warning(f"预先构建内存搜索索引失败: {e}")
+
+        threading.Thread(target=build, name="search-index-warm", daemon=True).start()
+
+    def invalidate(self):
+        """丢弃索引，下次访问时重建"""
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "built": snapshot is not None,
+            "glyphs": len(snapshot) if snapshot is not None else 0,
+            "chars": len(snapshot.by_han) if snapshot is not None else 0,
+            "bytes": snapshot.nbytes() if snapshot is not None else 0,
+            "build_time": round(self.build_time, 3),
+            "queries": self.queries,
+        }
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+单飞（single-flight）请求合并
+
+多个用户同时导出含有常用字（之、不、人……）的文本时，同一张图片会在不同请求中、
+甚至同一请求的不同位置被同时下载和缩放。这个模块保证同一个键同一时刻只有一个
+调用在执行，其余调用者等待并共享它的结果（或异常），不再各自发起下载。
+
+调用完成后记录立即删除，结果本身由缩略图缓存负责保存，这里不做缓存。
+
+使用方法：
+    flight = SingleFlight()
+    buf = flight.do(key, fn, *args)
+"""
+
+import threading
+
+from logger import get_logger
+
+logger = get_logger()
+
+
+class _Call:
+    """一次正在执行的调用"""
+
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        """执行 fn(*args)；同一个键已有调用在执行时，等待并返回它的结果
+
+        执行者抛出的异常会原样抛给所有等待者。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            logger.debug(f"合并重复请求: {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            executed = self.executed
+            coalesced = self.coalesced
+            in_flight = len(self._calls)
+        total = executed + coalesced
+        return {
+            "executed": executed,
+            "coalesced": coalesced,
+            "in_flight": in_flight,
+            "coalesce_rate": round(coalesced / total, 4) if total else 0.0,
+        }
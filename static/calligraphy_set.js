@@ -878,7 +878,9 @@ function openCharSelectionModal(charInfo, imgElement) {
     // 分页相关变量 - 需要在updateGridLayout函数之前定义
     let currentPage = 0;
     let pageSize = window.innerWidth >= 680 ? 16 : (window.innerWidth >= 500 ? 12 : 8);
-    let allResults = [];
+    let loadedCount = 0;
+    let nextCursor = '';
+    let currentFilter = { calligrapher: '', book: '' };
     let isLoading = false;
     let hasMoreData = true;
     
@@ -1131,86 +1133,109 @@ function openCharSelectionModal(charInfo, imgElement) {
                 <div style="color: #666; font-size: 12px;">加载更多...</div>
             </div>
         `;
-        imageContainer.appendChild(loadingIndicator);
-
-        // 计算当前页要显示的数据
-        const startIndex = currentPage * pageSize;
-        const endIndex = Math.min(startIndex + pageSize, allResults.length);
-        
-        console.log(`加载第${currentPage + 1}页，索引${startIndex}-${endIndex - 1}`);
-
-        // 加载当前页的图片
-        const promises = [];
-        for (let i = startIndex; i < endIndex; i++) {
-            const result = allResults[i];
-            const promise = fetch(`/images/${result.id}`)
-                .then(res => res.json())
-                .then(imageData => {
-                    if (imageData.image_urls && imageData.image_urls.length > 0) {
-                        return { result, imageData };
-                    }
-                    return null;
-                })
-                .catch(error => {
-                    console.error('加载图片失败:', error);
-                    return null;
-                });
-            promises.push(promise);
+        if (currentPage > 0) {
+            imageContainer.appendChild(loadingIndicator);
         }
 
-        Promise.all(promises).then(results => {
-            // 移除加载指示器
-            const indicator = document.getElementById('loadingIndicator');
-            if (indicator) {
-                indicator.remove();
-            }
-
-            // 添加新的图片卡片 - 为每张图片创建单独的卡片
-            results.forEach(item => {
-                if (item && item.imageData.image_urls) {
-                    // 为每张图片创建一个卡片
-                    item.imageData.image_urls.forEach((imageUrl, imageIndex) => {
-                        // 创建单张图片的数据
-                        const singleImageData = {
-                            image_urls: [imageUrl],
-                            image_ids: item.imageData.image_ids ? [item.imageData.image_ids[imageIndex]] : []
-                        };
-                        const card = createImageCard(item.result, singleImageData);
-                        imageContainer.appendChild(card);
-                    });
-                }
-            });
+        // 使用游标分页按需加载下一页，不统计总数
+        const queryParams = new URLSearchParams({
+            han: charInfo.han,
+            author: currentFilter.calligrapher || '',
+            book: currentFilter.book || '',
+            per_page: pageSize,
+            cursor: nextCursor,
+            count: 'false',
+            with_images: 'true'
+        });
+        const apiUrl = '/api/search?' + queryParams.toString();
+        console.log(`加载第${currentPage + 1}页:`, apiUrl);
 
-            currentPage++;
-            isLoading = false;
-            
-            // 检查是否还有更多数据
-            if (currentPage * pageSize >= allResults.length) {
-                hasMoreData = false;
-                // 隐藏滚动提示
-                const scrollHint = document.getElementById('scrollHint');
-                if (scrollHint) {
-                    scrollHint.style.display = 'none';
+        fetch(apiUrl)
+            .then(res => res.json())
+            .then(data => {
+                const pageResults = data.results || [];
+                nextCursor = data.next_cursor || '';
+
+                // 图片URL已随搜索结果一起返回，无需逐个请求
+                return pageResults
+                    .filter(result => result.image_urls && result.image_urls.length > 0)
+                    .map(result => ({
+                        result,
+                        imageData: { image_urls: result.image_urls, image_ids: result.image_ids }
+                    }));
+            })
+            .then(results => {
+                // 移除加载指示器
+                const indicator = document.getElementById('loadingIndicator');
+                if (indicator) {
+                    indicator.remove();
                 }
-                // 添加"没有更多了"提示
-                if (allResults.length > pageSize) {
-                    const noMoreDiv = document.createElement('div');
-                    noMoreDiv.style.textAlign = 'center';
-                    noMoreDiv.style.padding = '20px';
-                    noMoreDiv.style.width = '100%';
-                    noMoreDiv.style.color = '#999';
-                    noMoreDiv.style.fontSize = '12px';
-                    noMoreDiv.textContent = '没有更多图片了';
-                    imageContainer.appendChild(noMoreDiv);
+                if (currentPage === 0) {
+                    // 清空加载中
+                    imageContainer.innerHTML = '';
                 }
-            } else {
-                // 显示滚动提示
-                const scrollHint = document.getElementById('scrollHint');
-                if (scrollHint && allResults.length > pageSize) {
-                    scrollHint.style.display = 'block';
+
+                // 添加新的图片卡片 - 为每张图片创建单独的卡片
+                results.forEach(item => {
+                    if (item && item.imageData.image_urls) {
+                        // 为每张图片创建一个卡片
+                        item.imageData.image_urls.forEach((imageUrl, imageIndex) => {
+                            // 创建单张图片的数据
+                            const singleImageData = {
+                                image_urls: [imageUrl],
+                                image_ids: item.imageData.image_ids ? [item.imageData.image_ids[imageIndex]] : []
+                            };
+                            const card = createImageCard(item.result, singleImageData);
+                            imageContainer.appendChild(card);
+                        });
+                    }
+                });
+
+                currentPage++;
+                loadedCount += results.length;
+                isLoading = false;
+                
+                // 检查是否还有更多数据
+                if (!nextCursor) {
+                    hasMoreData = false;
+                    // 隐藏滚动提示
+                    const scrollHint = document.getElementById('scrollHint');
+                    if (scrollHint) {
+                        scrollHint.style.display = 'none';
+                    }
+                    if (loadedCount === 0) {
+                        // 如果没有图片，显示提示
+                        const noImage = document.createElement('div');
+                        noImage.textContent = '没有找到符合条件的书法图片';
+                        noImage.style.width = '100%';
+                        noImage.style.textAlign = 'center';
+                        noImage.style.color = '#999';
+                        noImage.style.padding = '20px 0';
+                        imageContainer.appendChild(noImage);
+                    } else if (loadedCount > pageSize) {
+                        // 添加"没有更多了"提示
+                        const noMoreDiv = document.createElement('div');
+                        noMoreDiv.style.textAlign = 'center';
+                        noMoreDiv.style.padding = '20px';
+                        noMoreDiv.style.width = '100%';
+                        noMoreDiv.style.color = '#999';
+                        noMoreDiv.style.fontSize = '12px';
+                        noMoreDiv.textContent = '没有更多图片了';
+                        imageContainer.appendChild(noMoreDiv);
+                    }
+                } else {
+                    // 显示滚动提示
+                    const scrollHint = document.getElementById('scrollHint');
+                    if (scrollHint) {
+                        scrollHint.style.display = 'block';
+                    }
                 }
-            }
-        });
+            })
+            .catch(error => {
+                console.error('加载图片失败:', error);
+                isLoading = false;
+                imageContainer.innerHTML = '<div class="text-danger text-center p-4">加载失败，请重试</div>';
+            });
     }
 
     // 加载图片函数
@@ -1223,7 +1248,9 @@ function openCharSelectionModal(charInfo, imgElement) {
 
         // 重置分页状态
         currentPage = 0;
-        allResults = [];
+        loadedCount = 0;
+        nextCursor = '';
+        currentFilter = { calligrapher: calligrapher || '', book: book || '' };
         isLoading = false;
         hasMoreData = true;
 
@@ -1251,45 +1278,8 @@ function openCharSelectionModal(charInfo, imgElement) {
         
         imageContainer.appendChild(loading);
 
-        // 构建查询参数
-        const queryParams = new URLSearchParams({
-            han: charInfo.han,
-            author: calligrapher || '',
-            book: book || ''
-        });
-
-        // 打印完整的API请求URL
-        const apiUrl = '/api/search?' + queryParams.toString();
-        console.log('API请求URL:', apiUrl);
-
-        // 调用API加载图片
-        fetch(apiUrl)
-            .then(res => res.json())
-            .then(data => {
-                // 清空加载中
-                imageContainer.innerHTML = '';
-
-                if (data.results && data.results.length > 0) {
-                    allResults = data.results;
-                    console.log(`总共找到${allResults.length}个结果`);
-                    
-                    // 加载第一页
-                    loadMoreImages();
-                } else {
-                    // 如果没有图片，显示提示
-                    const noImage = document.createElement('div');
-                    noImage.textContent = '没有找到符合条件的书法图片';
-                    noImage.style.width = '100%';
-                    noImage.style.textAlign = 'center';
-                    noImage.style.color = '#999';
-                    noImage.style.padding = '20px 0';
-                    imageContainer.appendChild(noImage);
-                }
-            })
-            .catch(error => {
-                console.error('加载图片失败:', error);
-                imageContainer.innerHTML = '<div class="text-danger text-center p-4">加载失败，请重试</div>';
-            });
+        // 加载第一页
+        loadMoreImages();
     }
 
     // 书法家选择事件已在初始化时绑定
@@ -1541,7 +1531,8 @@ function exportAsImage() {
         const hasPlaceholder = imageIds.some(id => id === 'placeholder');
         console.log('发送的ID中是否包含占位符:', hasPlaceholder);
 
-        fetch('/export_image_by_ids', {
+        // 字数较少时直接返回图片，大型导出返回202和任务信息，轮询进度后再下载
+        fetch('/api/export_jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -1552,6 +1543,12 @@ function exportAsImage() {
                 direction: direction
             })
         })
+            .then(response => {
+                if (response.status === 202) {
+                    return response.json().then(job => waitForExportJob(job, loadingDiv));
+                }
+                return response;
+            })
             .then(response => {
                 // 移除加载状态
                 if (loadingDiv && loadingDiv.parentNode === document.body) {
@@ -1614,3 +1611,32 @@ function exportAsImage() {
             });
     }
 }
+
+// 轮询后台导出任务，在加载提示中显示进度，完成后返回下载请求的响应
+function waitForExportJob(job, loadingDiv) {
+    const stageNames = { downloading: '下载图片', composing: '拼接', encoding: '编码' };
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(job.status_url)
+                .then(res => res.json().then(status => ({ ok: res.ok, status })))
+                .then(({ ok, status }) => {
+                    if (!ok || status.state === 'failed') {
+                        reject(new Error(status.error || '导出任务失败'));
+                        return;
+                    }
+                    if (status.state === 'done') {
+                        resolve(fetch(status.download_url));
+                        return;
+                    }
+                    const text = loadingDiv.querySelector('div > div:last-child');
+                    if (text) {
+                        const stage = stageNames[status.stage] || '排队中';
+                        text.textContent = `正在生成图片（${stage}，${status.resized}/${status.total}，${Math.round(status.progress * 100)}%）...`;
+                    }
+                    setTimeout(poll, 1000);
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
@@ -3,6 +3,7 @@ let total = 0;
 let per_page = 24;  // 默认每页显示6行4列共24个结果
 let currentQuery = {};
 let isShowingAll = false; // 标记是否显示全部结果
+let pageCursors = [""]; // 每一页对应的分页游标，第一页为空字符串
 
 document.addEventListener("DOMContentLoaded", () => {
     // 确保分页容器在页面加载时处于隐藏状态
@@ -159,6 +160,25 @@ function fillSelect(name, options) {
     });
 }
 
+// 用当前条件下的分面计数更新下拉框：显示每个选项的字形数量，没有结果的选项置灰
+function applyFacets(facets) {
+    [["fontSelect", facets.fonts], ["authorSelect", facets.authors], ["bookSelect", facets.books]].forEach(([id, counts]) => {
+        const select = document.getElementById(id);
+        if (!select || !counts) {
+            return;
+        }
+        Array.from(select.options).forEach(option => {
+            if (!option.value) {
+                return;
+            }
+            const count = counts[option.value] || 0;
+            option.textContent = `${option.value} (${count})`;
+            option.disabled = count === 0 && option.value !== select.value;
+        });
+        $(select).trigger('change.select2');
+    });
+}
+
 // 生成汉字按钮的函数
 function generateHanziButtons(hanzi) {
     const buttonsContainer = document.getElementById("hanziButtons");
@@ -193,17 +213,39 @@ function search(append=false) {
                 queryParams.all = true;
                 page = 1; // 重置为第一页
             } else {
+                // 新的搜索从第一页开始，清空之前记录的游标
+                if (page === 1) {
+                    pageCursors = [""];
+                }
                 queryParams.page = page;
                 queryParams.per_page = per_page; // 添加每页数量参数
+                // 使用游标分页，翻到任意一页的开销都与第一页相同
+                queryParams.cursor = pageCursors[page - 1] || "";
             }
 
+    // 结果中直接附带图片URL，整页只需要一次请求
+    queryParams.with_images = true;
+    // 新的搜索同时取回各下拉框选项在当前条件下的字形数量，翻页时条件不变无需重复获取
+    if (page === 1 && !append) {
+        queryParams.facets = true;
+    }
+
+    // 分页浏览时使用雪碧图接口：整页缩略图合成一张图片，只需一次图片请求
+    const endpoint = isShowingAll ? "/api/search" : "/api/search/sprite";
     const params = new URLSearchParams(queryParams);
-    fetch("/api/search?" + params.toString())
+    fetch(endpoint + "?" + params.toString())
         .then(res => res.json())
         .then(data => {
             total = data.total;
             per_page = data.per_page || 4; // 确保有默认值
-            renderResults(data.results, append);
+            // 记录下一页的游标
+            if (data.next_cursor) {
+                pageCursors[page] = data.next_cursor;
+            }
+            if (data.facets) {
+                applyFacets(data.facets);
+            }
+            renderResults(data.results, append, data.sprite);
             document.getElementById("loading").style.display = "none";            
             // 显示分页容器
             // 只有当有结果、不是显示全部且总页数大于1时才显示分页
@@ -321,7 +363,7 @@ function generatePageNumbers(totalPages) {
     pageNumbersContainer.appendChild(li);
 }
 
-function renderResults(items, append) {
+function renderResults(items, append, sprite) {
     const container = document.getElementById("results");
     if (!append) container.innerHTML = "";
 
@@ -355,22 +397,19 @@ function renderResults(items, append) {
         infoSmall.textContent = `${item.font} | ${item.author} | ${item.book_title || ''}`;
         card.appendChild(infoSmall);
 
-        // 异步加载图片，默认只显示1张
-        fetch(`/images/${item.id}`)
-            .then(res => res.json())
-            .then(data => {
-                if (data.image_urls && data.image_urls.length > 0) {
-                    // 只显示第一张图片
-                    const img = document.createElement('img');
-                    img.className = 'glyph-img';
-                    img.alt = item.han;
-                    img.src = data.image_urls[0];
-                    imgContainer.appendChild(img);
-                }
-            })
-            .catch(error => {
-                console.error('加载图片失败:', error);
-            });
+        // 默认只显示第一张图片：有雪碧图时按坐标截取，否则加载服务器缩放后的缩略图
+        if (sprite && sprite.url && item.sprite_xy) {
+            imgContainer.appendChild(createSpriteCell(sprite, item));
+        } else if (item.image_urls && item.image_urls.length > 0) {
+            const img = document.createElement('img');
+            img.className = 'glyph-img';
+            img.alt = item.han;
+            img.loading = 'lazy';
+            img.src = item.image_ids && item.image_ids.length > 0
+                ? `/thumb/${item.image_ids[0]}?size=240`
+                : item.image_urls[0];
+            imgContainer.appendChild(img);
+        }
 
         // 为卡片添加点击事件
         card.onclick = function() {
@@ -383,6 +422,22 @@ function renderResults(items, append) {
     });
 }
 
+// 用雪碧图中的一格显示字形缩略图，按百分比定位以适应卡片宽度
+function createSpriteCell(sprite, item) {
+    const cell = document.createElement('div');
+    cell.className = 'glyph-img glyph-sprite';
+    cell.setAttribute('role', 'img');
+    cell.setAttribute('aria-label', item.han);
+    const col = item.sprite_xy[0] / sprite.cell;
+    const row = item.sprite_xy[1] / sprite.cell;
+    const x = sprite.cols > 1 ? col / (sprite.cols - 1) * 100 : 0;
+    const y = sprite.rows > 1 ? row / (sprite.rows - 1) * 100 : 0;
+    cell.style.backgroundImage = `url("${sprite.url}")`;
+    cell.style.backgroundSize = `${sprite.cols * 100}% ${sprite.rows * 100}%`;
+    cell.style.backgroundPosition = `${x}% ${y}%`;
+    return cell;
+}
+
 // 加载所有图片的函数
 function loadAllImages(glyphId, container) {
     fetch(`/images/${glyphId}`)
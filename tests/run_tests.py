@@ -25,10 +25,56 @@ def run_all_tests():
     # 添加测试模块
     from tests.test_db import TestDatabase
     from tests.test_logger_config import TestLoggerConfig
+    from tests.test_db_pool import TestConnectionPool, TestMemoryConnectionPool
+    from tests.test_thumb_cache import TestMemoryThumbnailCache, TestTieredThumbnailCache
+    from tests.test_http_client import TestImageHttpClient
+    from tests.test_download_engine import TestDownloadEngine
+    from tests.test_singleflight import TestSingleFlight
+    from tests.test_prefetch import TestPrefetchQueue
+    from tests.test_render_pool import TestRenderPool
+    from tests.test_png_stream import TestPngStream
+    from tests.test_export_encoding import TestExportEncoding
+    from tests.test_export_cache import TestExportCache
+    from tests.test_export_jobs import TestExportJobManager
+    from tests.test_search_index import TestIterBits, TestIndexSnapshot
+    from tests.test_layout import TestLayout
+    from tests.test_thumb_store import TestThumbStore
+    from tests.test_check_db import TestCheckDb
+    from tests.test_api import TestOptionsApi, TestCharOptionsApi, TestSearchApi, TestSearchIndexApi, TestMemoryDbApi, TestImagesApi, TestGenerateApi, TestExportApi, TestExportJobApi, TestPrefetchApi, TestSpriteApi, TestThumbApi
     
     # 添加测试类
     test_suite.addTest(test_loader.loadTestsFromTestCase(TestDatabase))
     test_suite.addTest(test_loader.loadTestsFromTestCase(TestLoggerConfig))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestConnectionPool))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestMemoryConnectionPool))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestMemoryThumbnailCache))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestTieredThumbnailCache))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestImageHttpClient))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestDownloadEngine))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestSingleFlight))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestPrefetchQueue))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestRenderPool))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestPngStream))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestExportEncoding))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestExportCache))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestExportJobManager))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestIterBits))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestIndexSnapshot))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestLayout))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestThumbStore))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestCheckDb))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestOptionsApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestCharOptionsApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestSearchApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestSearchIndexApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestMemoryDbApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestImagesApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestGenerateApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestExportApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestExportJobApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestPrefetchApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestSpriteApi))
+    test_suite.addTest(test_loader.loadTestsFromTestCase(TestThumbApi))
     
     # 运行测试
     test_runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试用示例数据库
+
+按照 data/sql/fix_split2.sql 的表结构和索引创建一个小型书法数据库，
+供需要真实 SQLite 文件的测试使用。
+"""
+
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE fonts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE
+);
+CREATE TABLE authors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE
+);
+CREATE TABLE books (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT UNIQUE
+);
+CREATE TABLE glyphs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    han TEXT,
+    font_id INTEGER,
+    author_id INTEGER,
+    book_id INTEGER
+);
+CREATE TABLE images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    glyph_id INTEGER,
+    url TEXT
+);
+"""
+
+# 与 data/sql/fix_split2.sql 相同的索引
+INDEXES = """
+CREATE UNIQUE INDEX idx_glyphs_unique ON glyphs(han, font_id, author_id, book_id);
+CREATE INDEX idx_han ON glyphs(han);
+CREATE INDEX idx_han_font ON glyphs(han, font_id);
+CREATE INDEX idx_font_id ON glyphs(font_id);
+CREATE INDEX idx_author_id ON glyphs(author_id);
+CREATE INDEX idx_images_glyph ON images(glyph_id);
+"""
+
+FONTS = ["楷书", "行书", "草书"]
+AUTHORS = ["王羲之", "颜真卿", "欧阳询"]
+BOOKS = ["兰亭序", "多宝塔碑", "九成宫"]
+
+# (han, font_id, author_id, book_id, 图片数量)
+GLYPHS = [
+    ("之", 2, 1, 1, 2),
+    ("之", 1, 2, 2, 1),
+    ("之", 1, 3, 3, 1),
+    ("不", 2, 1, 1, 1),
+    ("不", 1, 2, 2, 2),
+    ("人", 1, 3, 3, 1),
+    ("永", 2, 1, 1, 1),
+    ("和", 2, 1, 1, 0),
+]
+
+
+def create_sample_db(path, url_prefix="http://example.invalid/img"):
+    """创建示例数据库，返回数据库路径"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executescript(INDEXES)
+    conn.executemany("INSERT INTO fonts (name) VALUES (?)", [(n,) for n in FONTS])
+    conn.executemany("INSERT INTO authors (name) VALUES (?)", [(n,) for n in AUTHORS])
+    conn.executemany("INSERT INTO books (title) VALUES (?)", [(n,) for n in BOOKS])
+    for han, font_id, author_id, book_id, image_count in GLYPHS:
+        cur = conn.execute(
+            "INSERT INTO glyphs (han, font_id, author_id, book_id) VALUES (?, ?, ?, ?)",
+            (han, font_id, author_id, book_id))
+        glyph_id = cur.lastrowid
+        for i in range(image_count):
+            conn.execute("INSERT INTO images (glyph_id, url) VALUES (?, ?)",
+                         (glyph_id, f"{url_prefix}/{glyph_id}_{i}.png"))
+    conn.commit()
+    conn.close()
+    return path
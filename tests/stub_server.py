@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试用的本地图片服务器
+
+在后台线程中启动一个支持长连接的 HTTP 服务器，按路径返回生成的 PNG 图片，
+支持 ETag 条件请求，并统计请求数和连接数。
+"""
+
+import hashlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+def make_png(seed, size=(200, 200)):
+    """生成一张确定内容的PNG图片"""
+    value = int(hashlib.md5(seed.encode("utf-8")).hexdigest()[:2], 16)
+    img = Image.new("RGB", size, (value, value, value))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class StubImageServer:
+    """本地图片服务器"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        # 为 True 时所有请求返回503，模拟源站故障
+        self.failing = False
+        self.requests = 0
+        self.connections = 0
+        self.not_modified = 0
+        self.paths = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.paths.append(self.path)
+                if server.delay:
+                    threading.Event().wait(server.delay)
+                if server.failing or self.path.startswith("/missing"):
+                    self.send_response(503 if server.failing else 404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = make_png(self.path)
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        return f"{self.base_url}/{name}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,808 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+import app_new
+from db_pool import ConnectionPool
+from dimensions import Dimensions
+from export_cache import ExportCache
+from export_jobs import ExportJobManager
+from http_client import ImageHttpClient
+from prefetch import PrefetchQueue
+from search_index import GlyphSearchIndex
+from thumb_cache import TieredThumbnailCache, MemoryThumbnailCache, PixelBuffer
+from thumb_store import ThumbStore, ThumbStoreWriter
+from tests.sample_db import create_sample_db
+from tests.stub_server import StubImageServer
+
+class ApiTestCase(unittest.TestCase):
+    """使用示例数据库测试接口的基类"""
+
+    url_prefix = "http://example.invalid/img"
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'), self.url_prefix)
+        self._old_pool = app_new.db_pool
+        app_new.db_pool = ConnectionPool(self.db_path, max_size=2)
+        app_new.search_count_cache.clear()
+        app_new.image_cache.clear()
+        app_new.dimension_cache.invalidate()
+        app_new.char_facet_index.invalidate()
+        # 默认不启动后台预取，避免测试之间互相影响
+        self._old_prefetcher = app_new.prefetcher
+        app_new.prefetcher = PrefetchQueue(app_new._prefetch_thumbnail, workers=0)
+        self.client = app_new.app.test_client()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        app_new.prefetcher.shutdown()
+        app_new.prefetcher = self._old_prefetcher
+        app_new.db_pool.close()
+        app_new.db_pool = self._old_pool
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+class TestOptionsApi(ApiTestCase):
+    """测试下拉选项接口"""
+
+    def test_options_etag(self):
+        """测试选项接口返回ETag，重新验证时返回304"""
+        resp = self.client.get('/api/options')
+        data = resp.get_json()
+        self.assertEqual(data['authors'], sorted(['王羲之', '颜真卿', '欧阳询']))
+        etag = resp.headers['ETag']
+        self.assertTrue(etag)
+
+        resp = self.client.get('/api/options', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(app_new.dimension_cache.loads, 1)
+
+    def test_reload_on_file_change(self):
+        """测试数据库文件变化后重新加载维度表"""
+        etag = self.client.get('/api/options').headers['ETag']
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO fonts (name) VALUES ('隶书')")
+        conn.commit()
+        conn.close()
+        app_new.dimension_cache._last_check = 0.0
+
+        resp = self.client.get('/api/options', headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('隶书', resp.get_json()['fonts'])
+
+class TestCharOptionsApi(ApiTestCase):
+    """测试单字选项接口"""
+
+    def test_char_options(self):
+        """测试返回排序后的书法家、典籍及字形数量"""
+        data = self.client.get('/api/char_options', query_string={'han': '之'}).get_json()
+        self.assertEqual(data['authors'], sorted(['王羲之', '颜真卿', '欧阳询']))
+        self.assertEqual(data['books'], sorted(['兰亭序', '多宝塔碑', '九成宫']))
+        self.assertEqual(data['author_counts']['王羲之'], 1)
+
+        data = self.client.get('/api/char_options', query_string={'han': '永'}).get_json()
+        self.assertEqual(data['authors'], ['王羲之'])
+        self.assertEqual(data['book_counts'], {'兰亭序': 1})
+
+    def test_unknown_char(self):
+        """测试不存在的字返回空列表"""
+        data = self.client.get('/api/char_options', query_string={'han': '龘'}).get_json()
+        self.assertEqual(data['authors'], [])
+        self.assertEqual(data['books'], [])
+        data = self.client.get('/api/char_options').get_json()
+        self.assertEqual(data, {'authors': [], 'books': []})
+
+    def test_index_built_once(self):
+        """测试索引只构建一次"""
+        self.client.get('/api/char_options?han=之')
+        facets = app_new.char_facet_index._facets
+        self.client.get('/api/char_options?han=不')
+        self.assertIs(app_new.char_facet_index._facets, facets)
+        self.assertEqual(app_new.char_facet_index.size(), 5)
+
+class TestSearchApi(ApiTestCase):
+    """测试搜索接口"""
+
+    def test_offset_pagination(self):
+        """测试原有的页码分页"""
+        data = self.client.get('/api/search?han=之不&per_page=2&page=2').get_json()
+        self.assertEqual(data['total'], 5)
+        self.assertEqual([r['id'] for r in data['results']], [3, 4])
+        self.assertNotIn('next_cursor', data)
+
+    def test_cursor_pagination(self):
+        """测试游标分页可以遍历全部结果"""
+        ids = []
+        cursor = ''
+        pages = 0
+        while True:
+            resp = self.client.get('/api/search', query_string={
+                'han': '之不', 'per_page': 2, 'cursor': cursor, 'count': 'false'})
+            data = resp.get_json()
+            self.assertIsNone(data['total'])
+            ids.extend(r['id'] for r in data['results'])
+            pages += 1
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        self.assertEqual(pages, 3)
+
+    def test_cursor_last_page_exact(self):
+        """测试结果数正好填满一页时不返回下一页游标"""
+        data = self.client.get('/api/search?han=之&per_page=3&cursor=').get_json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['total'], 3)
+
+    def test_cursor_filter_mismatch(self):
+        """测试游标与查询条件不匹配时返回400"""
+        data = self.client.get('/api/search?han=之&per_page=1&cursor=').get_json()
+        resp = self.client.get('/api/search', query_string={
+            'han': '不', 'per_page': 1, 'cursor': data['next_cursor']})
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get('/api/search?han=之&cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_filter_by_names(self):
+        """测试按名称过滤，未知名称不返回结果"""
+        data = self.client.get('/api/search', query_string={'han': '之', 'author': '颜真卿'}).get_json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['results'][0], {
+            'id': 2, 'han': '之', 'font': '楷书', 'author': '颜真卿', 'book_title': '多宝塔碑'})
+
+        data = self.client.get('/api/search', query_string={'font': '不存在'}).get_json()
+        self.assertEqual(data['total'], 0)
+        self.assertEqual(data['results'], [])
+
+    def test_facets(self):
+        """测试分面计数：每个维度应用其余条件，不应用它自己的条件"""
+        data = self.client.get('/api/search', query_string={
+            'han': '之不', 'author': '颜真卿', 'facets': 'true'}).get_json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['facets'], {
+            'fonts': {'楷书': 2},
+            'authors': {'王羲之': 2, '颜真卿': 2, '欧阳询': 1},
+            'books': {'多宝塔碑': 2},
+        })
+
+        data = self.client.get('/api/search?font=行书&facets=true').get_json()
+        self.assertEqual(data['facets'], {
+            'fonts': {'楷书': 4, '行书': 4},
+            'authors': {'王羲之': 4},
+            'books': {'兰亭序': 4},
+        })
+        self.assertNotIn('facets', self.client.get('/api/search?font=行书').get_json())
+
+    def test_facets_sum_duplicate_names(self):
+        """测试名称相同的不同字体的分面计数相加，而不是互相覆盖"""
+        dims = app_new.dimension_cache.get()
+        fonts = {id_: '楷书' for id_ in dims.font_names}
+        merged = Dimensions(fonts, dims.author_names, dims.book_titles, ('duplicate-names',))
+        conn = app_new.get_db()
+        try:
+            facets = app_new._search_facets(conn, merged, '', '', '', '')
+        finally:
+            conn.close()
+        self.assertEqual(facets['fonts'], {'楷书': 8})
+
+    def test_page_size_clamped(self):
+        """测试 per_page 被限制在 1 到上限之间，非整数返回400"""
+        data = self.client.get('/api/search?han=之&cursor=&per_page=0').get_json()
+        self.assertEqual(data['per_page'], 1)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNotNone(data['next_cursor'])
+        data = self.client.get('/api/search?per_page=100000&page=0').get_json()
+        self.assertEqual(data['per_page'], app_new.MAX_SEARCH_PER_PAGE)
+        self.assertEqual(len(data['results']), 8)
+        self.assertEqual(self.client.get('/api/search?per_page=x').status_code, 400)
+
+    def test_count_follows_db_version(self):
+        """测试数据库变化后总数不再使用旧的缓存"""
+        self.assertEqual(self.client.get('/api/search?han=之').get_json()['total'], 3)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO glyphs (han, font_id, author_id, book_id) VALUES ('之', 1, 1, 1)")
+        conn.commit()
+        conn.close()
+        app_new.db_pool.check_reload()
+        app_new.dimension_cache._last_check = 0.0
+        self.assertEqual(self.client.get('/api/search?han=之').get_json()['total'], 4)
+
+    def test_count_cached(self):
+        """测试总数按查询条件缓存"""
+        self.client.get('/api/search?han=之')
+        self.assertEqual(app_new.search_count_cache.size(), 1)
+        data = self.client.get('/api/search?han=之&page=2&per_page=1').get_json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(app_new.search_count_cache.size(), 1)
+
+class TestSearchIndexApi(TestSearchApi):
+    """启用内存搜索索引后重复搜索接口的测试，结果应与 SQL 查询一致"""
+
+    def setUp(self):
+        super().setUp()
+        self._old_search_index = app_new.search_index
+        app_new.search_index = GlyphSearchIndex(app_new.get_db, app_new.dimension_cache, enabled=True)
+
+    def tearDown(self):
+        app_new.search_index = self._old_search_index
+        super().tearDown()
+
+    def test_count_cached(self):
+        """测试总数由索引精确计算，不再查询数据库"""
+        data = self.client.get('/api/search?han=之&page=2&per_page=1').get_json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(app_new.search_count_cache.size(), 0)
+        self.assertEqual(app_new.search_index.stats()['glyphs'], 8)
+
+    def test_get_all(self):
+        """测试获取全部结果"""
+        data = self.client.get('/api/search?author=王羲之&all=true').get_json()
+        self.assertEqual(data['total'], 4)
+        self.assertEqual([r['id'] for r in data['results']], [1, 4, 7, 8])
+
+class TestMemoryDbApi(TestSearchApi):
+    """数据库加载到内存后重复搜索接口的测试，并测试文件变化后的重新加载"""
+
+    def setUp(self):
+        super().setUp()
+        app_new.db_pool.close()
+        app_new.db_pool = ConnectionPool(self.db_path, max_size=2, in_memory=True, reload_interval=0)
+
+    def test_db_status(self):
+        """测试状态接口报告内存副本大小"""
+        self.client.get('/api/search?han=之')
+        memory = self.client.get('/api/db/status').get_json()['in_memory']
+        self.assertTrue(memory['loaded'])
+        self.assertEqual(memory['generation'], 1)
+        self.assertGreater(memory['bytes'], 0)
+
+    def test_reload_on_file_change(self):
+        """测试数据库文件变化后重新加载内存副本，维度表随之更新"""
+        self.assertNotIn('隶书', self.client.get('/api/options').get_json()['fonts'])
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO fonts (name) VALUES ('隶书')")
+        conn.commit()
+        conn.close()
+        app_new.dimension_cache._last_check = 0.0
+        # 重新加载之前仍使用旧副本
+        self.assertNotIn('隶书', self.client.get('/api/options').get_json()['fonts'])
+
+        self.assertTrue(app_new.db_pool.check_reload())
+        app_new.dimension_cache._last_check = 0.0
+        self.assertIn('隶书', self.client.get('/api/options').get_json()['fonts'])
+
+class TestImagesApi(ApiTestCase):
+    """测试批量图片接口"""
+
+    def test_batch_get(self):
+        """测试GET方式批量查询"""
+        data = self.client.get('/api/images?ids=1,2,8').get_json()
+        images = data['images']
+        self.assertEqual(len(images['1']['image_urls']), 2)
+        self.assertEqual(images['1']['image_ids'], [1, 2])
+        self.assertEqual(len(images['2']['image_urls']), 1)
+        self.assertEqual(images['8'], {'image_urls': [], 'image_ids': []})
+
+    def test_batch_post(self):
+        """测试POST方式批量查询"""
+        resp = self.client.post('/api/images', json={'glyph_ids': [5, 4]})
+        images = resp.get_json()['images']
+        self.assertEqual(set(images), {'5', '4'})
+        self.assertEqual(len(images['5']['image_urls']), 2)
+
+    def test_batch_invalid(self):
+        """测试非法ID"""
+        self.assertEqual(self.client.get('/api/images?ids=1,x').status_code, 400)
+        self.assertEqual(self.client.post('/api/images', json={'glyph_ids': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/images', json=[1, 2]).status_code, 400)
+        self.assertEqual(self.client.post('/api/images', json=3).status_code, 400)
+
+    def test_search_with_images(self):
+        """测试搜索结果中附带图片URL"""
+        data = self.client.get('/api/search?han=之&with_images=true').get_json()
+        first = data['results'][0]
+        self.assertEqual(first['image_ids'], [1, 2])
+        self.assertEqual(len(first['image_urls']), 2)
+
+    def test_connection_returned_on_error(self):
+        """测试查询出错时连接仍被归还，连接池不会被耗尽"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("ALTER TABLE images RENAME TO images_old")
+        conn.commit()
+        conn.close()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/images/1').status_code, 500)
+        stats = app_new.db_pool.stats()
+        self.assertEqual(stats['idle_connections'], stats['open_connections'])
+        self.assertEqual(self.client.get('/api/options').status_code, 200)
+
+    def test_unreturned_connection_released_after_request(self):
+        """测试请求中未归还的连接在请求结束时归还"""
+        with app_new.app.test_request_context('/'):
+            conn = app_new.get_db()
+            self.assertFalse(conn.released)
+        self.assertTrue(conn.released)
+        self.assertEqual(app_new.db_pool.stats()['idle_connections'], 1)
+
+class TestGenerateApi(ApiTestCase):
+    """测试生成集字接口"""
+
+    def test_generate_with_repeats(self):
+        """测试重复字符和缺失字符保持原有输出结构"""
+        data = self.client.get('/api/generate_calligraphy?text=之不之龘').get_json()
+        self.assertTrue(data['success'])
+        chars = data['characters']
+        self.assertEqual([c['han'] for c in chars], ['之', '不', '之', '龘'])
+        self.assertEqual(chars[0]['glyph_id'], 1)
+        self.assertEqual(chars[0]['image_ids'], [1, 2])
+        self.assertEqual(chars[0], chars[2])
+        self.assertEqual(chars[1]['glyph_id'], 4)
+        self.assertIsNone(chars[3]['glyph_id'])
+        self.assertEqual(chars[3]['image_urls'], [])
+        # 图片URL已写入缓存，供导出使用
+        self.assertIsNotNone(app_new.image_cache.get('image_url_1'))
+
+    def test_generate_with_filters(self):
+        """测试按书法家和字体筛选"""
+        data = self.client.get('/api/generate_calligraphy', query_string={
+            'text': '之不人', 'calligrapher': '颜真卿', 'font': '楷书'}).get_json()
+        chars = data['characters']
+        self.assertEqual(chars[0]['glyph_id'], 2)
+        self.assertEqual(chars[0]['author'], '颜真卿')
+        self.assertEqual(chars[1]['glyph_id'], 5)
+        self.assertIsNone(chars[2]['glyph_id'])
+
+class RemoteImageTestCase(ApiTestCase):
+    """使用本地图片服务器的测试基类，缓存都放在临时目录中"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.server = StubImageServer().start()
+        self.url_prefix = self.server.url("img")
+        super().setUp()
+        self._old_thumbnail_cache = app_new.thumbnail_cache
+        self._old_http_client = app_new.http_client
+        app_new.thumbnail_cache = TieredThumbnailCache(
+            memory_bytes=16 * 1024 * 1024, disk_dir=os.path.join(self.tmp_dir, 'thumbs'))
+        app_new.http_client = ImageHttpClient(cache_dir=os.path.join(self.tmp_dir, 'originals'))
+        self._old_export_cache = app_new.export_cache
+        app_new.export_cache = ExportCache(root=os.path.join(self.tmp_dir, 'exports'))
+        self._old_thumb_store = app_new.thumb_store
+        app_new.thumb_store = ThumbStore("")
+        self._old_sprite_cache = app_new.sprite_cache
+        app_new.sprite_cache = ExportCache(root=os.path.join(self.tmp_dir, 'sprites'))
+        app_new.sprite_map_cache.clear()
+        self._old_thumb_file_cache = app_new.thumb_file_cache
+        app_new.thumb_file_cache = ExportCache(root=os.path.join(self.tmp_dir, 'thumbfiles'))
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        app_new.http_client.close()
+        app_new.thumbnail_cache = self._old_thumbnail_cache
+        app_new.http_client = self._old_http_client
+        app_new.export_cache = self._old_export_cache
+        app_new.thumb_store = self._old_thumb_store
+        app_new.sprite_cache = self._old_sprite_cache
+        app_new.thumb_file_cache = self._old_thumb_file_cache
+        super().tearDown()
+        self.server.stop()
+
+class TestExportApi(RemoteImageTestCase):
+    """使用本地图片服务器测试导出接口"""
+
+    def export(self, image_ids, cols=2, direction="horizontal"):
+        resp = self.client.post('/export_image_by_ids', json={
+            'image_ids': image_ids, 'cols': cols, 'direction': direction})
+        self.assertEqual(resp.status_code, 200, resp.data[:200])
+        return Image.open(io.BytesIO(resp.data))
+
+    def test_export_by_ids(self):
+        """测试按图片ID导出，占位符保持位置"""
+        img = self.export([1, 'placeholder', 3])
+        self.assertEqual(img.size, (240, 240))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_export_directions(self):
+        """测试不同排列方向的画布尺寸"""
+        self.assertEqual(self.export([1, 2, 3], cols=2, direction='vertical-right').size, (240, 240))
+        self.assertEqual(self.export([1, 2, 3], cols=3, direction='vertical-left').size, (120, 360))
+        self.assertEqual(self.export([1, 2, 3], cols=3, direction='horizontal-reverse').size, (360, 120))
+
+    def test_export_uses_thumbnail_cache(self):
+        """测试重复导出不会重新下载"""
+        self.export([1, 2])
+        self.export([2, 1])
+        self.assertEqual(self.server.requests, 2)
+
+    def test_export_coalesces_duplicate_images(self):
+        """测试同一图片在一次导出中重复出现时只下载一次"""
+        self.server.delay = 0.05
+        before = app_new.image_flight.stats()["coalesced"]
+        self.export([1, 1, 1, 1])
+        self.assertEqual(self.server.requests, 1)
+        self.assertGreater(app_new.image_flight.stats()["coalesced"], before)
+
+    def test_export_quality_tiers_cached_separately(self):
+        """测试不同质量档位使用各自的缩略图缓存"""
+        resp = self.client.post('/export_image_by_ids', json={'image_ids': [1], 'quality': 'preview'})
+        self.assertEqual(resp.status_code, 200)
+        self.export([1])
+        self.assertIsNotNone(app_new.thumbnail_cache.get(1, (120, 120), 'preview'))
+        self.assertIsNotNone(app_new.thumbnail_cache.get(1, (120, 120), 'print'))
+
+    def test_streaming_export_matches_buffered(self):
+        """测试流式导出与普通导出的像素一致"""
+        buffered = self.export([1, 'placeholder', 3], cols=2, direction='vertical-left')
+        resp = self.client.post('/export_image_by_ids', json={
+            'image_ids': [1, 'placeholder', 3], 'cols': 2, 'direction': 'vertical-left', 'stream': True})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.is_streamed)
+        streamed = Image.open(io.BytesIO(resp.data))
+        self.assertEqual(streamed.size, buffered.size)
+        self.assertEqual(streamed.convert("RGBA").tobytes(), buffered.convert("RGBA").tobytes())
+
+    def test_export_formats(self):
+        """测试导出格式和预设，响应头报告编码耗时和大小"""
+        resp = self.client.post('/export_image_by_ids', json={
+            'image_ids': [1, 2], 'format': 'webp', 'preset': 'fast'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'image/webp')
+        self.assertEqual(resp.headers['X-Export-Encoding'], 'webp/fast')
+        self.assertEqual(int(resp.headers['X-Output-Size']), len(resp.data))
+        self.assertGreaterEqual(float(resp.headers['X-Encode-Time']), 0)
+        self.assertEqual(Image.open(io.BytesIO(resp.data)).format, 'WEBP')
+
+        resp = self.client.post('/export_image_by_ids', json={'image_ids': [1], 'format': 'gif'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_export_cache_and_etag(self):
+        """测试相同排版的导出命中缓存，ETag 匹配时返回304"""
+        payload = {'image_ids': [1, 2, 'placeholder'], 'cols': 2}
+        first = self.client.post('/export_image_by_ids', json=payload)
+        self.assertEqual(first.headers['X-Export-Cache'], 'miss')
+        etag = first.headers['ETag']
+        requests_before = self.server.requests
+
+        second = self.client.post('/export_image_by_ids', json=payload)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers['X-Export-Cache'], 'hit')
+        self.assertEqual(second.headers['ETag'], etag)
+        self.assertEqual(second.data, first.data)
+
+        third = self.client.post('/export_image_by_ids', json=payload, headers={'If-None-Match': etag})
+        self.assertEqual(third.status_code, 304)
+        self.assertEqual(self.server.requests, requests_before)
+
+        # 排版参数不同时不命中
+        other = self.client.post('/export_image_by_ids', json=dict(payload, cols=3))
+        self.assertEqual(other.headers['X-Export-Cache'], 'miss')
+
+    def test_degraded_export_not_cached(self):
+        """测试有图片下载失败时导出结果不缓存，源站恢复后得到完整的图片"""
+        payload = {'image_ids': [1, 2], 'cols': 2}
+        self.server.failing = True
+        for _ in range(2):
+            resp = self.client.post('/export_image_by_ids', json=payload)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('X-Export-Cache', resp.headers)
+            self.assertEqual(resp.headers['Cache-Control'], 'no-store')
+            self.assertEqual(resp.headers['X-Export-Missing-Images'], '2')
+        self.assertEqual(app_new.export_cache.stats()['items'], 0)
+
+        self.server.failing = False
+        resp = self.client.post('/export_image_by_ids', json=payload)
+        self.assertEqual(resp.headers['X-Export-Cache'], 'miss')
+        self.assertNotIn('X-Export-Missing-Images', resp.headers)
+
+    def test_export_timeout_uses_placeholders(self):
+        """测试下载超时时保留已完成的图片，其余用占位图，导出不失败"""
+        self.export([1], cols=1)
+        self.server.delay = 1
+        timeout = app_new.EXPORT_DOWNLOAD_TIMEOUT
+        app_new.EXPORT_DOWNLOAD_TIMEOUT = 0.2
+        try:
+            resp = self.client.post('/export_image_by_ids', json={'image_ids': [1, 2], 'cols': 2})
+        finally:
+            app_new.EXPORT_DOWNLOAD_TIMEOUT = timeout
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers['X-Export-Missing-Images'], '1')
+        self.assertEqual(resp.headers['Cache-Control'], 'no-store')
+        # 已开始的下载不会被中断，等它结束再清理缓存，避免影响后面的测试
+        deadline = time.time() + 5
+        while app_new.download_engine.stats()['running_jobs'] and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_export_reads_prebuilt_thumbnails(self):
+        """测试预生成的缩略图存储中已有的图片不再下载"""
+        writer = ThumbStoreWriter(os.path.join(self.tmp_dir, 'store'))
+        writer.add(1, PixelBuffer("RGBA", (120, 120), bytes([7, 8, 9, 255]) * 120 * 120))
+        writer.close()
+        app_new.thumb_store = ThumbStore(os.path.join(self.tmp_dir, 'store'))
+        img = self.export([1, 2], cols=2)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(img.convert("RGBA").getpixel((5, 5)), (7, 8, 9, 255))
+
+    def test_export_by_urls(self):
+        """测试按URL导出"""
+        resp = self.client.post('/export_image', json={
+            'images': [self.server.url('img/a.png'), self.server.url('missing.png')], 'cols': 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Image.open(io.BytesIO(resp.data)).size, (240, 120))
+
+    def test_invalid_request(self):
+        """测试缺少字段时返回400"""
+        self.assertEqual(self.client.post('/export_image_by_ids', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/export_image_by_ids', json={'image_ids': []}).status_code, 400)
+        self.assertEqual(self.client.post('/export_image_by_ids', json={'image_ids': [1], 'cols': 0}).status_code, 400)
+
+class TestExportJobApi(RemoteImageTestCase):
+    """测试异步导出任务接口"""
+
+    def setUp(self):
+        super().setUp()
+        self._old_export_jobs = app_new.export_jobs
+        self._old_async_min = app_new.EXPORT_ASYNC_MIN
+        app_new.export_jobs = ExportJobManager(workers=1, max_queued=1, ttl=60,
+                                               root=os.path.join(self.tmp_dir, 'jobs'))
+        app_new.EXPORT_ASYNC_MIN = 3
+
+    def tearDown(self):
+        app_new.export_jobs.shutdown()
+        app_new.export_jobs = self._old_export_jobs
+        app_new.EXPORT_ASYNC_MIN = self._old_async_min
+        super().tearDown()
+
+    def wait_for(self, status_url):
+        for _ in range(200):
+            status = self.client.get(status_url).get_json()
+            if status['state'] in ('done', 'failed'):
+                return status
+            time.sleep(0.05)
+        self.fail("导出任务未在限定时间内完成")
+
+    def test_small_export_stays_synchronous(self):
+        """测试字数较少的导出直接返回图片"""
+        resp = self.client.post('/api/export_jobs', json={'image_ids': [1, 2], 'cols': 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Image.open(io.BytesIO(resp.data)).size, (240, 120))
+
+    def test_job_progress_and_download(self):
+        """测试大型导出返回任务ID，完成后可下载，与同步导出结果一致"""
+        payload = {'image_ids': [1, 2, 'placeholder', 3, 5], 'cols': 3, 'direction': 'vertical-left'}
+        resp = self.client.post('/api/export_jobs', json=payload)
+        self.assertEqual(resp.status_code, 202)
+        job = resp.get_json()
+        self.assertEqual(resp.headers['Location'], job['status_url'])
+        self.assertEqual(job['total'], 4)
+
+        status = self.wait_for(job['status_url'])
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual((status['downloaded'], status['resized']), (4, 4))
+        self.assertTrue(status['encoded'])
+        self.assertEqual(status['progress'], 1.0)
+
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(len(download.data), status['size'])
+        app_new.export_cache.clear()
+        sync = self.client.post('/export_image_by_ids', json=payload)
+        self.assertEqual(Image.open(io.BytesIO(download.data)).tobytes(),
+                         Image.open(io.BytesIO(sync.data)).tobytes())
+
+    def test_cached_layout_returned_synchronously(self):
+        """测试已完成的排版再次提交时直接返回缓存的文件"""
+        payload = {'image_ids': [1, 2, 3], 'cols': 3}
+        job = self.client.post('/api/export_jobs', json=payload).get_json()
+        self.wait_for(job['status_url'])
+        again = self.client.post('/api/export_jobs', json=payload)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.headers['X-Export-Cache'], 'hit')
+
+    def test_degraded_job_not_cached(self):
+        """测试有图片下载失败的后台导出不写入导出缓存，下载时禁止缓存"""
+        self.server.failing = True
+        job = self.client.post('/api/export_jobs', json={'image_ids': [1, 2, 3], 'cols': 3}).get_json()
+        status = self.wait_for(job['status_url'])
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(status['missing_images'], 3)
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.headers['Cache-Control'], 'no-store')
+        self.assertEqual(app_new.export_cache.stats()['items'], 0)
+
+    def test_queue_limit_and_pending_download(self):
+        """测试任务数达到上限时返回503，未完成的任务不能下载"""
+        self.server.delay = 0.2
+        job = self.client.post('/api/export_jobs', json={'image_ids': [1, 2, 3], 'cols': 3}).get_json()
+        self.assertEqual(self.client.get(f"/api/export_jobs/{job['job_id']}/download").status_code, 409)
+        resp = self.client.post('/api/export_jobs', json={'image_ids': [3, 2, 1], 'cols': 3})
+        self.assertEqual(resp.status_code, 503)
+        self.wait_for(job['status_url'])
+
+    def test_unknown_job_and_invalid_request(self):
+        """测试不存在的任务返回404，无效参数返回400"""
+        self.assertEqual(self.client.get('/api/export_jobs/nope').status_code, 404)
+        self.assertEqual(self.client.get('/api/export_jobs/nope/download').status_code, 404)
+        self.assertEqual(self.client.post('/api/export_jobs', json={'image_ids': []}).status_code, 400)
+        self.assertEqual(self.client.post('/api/export_jobs', json=[1, 2]).status_code, 400)
+        self.assertEqual(self.client.post('/export_image_by_ids', json=[1, 2]).status_code, 400)
+
+class TestPrefetchApi(RemoteImageTestCase):
+    """测试生成集字后的后台预取"""
+
+    def setUp(self):
+        super().setUp()
+        app_new.prefetcher = PrefetchQueue(
+            app_new._prefetch_thumbnail, pressure=lambda: app_new.thumbnail_cache.memory.unused_ratio(), workers=2)
+
+    def test_export_served_from_prefetched_cache(self):
+        """测试预取完成后导出不再访问源站"""
+        data = self.client.get('/api/generate_calligraphy?text=之不之').get_json()
+        self.assertTrue(app_new.prefetcher.wait_idle(timeout=10))
+        # 之 的两张候选图片和 不 的第一张图片
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(app_new.prefetcher.stats()["completed"], 3)
+
+        image_ids = [c['image_ids'][0] for c in data['characters']]
+        resp = self.client.post('/export_image_by_ids', json={'image_ids': image_ids, 'cols': 3})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_prefetch_with_full_cache(self):
+        """测试内存缓存已满（正常运行的 LRU）时仍然预取"""
+        memory = app_new.thumbnail_cache.memory
+        app_new.thumbnail_cache.memory = MemoryThumbnailCache(max_bytes=2 * 120 * 120 * 4)
+        try:
+            for i in range(3):
+                app_new.thumbnail_cache.memory.put(f"other{i}", PixelBuffer("RGBA", (120, 120), bytes(120 * 120 * 4)))
+            self.assertEqual(app_new.thumbnail_cache.memory.usage(), 1.0)
+            self.client.get('/api/generate_calligraphy?text=不')
+            self.assertTrue(app_new.prefetcher.wait_idle(timeout=10))
+            self.assertEqual(app_new.prefetcher.stats()["completed"], 1)
+            self.assertGreater(app_new.thumbnail_cache.memory.unused_ratio(), 0)
+        finally:
+            app_new.thumbnail_cache.memory = memory
+
+    def test_prefetch_cancelled_under_cache_pressure(self):
+        """测试预取未使用的缩略图过多时不再预取"""
+        app_new.prefetcher.max_usage = 0.0
+        self.client.get('/api/generate_calligraphy?text=之不')
+        self.assertTrue(app_new.prefetcher.wait_idle(timeout=10))
+        self.assertEqual(self.server.requests, 0)
+
+class TestSpriteApi(RemoteImageTestCase):
+    """测试搜索结果雪碧图接口"""
+
+    def test_sprite_map_and_image(self):
+        """测试坐标映射与雪碧图尺寸一致，一页只需一次图片请求"""
+        resp = self.client.get('/api/search/sprite?author=王羲之&per_page=3&cursor=')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertEqual([r['id'] for r in data['results']], [1, 4, 7])
+        self.assertEqual([r['sprite_xy'] for r in data['results']], [[0, 0], [120, 0], [240, 0]])
+        self.assertEqual(data['next_cursor'] is not None, True)
+        sprite = data['sprite']
+        self.assertEqual((sprite['width'], sprite['height']), (1200, 120))
+
+        image = self.client.get(sprite['url'])
+        self.assertEqual(image.status_code, 200)
+        self.assertIn('immutable', image.headers['Cache-Control'])
+        self.assertEqual(Image.open(io.BytesIO(image.data)).size, (1200, 120))
+        self.assertEqual(self.server.requests, 3)
+
+        # 再次请求命中缓存，ETag 匹配时返回304
+        again = self.client.get(sprite['url'], headers={'If-None-Match': image.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_degraded_sprite_not_cached(self):
+        """测试有图片下载失败的雪碧图不缓存、不带长期缓存头，源站恢复后重新生成"""
+        self.server.failing = True
+        url = self.client.get('/api/search/sprite?author=王羲之&per_page=3').get_json()['sprite']['url']
+        image = self.client.get(url)
+        self.assertEqual(image.status_code, 200)
+        self.assertEqual(image.headers['Cache-Control'], 'no-store')
+        self.assertNotIn('ETag', image.headers)
+        self.assertEqual(app_new.sprite_cache.stats()['items'], 0)
+
+        self.server.failing = False
+        image = self.client.get(url)
+        self.assertIn('immutable', image.headers['Cache-Control'])
+        self.assertEqual(app_new.sprite_cache.stats()['items'], 1)
+
+    def test_sprite_timeout_uses_placeholders(self):
+        """测试下载超时时雪碧图用占位图代替未完成的图片，不返回500"""
+        url = self.client.get('/api/search/sprite?author=王羲之&per_page=3').get_json()['sprite']['url']
+        self.server.delay = 1
+        timeout = app_new.EXPORT_DOWNLOAD_TIMEOUT
+        app_new.EXPORT_DOWNLOAD_TIMEOUT = 0.2
+        try:
+            image = self.client.get(url)
+        finally:
+            app_new.EXPORT_DOWNLOAD_TIMEOUT = timeout
+        self.assertEqual(image.status_code, 200)
+        self.assertEqual(image.headers['Cache-Control'], 'no-store')
+        self.assertEqual(app_new.sprite_cache.stats()['items'], 0)
+        # 已开始的下载不会被中断，等它结束再清理缓存，避免影响后面的测试
+        deadline = time.time() + 5
+        while app_new.download_engine.stats()['running_jobs'] and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_sprite_with_facets(self):
+        """测试雪碧图接口同样可以返回分面计数"""
+        data = self.client.get('/api/search/sprite?han=人&facets=true').get_json()
+        self.assertEqual(data['facets']['authors'], {'欧阳询': 1})
+
+    def test_glyph_without_images_left_blank(self):
+        """测试没有图片的字形在雪碧图中没有坐标"""
+        data = self.client.get('/api/search/sprite?han=和').get_json()
+        self.assertIsNone(data['results'][0]['sprite_xy'])
+        self.assertEqual(self.client.get(data['sprite']['url']).status_code, 200)
+        self.assertEqual(self.server.requests, 0)
+
+    def test_invalid_params(self):
+        """测试无效参数返回400，空结果没有雪碧图"""
+        self.assertEqual(self.client.get('/api/search/sprite?size=77').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/sprite?format=gif').status_code, 400)
+        data = self.client.get('/api/search/sprite?han=无').get_json()
+        self.assertIsNone(data['sprite']['url'])
+
+class TestThumbApi(RemoteImageTestCase):
+    """测试缩略图代理接口"""
+
+    def test_thumb_headers_and_conditional(self):
+        """测试缩略图带长期缓存头，条件请求返回304"""
+        resp = self.client.get('/thumb/1?size=60')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'image/webp')
+        self.assertIn('immutable', resp.headers['Cache-Control'])
+        self.assertIn('Last-Modified', resp.headers)
+        self.assertEqual(resp.headers['X-Thumb-Cache'], 'miss')
+        self.assertEqual(Image.open(io.BytesIO(resp.data)).size, (60, 60))
+        etag = resp.headers['ETag']
+
+        again = self.client.get('/thumb/1?size=60')
+        self.assertEqual(again.headers['X-Thumb-Cache'], 'hit')
+        self.assertEqual(again.headers['ETag'], etag)
+        self.assertEqual(again.data, resp.data)
+
+        self.assertEqual(self.client.get('/thumb/1?size=60', headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get('/thumb/1?size=60', headers={
+            'If-Modified-Since': resp.headers['Last-Modified']}).status_code, 304)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_thumb_sizes_and_formats(self):
+        """测试不同尺寸和格式分别缓存，共用同一份原图"""
+        png = self.client.get('/thumb/2?format=png')
+        self.assertEqual(png.mimetype, 'image/png')
+        self.assertEqual(Image.open(io.BytesIO(png.data)).size, (120, 120))
+        webp = self.client.get('/thumb/2')
+        self.assertEqual(webp.mimetype, 'image/webp')
+        self.assertNotEqual(webp.headers['ETag'], png.headers['ETag'])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_thumb_invalid(self):
+        """测试无效参数返回400，不存在的图片返回404"""
+        self.assertEqual(self.client.get('/thumb/1?size=77').status_code, 400)
+        self.assertEqual(self.client.get('/thumb/1?format=gif').status_code, 400)
+        self.assertEqual(self.client.get('/thumb/9999').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from tools.check_db import DatabaseChecker
+from tests.sample_db import create_sample_db, SCHEMA
+
+# 迁移后不应再有全表扫描或临时排序的查询
+INDEXED_QUERIES = ["维度表-字体", "搜索-按字", "搜索-游标分页", "搜索-全部条件",
+                   "单张图片", "缩略图-按图片ID", "字形全部图片", "批量图片", "集字-每字首个字形"]
+
+class TestCheckDb(unittest.TestCase):
+    """测试查询计划分析和索引迁移"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'))
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def index_names(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'")}
+
+    def migrate(self):
+        """执行一次 --migrate，返回迁移后的查询报告"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, after = DatabaseChecker(self.db_path).migrate(repeat=1)
+        return {item["name"]: item for item in after}
+
+    def test_explain_reports_all_queries(self):
+        """测试 --explain 分析每条应用查询，维度表的全表扫描不算问题"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = DatabaseChecker(self.db_path).check_query_plans(repeat=1)
+        by_name = {item["name"]: item for item in report}
+        self.assertIn("搜索-按字", by_name)
+        self.assertTrue(any(detail.startswith("SCAN fonts") for detail in by_name["维度表-字体"]["plan"]))
+        self.assertEqual(by_name["维度表-字体"]["full_scans"], [])
+
+    def test_migrate_skips_existing_indexes(self):
+        """测试 fix_split2.sql 已有同列索引时不重复创建"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            created, _ = DatabaseChecker(self.db_path).apply_index_migration()
+        # idx_han(han) 以 rowid 结尾，等价于 glyphs(han, id)
+        self.assertEqual(created, ["idx_glyphs_book_cover", "idx_images_glyph_cover"])
+
+    def test_migrate_idempotent(self):
+        """测试重复执行 --migrate 不再创建索引，查询计划不变"""
+        first = self.migrate()
+        indexes = self.index_names()
+        second = self.migrate()
+        self.assertEqual(self.index_names(), indexes)
+        for name, item in second.items():
+            self.assertEqual(item["plan"], first[name]["plan"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            created, journal_mode = DatabaseChecker(self.db_path).apply_index_migration()
+        self.assertEqual(created, [])
+        self.assertEqual(journal_mode, "wal")
+
+    def test_plans_after_migrate(self):
+        """测试迁移后热点查询不再全表扫描或临时排序"""
+        report = self.migrate()
+        for name in INDEXED_QUERIES:
+            self.assertEqual(report[name]["full_scans"], [], name)
+
+    def test_migrate_without_base_indexes(self):
+        """测试没有 fix_split2.sql 索引的数据库迁移后按字搜索按 id 顺序读取"""
+        os.remove(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO glyphs (han, font_id, author_id, book_id) VALUES (?, 1, 1, 1)",
+                             [(chr(0x4E00 + i % 100),) for i in range(1000)])
+            conn.execute("INSERT INTO images (glyph_id, url) VALUES (1, 'u')")
+        report = self.migrate()
+        self.assertIn("idx_glyphs_han_id", self.index_names())
+        for name in ("搜索-按字", "搜索-游标分页"):
+            self.assertEqual(report[name]["full_scans"], [], name)
+
+    def test_obsolete_indexes_dropped(self):
+        """测试迁移删除早期版本创建的重复索引"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE INDEX idx_glyphs_han_cover ON glyphs(han, font_id, author_id, book_id, id)")
+            conn.execute("CREATE INDEX idx_glyphs_font_cover ON glyphs(font_id, id)")
+        self.migrate()
+        indexes = self.index_names()
+        self.assertNotIn("idx_glyphs_han_cover", indexes)
+        self.assertNotIn("idx_glyphs_font_cover", indexes)
+        self.assertIn("idx_font_id", indexes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from db_pool import ConnectionPool
+from tests.sample_db import create_sample_db
+
+class TestConnectionPool(unittest.TestCase):
+    """测试数据库连接池"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'))
+        self.pool = ConnectionPool(self.db_path, max_size=2, timeout=0.5)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.pool.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_connection_reused(self):
+        """测试close()归还连接后会被复用"""
+        conn = self.pool.acquire()
+        conn.close()
+        conn2 = self.pool.acquire()
+        self.assertIs(conn._conn, conn2._conn)
+        conn2.close()
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['open_connections'], 1)
+
+    def test_connection_tuned(self):
+        """测试连接已完成调优"""
+        conn = self.pool.acquire()
+        try:
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+            self.assertLess(conn.execute("PRAGMA cache_size").fetchone()[0], 0)
+            row = conn.execute("SELECT name FROM fonts ORDER BY name").fetchone()
+            self.assertIsInstance(row, sqlite3.Row)
+        finally:
+            conn.close()
+
+    def test_read_only(self):
+        """测试连接池中的连接是只读的"""
+        conn = self.pool.acquire()
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO fonts (name) VALUES ('隶书')")
+        finally:
+            conn.close()
+
+    def test_wait_when_exhausted(self):
+        """测试连接耗尽时会等待并记录等待时间"""
+        conn1 = self.pool.acquire()
+        conn2 = self.pool.acquire()
+
+        timer = threading.Timer(0.05, conn1.close)
+        timer.start()
+        conn3 = self.pool.acquire()
+        timer.join()
+
+        self.assertIs(conn3._conn, conn1._conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats['open_connections'], 2)
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time_total_ms'], 0)
+        conn2.close()
+        conn3.close()
+
+    def test_acquire_timeout(self):
+        """测试等待超时"""
+        conns = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire()
+        for conn in conns:
+            conn.close()
+
+    def test_double_close_ignored(self):
+        """测试重复归还不会把已被再次借出的连接放回池中"""
+        conn = self.pool.acquire()
+        conn.close()
+        conn2 = self.pool.acquire()
+        self.assertIs(conn2._conn, conn._conn)
+        conn.close()
+        self.assertEqual(self.pool.stats()['idle_connections'], 0)
+        self.assertFalse(conn2.released)
+        conn2.close()
+        conn2.close()
+        self.assertEqual(self.pool.stats()['idle_connections'], 1)
+
+    def test_stale_handle_rejected(self):
+        """测试归还后的旧句柄不能使用已被再次借出的连接"""
+        conn = self.pool.acquire()
+        conn.close()
+        self.assertTrue(conn.released)
+        conn2 = self.pool.acquire()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertEqual(conn2.execute("SELECT 1").fetchone()[0], 1)
+        conn2.close()
+
+    def test_leaked_connection_reclaimed(self):
+        """测试借出后丢失引用的连接被回收时释放名额"""
+        conns = [self.pool.acquire(), self.pool.acquire()]
+        del conns
+        gc.collect()
+        stats = self.pool.stats()
+        self.assertEqual(stats['open_connections'], 0)
+        self.assertEqual(stats['leaked'], 2)
+        self.pool.acquire().close()
+
+    def test_connection_context(self):
+        """测试 with 块中出错时连接仍被归还"""
+        with self.assertRaises(ZeroDivisionError):
+            with self.pool.connection() as conn:
+                1 / 0
+        self.assertEqual(self.pool.stats()['idle_connections'], 1)
+        self.assertTrue(conn.released)
+
+class TestMemoryConnectionPool(TestConnectionPool):
+    """数据库加载到内存后重复连接池的测试，并测试重新加载"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'))
+        self.pool = ConnectionPool(self.db_path, max_size=2, timeout=0.5, in_memory=True, reload_interval=0)
+
+    def insert_glyph(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO glyphs (han) VALUES ('永')")
+        conn.commit()
+        conn.close()
+
+    def count_glyphs(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM glyphs").fetchone()[0]
+
+    def test_reload_swaps_connections(self):
+        """测试文件变化后重新加载，使用中的连接保持旧副本，归还后换成新副本的连接"""
+        conn = self.pool.acquire()
+        self.assertEqual(self.count_glyphs(conn), 8)
+        self.assertFalse(self.pool.check_reload())
+
+        self.insert_glyph()
+        self.assertTrue(self.pool.check_reload())
+        self.assertEqual(self.count_glyphs(conn), 8)
+        conn.close()
+
+        conn = self.pool.acquire()
+        self.assertEqual(self.count_glyphs(conn), 9)
+        conn.close()
+        stats = self.pool.stats()
+        self.assertEqual(stats['open_connections'], 1)
+        self.assertEqual(stats['in_memory']['generation'], 2)
+
+    def test_data_version(self):
+        """测试数据版本在重新加载之前保持不变"""
+        version = self.pool.data_version()
+        self.insert_glyph()
+        self.assertEqual(self.pool.data_version(), version)
+        self.pool.check_reload()
+        self.assertNotEqual(self.pool.data_version(), version)
+
+    def test_memory_stats(self):
+        """测试报告内存副本大小"""
+        memory = self.pool.stats()['in_memory']
+        self.assertTrue(memory['loaded'])
+        self.assertEqual(memory['bytes'], os.path.getsize(self.db_path))
+
+    def test_watcher_reloads(self):
+        """测试后台线程发现文件变化后自动重新加载"""
+        pool = ConnectionPool(self.db_path, max_size=1, in_memory=True, reload_interval=0.01)
+        try:
+            self.insert_glyph()
+            for _ in range(200):
+                if pool.stats()['in_memory']['generation'] == 2:
+                    break
+                time.sleep(0.01)
+            conn = pool.acquire()
+            self.assertEqual(self.count_glyphs(conn), 9)
+            conn.close()
+        finally:
+            pool.close()
+
+    def test_missing_file_falls_back(self):
+        """测试加载失败时不影响创建连接池"""
+        pool = ConnectionPool(os.path.join(self.tmp_dir, 'missing.db'), in_memory=True, reload_interval=0)
+        memory = pool.stats()['in_memory']
+        self.assertFalse(memory['loaded'])
+        self.assertEqual(memory['reload_errors'], 1)
+        self.assertFalse(pool.check_reload())
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from download_engine import DownloadEngine
+
+class TestDownloadEngine(unittest.TestCase):
+    """测试进程级下载引擎"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.engine = DownloadEngine(max_concurrency=2)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.engine.shutdown()
+
+    def work(self, value, delay=0.02):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(delay)
+        with self.lock:
+            self.running -= 1
+        return value * 10
+
+    def fail(self):
+        raise ValueError("boom")
+
+    def test_results_in_order(self):
+        """测试结果按提交顺序返回，失败的任务为None"""
+        batch = self.engine.submit([(self.work, (i,)) for i in range(5)] + [(self.fail, ())])
+        results = batch.wait(timeout=5)
+        self.assertEqual(results, [0, 10, 20, 30, 40, None])
+        self.assertEqual(batch.errors, 1)
+
+    def test_global_concurrency_cap(self):
+        """测试多个批次共享全局并发上限"""
+        batches = [self.engine.submit([(self.work, (i,)) for i in range(4)]) for _ in range(3)]
+        for batch in batches:
+            batch.wait(timeout=5)
+        self.assertLessEqual(self.max_running, 2)
+
+    def test_fair_scheduling(self):
+        """测试后提交的小批次不会排在大批次之后"""
+        big = self.engine.submit([(self.work, (i, 0.05)) for i in range(20)])
+        time.sleep(0.01)
+        small = self.engine.submit([(self.work, (1, 0.05))])
+        small.wait(timeout=5)
+        self.assertFalse(big.done())
+        big.wait(timeout=5)
+
+    def test_cancel(self):
+        """测试取消后丢弃未开始的任务"""
+        batch = self.engine.submit([(self.work, (i, 0.05)) for i in range(20)])
+        time.sleep(0.02)
+        batch.cancel()
+        self.assertTrue(batch._done.wait(timeout=1))
+        time.sleep(0.15)
+        self.assertGreater(self.engine.stats()['cancelled_jobs'], 0)
+        self.assertLess(self.engine.stats()['completed_jobs'], 20)
+
+    def test_timeout(self):
+        """测试等待超时"""
+        batch = self.engine.submit([(self.work, (1, 0.3))])
+        with self.assertRaises(TimeoutError):
+            batch.wait(timeout=0.01)
+        batch.cancel()
+
+    def test_wait_partial(self):
+        """测试部分等待超时后保留已完成的结果，未完成的任务为None"""
+        batch = self.engine.submit([(self.work, (1, 0.01)), (self.work, (2, 0.5)), (self.work, (3, 0.5))])
+        time.sleep(0.1)
+        self.assertEqual(batch.wait_partial(timeout=0.05), [10, None, None])
+        self.assertTrue(batch.cancelled)
+        self.assertEqual(self.engine.submit([(self.work, (4,))]).wait_partial(timeout=5), [40])
+
+if __name__ == '__main__':
+    unittest.main()
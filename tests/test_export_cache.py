@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from export_cache import ExportCache, export_cache_key
+
+class TestExportCache(unittest.TestCase):
+    """测试导出结果缓存"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_key_normalization(self):
+        """测试图片ID的写法不影响缓存键，排版参数影响缓存键"""
+        base = export_cache_key([1, '2', None], 10, 'horizontal', (120, 120), 'print', 'png/default')
+        self.assertEqual(base, export_cache_key(['1', 2, 'placeholder'], 10, 'horizontal', (120, 120),
+                                                'print', 'png/default'))
+        self.assertNotEqual(base, export_cache_key([2, 1, None], 10, 'horizontal', (120, 120),
+                                                   'print', 'png/default'))
+        self.assertNotEqual(base, export_cache_key([1, 2, None], 10, 'horizontal', (120, 120),
+                                                   'print', 'webp/default'))
+
+    def test_put_get_and_reload(self):
+        """测试写入、读取，以及新实例从目录恢复索引"""
+        cache = ExportCache(root=self.tmp_dir, max_bytes=1024)
+        entry = cache.put("ab" * 32, b"x" * 100, "png")
+        self.assertEqual(cache.get("ab" * 32).etag, entry.etag)
+        self.assertIsNone(cache.get("cd" * 32))
+
+        reloaded = ExportCache(root=self.tmp_dir, max_bytes=1024)
+        found = reloaded.get("ab" * 32)
+        self.assertEqual(found.etag, entry.etag)
+        with open(found.path, "rb") as f:
+            self.assertEqual(f.read(), b"x" * 100)
+
+    def test_evicts_least_recently_used(self):
+        """测试超过字节上限时淘汰最久未使用的文件"""
+        cache = ExportCache(root=self.tmp_dir, max_bytes=250)
+        first = cache.put("a" * 64, b"1" * 100, "png")
+        cache.put("b" * 64, b"2" * 100, "png")
+        cache.get("a" * 64)
+        cache.put("c" * 64, b"3" * 100, "png")
+        self.assertIsNotNone(cache.get("a" * 64))
+        self.assertIsNone(cache.get("b" * 64))
+        self.assertTrue(os.path.exists(first.path))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], 250)
+
+    def test_disabled(self):
+        """测试目录为空字符串时禁用缓存"""
+        cache = ExportCache(root="", max_bytes=1024)
+        self.assertIsNone(cache.put("a" * 64, b"1", "png"))
+        self.assertIsNone(cache.get("a" * 64))
+
+if __name__ == '__main__':
+    unittest.main()
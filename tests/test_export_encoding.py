@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+# 导入项目模块
+from export_encoding import ENCODINGS, resolve_encoding
+
+def make_canvas():
+    """白底透明画布上的黑色墨迹"""
+    img = Image.new("RGBA", (240, 120), (255, 255, 255, 0))
+    img.paste((0, 0, 0, 255), (20, 20, 100, 100))
+    img.paste((80, 80, 80, 200), (140, 30, 220, 90))
+    return img
+
+class TestExportEncoding(unittest.TestCase):
+    """测试导出编码格式与预设"""
+
+    def test_all_encodings_decode(self):
+        """测试每种格式和预设的输出都可以被解码"""
+        canvas = make_canvas()
+        for fmt, presets in ENCODINGS.items():
+            for preset, encoding in presets.items():
+                decoded = Image.open(io.BytesIO(encoding.encode(canvas)))
+                self.assertEqual(decoded.format, "JPEG" if fmt == "jpeg" else fmt.upper(), encoding.name)
+                self.assertEqual(decoded.size, canvas.size, encoding.name)
+
+    def test_lossless_encodings_preserve_pixels(self):
+        """测试无损编码保留可见像素（WebP 不保留全透明像素的颜色值）"""
+        def on_white(img):
+            img = img.convert("RGBA")
+            return Image.alpha_composite(Image.new("RGBA", img.size, (255, 255, 255, 255)), img)
+
+        canvas = make_canvas()
+        for name in (("png", "fast"), ("webp", "default"), ("png", "gray")):
+            encoding = resolve_encoding(*name)
+            decoded = Image.open(io.BytesIO(encoding.encode(canvas)))
+            expected = encoding.prepare(canvas)
+            self.assertEqual(on_white(decoded).tobytes(), on_white(expected).tobytes(), encoding.name)
+
+    def test_jpeg_flattens_on_white(self):
+        """测试 JPEG 的透明区域填充为白色"""
+        decoded = Image.open(io.BytesIO(resolve_encoding("jpg").encode(make_canvas())))
+        self.assertEqual(decoded.mode, "RGB")
+        self.assertTrue(all(c > 245 for c in decoded.getpixel((230, 5))))
+
+    def test_resolve_encoding(self):
+        """测试默认值和未知参数"""
+        self.assertEqual(resolve_encoding().name, "png/default")
+        self.assertTrue(resolve_encoding("PNG", "fast").streamable)
+        self.assertFalse(resolve_encoding("png", "palette").streamable)
+        with self.assertRaises(ValueError):
+            resolve_encoding("gif")
+        with self.assertRaises(ValueError):
+            resolve_encoding("jpeg", "lossless")
+
+if __name__ == '__main__':
+    unittest.main()
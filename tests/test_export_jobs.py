@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from export_encoding import resolve_encoding
+from export_jobs import ExportJobManager, JobQueueFull, STAGE_DOWNLOADING
+
+class TestExportJobManager(unittest.TestCase):
+    """测试后台导出任务管理"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.manager = ExportJobManager(workers=1, max_queued=2, ttl=60, root=self.tmp_dir)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.manager.shutdown()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def wait_finished(self, job):
+        for _ in range(200):
+            if job.finished:
+                return
+            time.sleep(0.01)
+        self.fail("任务未在限定时间内完成")
+
+    def test_job_writes_file(self):
+        """测试任务完成后文件写入任务目录，进度为1"""
+        def render(job):
+            job.set_stage(STAGE_DOWNLOADING)
+            for _ in range(job.total):
+                job.fetched()
+                job.image_ready()
+            return b"png-bytes", resolve_encoding("png")
+
+        job = self.manager.submit(render, total=3)
+        self.wait_finished(job)
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.to_dict()["progress"], 1.0)
+        with open(job.path, "rb") as f:
+            self.assertEqual(f.read(), b"png-bytes")
+        self.assertTrue(job.path.endswith(".png"))
+
+    def test_progress_reports_stages(self):
+        """测试进度随下载、缩放推进"""
+        release = threading.Event()
+
+        def render(job):
+            job.set_stage(STAGE_DOWNLOADING)
+            job.fetched()
+            release.wait(5)
+            return b"x", resolve_encoding("png")
+
+        job = self.manager.submit(render, total=2)
+        for _ in range(200):
+            if job.downloaded:
+                break
+            time.sleep(0.01)
+        info = job.to_dict()
+        self.assertEqual(info["state"], "running")
+        self.assertEqual(info["stage"], "downloading")
+        self.assertAlmostEqual(info["progress"], 0.2)
+        release.set()
+        self.wait_finished(job)
+
+    def test_failed_job(self):
+        """测试任务出错时记录错误信息"""
+        def render(job):
+            raise RuntimeError("boom")
+
+        job = self.manager.submit(render, total=1)
+        self.wait_finished(job)
+        self.assertEqual(job.state, "failed")
+        self.assertEqual(job.error, "boom")
+        self.assertEqual(self.manager.stats()["failed"], 1)
+
+    def test_queue_limit(self):
+        """测试未完成的任务达到上限时拒绝新任务"""
+        release = threading.Event()
+
+        def render(job):
+            release.wait(5)
+            return b"x", resolve_encoding("png")
+
+        jobs = [self.manager.submit(render, total=1) for _ in range(2)]
+        with self.assertRaises(JobQueueFull):
+            self.manager.submit(render, total=1)
+        release.set()
+        for job in jobs:
+            self.wait_finished(job)
+        self.manager.submit(render, total=1)
+
+    def test_expired_jobs_removed(self):
+        """测试过期的任务连同文件一起清理"""
+        self.manager.ttl = 0
+        job = self.manager.submit(lambda job: (b"x", resolve_encoding("png")), total=1)
+        self.wait_finished(job)
+        self.assertIsNone(self.manager.get(job.id))
+        self.assertFalse(os.path.exists(job.path))
+        self.assertEqual(self.manager.stats()["expired"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from http_client import ImageHttpClient
+from tests.stub_server import StubImageServer, make_png
+
+class TestImageHttpClient(unittest.TestCase):
+    """使用本地图片服务器测试下载客户端"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = StubImageServer().start()
+        self.client = ImageHttpClient(pool_size=2, per_host_limit=2, timeout=5, cache_dir=self.tmp_dir)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_connection_reuse(self):
+        """测试连续请求复用同一个连接"""
+        for i in range(5):
+            body = self.client.fetch(self.server.url(f"img/{i}.png"))
+            self.assertEqual(body, make_png(f"/img/{i}.png"))
+
+        stats = self.client.stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(self.server.connections, 1)
+        self.assertAlmostEqual(stats['reuse_rate'], 0.8)
+        self.assertEqual(stats['bytes_fetched'], sum(len(make_png(f"/img/{i}.png")) for i in range(5)))
+
+    def test_conditional_revalidation(self):
+        """测试再次下载时使用ETag条件请求"""
+        url = self.server.url("img/a.png")
+        first = self.client.fetch(url)
+        second = self.client.fetch(url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.not_modified, 1)
+        stats = self.client.stats()
+        self.assertEqual(stats['not_modified'], 1)
+        self.assertEqual(stats['bytes_fetched'], len(first))
+
+    def test_original_cache_bounded(self):
+        """测试原图副本超过字节上限时淘汰最久未使用的，被淘汰的原图重新完整下载"""
+        size = len(make_png("/img/0.png"))
+        client = ImageHttpClient(timeout=5, cache_dir=os.path.join(self.tmp_dir, "small"),
+                                 cache_bytes=size * 2 + size // 2)
+        try:
+            for i in range(3):
+                client.fetch(self.server.url(f"img/{i}.png"))
+            cache = client.stats()['original_cache']
+            self.assertEqual(cache['items'], 2)
+            self.assertLessEqual(cache['bytes'], cache['max_bytes'])
+            self.assertEqual(cache['evictions'], 1)
+
+            client.fetch(self.server.url("img/0.png"))
+            self.assertEqual(self.server.not_modified, 0)
+            client.fetch(self.server.url("img/2.png"))
+            self.assertEqual(self.server.not_modified, 1)
+        finally:
+            client.close()
+
+    def test_legacy_copies_removed(self):
+        """测试旧格式的原图副本在启动时删除"""
+        legacy = os.path.join(self.tmp_dir, "ab", "ab" + "0" * 38 + ".bin")
+        os.makedirs(os.path.dirname(legacy), exist_ok=True)
+        with open(legacy, "wb") as f:
+            f.write(b"x" * 100)
+        client = ImageHttpClient(cache_dir=self.tmp_dir)
+        client.close()
+        self.assertFalse(os.path.exists(legacy))
+
+    def test_http_error(self):
+        """测试HTTP错误会抛出异常并计数"""
+        with self.assertRaises(requests.HTTPError):
+            self.client.fetch(self.server.url("missing.png"))
+        self.assertEqual(self.client.stats()['errors'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+# 导入项目模块
+from layout import GridLayout, parse_cols
+
+def legacy_positions(count, cols, direction, w, h):
+    """原来导出接口中五分支排列代码的坐标，用于对照"""
+    positions = []
+    if direction in ['vertical-left', 'vertical-right']:
+        rows_per_col = cols
+        cols_used = (count + rows_per_col - 1) // rows_per_col
+        size = (w * cols_used, h * rows_per_col)
+    else:
+        rows_used = (count + cols - 1) // cols
+        size = (w * cols, h * rows_used)
+    for idx in range(count):
+        if direction == "horizontal-reverse":
+            x, y = (cols - 1 - (idx % cols)) * w, (idx // cols) * h
+        elif direction == "vertical-left":
+            x, y = (idx // rows_per_col) * w, (idx % rows_per_col) * h
+        elif direction == "vertical-right":
+            x, y = ((cols_used - 1) - (idx // rows_per_col)) * w, (idx % rows_per_col) * h
+        else:
+            x, y = (idx % cols) * w, (idx // cols) * h
+        positions.append((x, y))
+    return size, positions
+
+class TestLayout(unittest.TestCase):
+    """测试网格排版"""
+
+    def test_matches_legacy_layout(self):
+        """测试各排列方向的画布尺寸和坐标与原来的排列代码一致"""
+        for direction in ("horizontal", "horizontal-reverse", "vertical-left", "vertical-right", "diagonal"):
+            for count in (1, 5, 10, 23):
+                for cols in (1, 3, 10):
+                    layout = GridLayout(count, cols, direction, (120, 100))
+                    size, positions = legacy_positions(count, cols, direction, 120, 100)
+                    self.assertEqual(layout.size, size, (direction, count, cols))
+                    self.assertEqual(layout.positions, positions, (direction, count, cols))
+
+    def test_bands_match_compose(self):
+        """测试按行带拼接与整张拼接的结果一致"""
+        images = [Image.new("RGBA", (10, 10), (i * 20, 0, 0, 255)) for i in range(7)]
+        layout = GridLayout(len(images), 3, "vertical-right", (10, 10))
+        canvas = layout.compose(images)
+        stacked = Image.new("RGBA", canvas.size)
+        for row, band in enumerate(layout.iter_bands(images)):
+            stacked.paste(band, (0, row * 10))
+        self.assertEqual(stacked.tobytes(), canvas.tobytes())
+
+    def test_compose_1000_cells(self):
+        """测试1000个格子的拼接耗时"""
+        images = [Image.new("RGBA", (120, 120), (0, 0, 0, 255))] * 1000
+        layout = GridLayout(len(images), 40, "horizontal", (120, 120))
+        start = time.perf_counter()
+        canvas = layout.compose(images)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(canvas.size, (4800, 3000))
+        self.assertLess(elapsed, 1.0)
+
+    def test_parse_cols(self):
+        """测试每行/列字数的校验"""
+        self.assertEqual(parse_cols("4"), 4)
+        for bad in (0, -1, "x", None):
+            with self.assertRaises(ValueError):
+                parse_cols(bad)
+
+if __name__ == '__main__':
+    unittest.main()
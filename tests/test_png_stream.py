@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+# 导入项目模块
+from png_stream import stream_png
+from layout import GridLayout
+
+def make_cells(count, size=(20, 20)):
+    return [Image.new("RGBA", size, (i * 30 % 256, 100, 200 - i * 10 % 200, 255)) for i in range(count)]
+
+class TestPngStream(unittest.TestCase):
+    """测试流式 PNG 编码"""
+
+    def encode(self, images, cols, direction, cell=(20, 20), **kwargs):
+        layout = GridLayout(len(images), cols, direction, cell)
+        width, height = layout.size
+        chunks = list(stream_png(width, height, layout.iter_bands(images), **kwargs))
+        return chunks, Image.open(io.BytesIO(b"".join(chunks)))
+
+    def test_pixels_match_full_canvas(self):
+        """测试各排列方向的流式结果与整张画布拼接一致"""
+        images = make_cells(7)
+        for direction in ("horizontal", "horizontal-reverse", "vertical-left", "vertical-right"):
+            canvas = GridLayout(len(images), 3, direction, (20, 20)).compose(images)
+            _, streamed = self.encode(images, 3, direction)
+            self.assertEqual(streamed.size, canvas.size, direction)
+            self.assertEqual(streamed.convert("RGBA").tobytes(), canvas.tobytes(), direction)
+
+    def test_header_first_and_multiple_idat_chunks(self):
+        """测试文件头单独先发出，压缩数据分块发出"""
+        noisy = [Image.frombytes("RGBA", (60, 60), os.urandom(60 * 60 * 4)) for _ in range(10)]
+        chunks, img = self.encode(noisy, 5, "horizontal", cell=(60, 60), chunk_size=4096)
+        self.assertTrue(chunks[0].startswith(b"\x89PNG"))
+        self.assertGreater(len(chunks), 3)
+        img.load()
+
+    def test_height_mismatch(self):
+        """测试行带高度与声明不一致时报错"""
+        with self.assertRaises(ValueError):
+            list(stream_png(10, 20, [Image.new("RGBA", (10, 10))]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from prefetch import PrefetchQueue, PRIORITY_FIRST, PRIORITY_VARIANT
+
+class TestPrefetchQueue(unittest.TestCase):
+    """测试后台预取队列"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.loaded = []
+        self.usage = 0.0
+        self.lock = threading.Lock()
+        self.queue = PrefetchQueue(self.load, pressure=lambda: self.usage, workers=1, max_usage=0.9)
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        self.queue.shutdown()
+
+    def load(self, img_id, url, target_size, quality):
+        with self.lock:
+            self.loaded.append(img_id)
+
+    def test_first_variants_before_others(self):
+        """测试每个字的第一张图片先于其他候选图片"""
+        with self.queue.foreground():
+            self.queue.submit([(1, "u1", PRIORITY_FIRST), (2, "u2", PRIORITY_VARIANT),
+                               (3, "u3", PRIORITY_FIRST), (4, "u4", PRIORITY_VARIANT)], (120, 120), "print")
+        self.assertTrue(self.queue.wait_idle(timeout=5))
+        self.assertEqual(self.loaded, [1, 3, 2, 4])
+
+    def test_duplicates_queued_once(self):
+        """测试同一张图片同一尺寸只排队一次"""
+        with self.queue.foreground():
+            added = self.queue.submit([(1, "u1", PRIORITY_FIRST)] * 3 + [(2, "u2", PRIORITY_FIRST)],
+                                      (120, 120), "print")
+            self.assertEqual(added, 2)
+            self.assertEqual(self.queue.submit([(1, "u1", PRIORITY_FIRST)], (60, 60), "print"), 1)
+        self.assertTrue(self.queue.wait_idle(timeout=5))
+        self.assertEqual(sorted(self.loaded), [1, 1, 2])
+
+    def test_paused_while_foreground(self):
+        """测试前台任务进行时不取新任务"""
+        with self.queue.foreground():
+            self.queue.submit([(1, "u1", PRIORITY_FIRST)], (120, 120), "print")
+            self.assertFalse(self.queue.wait_idle(timeout=0.2))
+            self.assertEqual(self.loaded, [])
+            self.assertTrue(self.queue.stats()["paused"])
+        self.assertTrue(self.queue.wait_idle(timeout=5))
+        self.assertEqual(self.loaded, [1])
+
+    def test_cancelled_under_pressure(self):
+        """测试缓存使用率达到阈值时取消尚未开始的任务"""
+        with self.queue.foreground():
+            self.queue.submit([(i, f"u{i}", PRIORITY_FIRST) for i in range(5)], (120, 120), "print")
+            self.usage = 0.95
+        self.assertTrue(self.queue.wait_idle(timeout=5))
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(self.queue.stats()["cancelled"], 5)
+        # 压力持续时不再接受新任务
+        self.assertEqual(self.queue.submit([(9, "u9", PRIORITY_FIRST)], (120, 120), "print"), 0)
+
+    def test_disabled(self):
+        """测试线程数为0时禁用预取"""
+        queue = PrefetchQueue(self.load, workers=0)
+        self.assertEqual(queue.submit([(1, "u1", PRIORITY_FIRST)], (120, 120), "print"), 0)
+        self.assertFalse(queue.stats()["enabled"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from PIL import Image, ImageChops, ImageStat
+
+# 导入项目模块
+from render_pool import (ThreadRenderBackend, ProcessRenderBackend, create_render_backend,
+                         decode_thumbnail, compact_mode, normalize_quality)
+
+def make_source(size=(300, 200), fmt="JPEG"):
+    img = Image.new("RGB", size, (240, 230, 220))
+    w, h = size
+    img.paste((10, 10, 10), (w // 6, h // 4, w // 2, h * 3 // 5))
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return out.getvalue()
+
+def make_jpeg(size=(300, 200)):
+    return make_source(size, "JPEG")
+
+class TestRenderPool(unittest.TestCase):
+    """测试缩略图渲染后端"""
+
+    def test_thread_backend(self):
+        """测试线程后端返回目标尺寸的 RGBA 像素缓冲区"""
+        buf = ThreadRenderBackend().render(make_jpeg(), (120, 120))
+        self.assertEqual(buf.mode, "RGBA")
+        self.assertEqual(buf.size, (120, 120))
+        self.assertEqual(buf.nbytes, 120 * 120 * 4)
+
+    def test_process_backend_matches_thread_backend(self):
+        """测试进程池后端与线程后端的结果一致"""
+        content = make_jpeg()
+        backend = ProcessRenderBackend(workers=1)
+        try:
+            buf = backend.render(content, (120, 120))
+            self.assertEqual(backend.stats()["rendered"], 1)
+        finally:
+            backend.shutdown()
+        self.assertEqual(buf.data, ThreadRenderBackend().render(content, (120, 120)).data)
+
+    def test_fast_decode_close_to_direct_resize(self):
+        """测试 draft/reduce 快速解码的结果与直接 LANCZOS 缩放接近"""
+        for fmt in ("JPEG", "PNG"):
+            content = make_source((2400, 1800), fmt)
+            direct = Image.open(io.BytesIO(content)).convert("RGBA").resize((120, 120), Image.LANCZOS)
+            for quality in ("print", "preview"):
+                fast = decode_thumbnail(content, (120, 120), quality)
+                self.assertEqual(fast.size, (120, 120))
+                self.assertEqual(fast.mode, "RGBA")
+                diff = ImageStat.Stat(ImageChops.difference(fast.convert("RGB"), direct.convert("RGB"))).mean
+                self.assertLess(max(diff), 8, f"{fmt}/{quality}")
+
+    def test_small_source_is_upscaled(self):
+        """测试小于目标尺寸的原图直接放大"""
+        self.assertEqual(decode_thumbnail(make_source((60, 40), "PNG"), (120, 120)).size, (120, 120))
+
+    def test_grayscale_source_kept(self):
+        """测试灰度原图解码后仍是 L 模式，不扩展为 RGBA"""
+        out = io.BytesIO()
+        Image.new("L", (300, 200), 200).save(out, format="PNG")
+        self.assertEqual(decode_thumbnail(out.getvalue(), (120, 120)).mode, "L")
+
+    def test_compact_mode(self):
+        """测试按内容选择最小的存储模式"""
+        gray = Image.new("RGBA", (8, 8), (90, 90, 90, 255))
+        self.assertEqual(compact_mode(gray).mode, "L")
+        self.assertEqual(compact_mode(gray).getpixel((0, 0)), 90)
+        self.assertEqual(compact_mode(Image.new("RGBA", (8, 8), (90, 90, 90, 100))).mode, "LA")
+        self.assertEqual(compact_mode(Image.new("RGBA", (8, 8), (90, 60, 90, 255))).mode, "RGB")
+        self.assertEqual(compact_mode(Image.new("RGBA", (8, 8), (90, 60, 90, 100))).mode, "RGBA")
+        near_gray = Image.new("RGB", (8, 8), (90, 92, 88))
+        self.assertEqual(compact_mode(near_gray).mode, "RGB")
+        self.assertEqual(compact_mode(near_gray, tolerance=4).mode, "L")
+
+    def test_normalize_quality(self):
+        """测试质量档位规范化"""
+        self.assertEqual(normalize_quality("Preview"), "preview")
+        self.assertEqual(normalize_quality("print"), "print")
+        self.assertIn(normalize_quality("ultra"), ("preview", "print"))
+        self.assertIn(normalize_quality(None), ("preview", "print"))
+
+    def test_create_backend(self):
+        """测试按名称创建后端，未知名称回退到线程后端"""
+        self.assertEqual(create_render_backend("thread").name, "thread")
+        self.assertEqual(create_render_backend("gpu").name, "thread")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from search_index import IndexSnapshot, iter_bits
+
+class TestIterBits(unittest.TestCase):
+    """测试位图置位遍历"""
+
+    def test_matches_brute_force(self):
+        """测试起始位置和跳过数量与逐位检查一致"""
+        rng = random.Random(7)
+        for _ in range(50):
+            positions = sorted(rng.sample(range(1000), rng.randint(0, 200)))
+            bits = sum(1 << p for p in positions)
+            start = rng.randint(0, 1000)
+            skip = rng.randint(0, 50)
+            expected = [p for p in positions if p >= start][skip:]
+            self.assertEqual(list(iter_bits(bits, start, skip)), expected)
+
+    def test_empty(self):
+        """测试空位图"""
+        self.assertEqual(list(iter_bits(0)), [])
+        self.assertEqual(list(iter_bits(0b1010, start=4)), [])
+
+class TestIndexSnapshot(unittest.TestCase):
+    """测试内存搜索索引与逐行过滤的结果一致"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        rng = random.Random(42)
+        self.rows = []
+        glyph_id = 0
+        for _ in range(3000):
+            glyph_id += rng.randint(1, 3)
+            self.rows.append((glyph_id, rng.choice("之不人永和天地玄黄"), rng.choice([1, 2, 3, None]),
+                              rng.randint(1, 20), rng.randint(1, 40)))
+        self.index = IndexSnapshot(self.rows, version="v1")
+
+    def brute_force(self, hans=None, font_id=None, author_id=None, book_id=None):
+        return [r[0] for r in self.rows
+                if (not hans or r[1] in hans)
+                and (font_id is None or r[2] == font_id)
+                and (author_id is None or r[3] == author_id)
+                and (book_id is None or r[4] == book_id)]
+
+    def test_filters_and_totals(self):
+        """测试各种条件组合的结果和总数"""
+        cases = [
+            {},
+            {"hans": ["之"]},
+            {"hans": ["之", "永", "之"]},
+            {"font_id": 2},
+            {"author_id": 5, "book_id": 7},
+            {"hans": ["天", "地"], "font_id": 1, "author_id": 3},
+            {"font_id": -1},
+            {"hans": ["龘"]},
+        ]
+        for filters in cases:
+            expected = self.brute_force(**filters)
+            rows, total = self.index.query(**filters)
+            self.assertEqual(total, len(expected), filters)
+            self.assertEqual([r["id"] for r in rows], expected, filters)
+
+    def test_offset_and_cursor_pages(self):
+        """测试偏移分页和游标分页"""
+        for filters in ({}, {"author_id": 4}, {"hans": ["玄", "黄"], "font_id": 3}):
+            expected = self.brute_force(**filters)
+            rows, _ = self.index.query(**filters, offset=37, limit=25)
+            self.assertEqual([r["id"] for r in rows], expected[37:62])
+
+            collected = []
+            after_id = None
+            while True:
+                rows, total = self.index.query(**filters, limit=50, after_id=after_id)
+                if not rows:
+                    break
+                collected.extend(r["id"] for r in rows)
+                after_id = rows[-1]["id"]
+            self.assertEqual(collected, expected)
+            self.assertEqual(total, len(expected))
+
+    def test_facet_counts(self):
+        """测试分面计数与逐行统计一致"""
+        cases = [{}, {"author_id": 5}, {"font_id": 1, "book_id": 3}, {"hans": ["之", "人"], "author_id": 2}]
+        for filters in cases:
+            counts = self.index.facet_counts(**filters)
+            for name, column in (("font", 2), ("author", 3), ("book", 4)):
+                others = dict(filters)
+                others.pop(f"{name}_id", None)
+                ids = set(self.brute_force(**others))
+                expected = Counter(r[column] for r in self.rows if r[0] in ids and r[column] is not None)
+                self.assertEqual(counts[name], dict(expected), (filters, name))
+
+    def test_sparse_values_stored_as_arrays(self):
+        """测试稀疏的取值存为行号数组，稠密的取值存为位图"""
+        self.assertTrue(all(isinstance(bits, int) for bits in self.index.by_font.values()))
+        self.assertFalse(any(isinstance(positions, int) for positions in self.index.by_book.values()))
+        rows, total = self.index.query(font_id=1, book_id=3)
+        self.assertEqual(total, len(self.brute_force(font_id=1, book_id=3)))
+        # 行号数组每行 4 字节，不随取值数量增长；每个取值一个位图则需要 40 * 3000 / 8 字节
+        self.assertEqual(sum(len(p) * 4 for p in self.index.by_book.values()), 4 * 3000)
+        self.assertGreater(self.index.nbytes(), 0)
+
+    def test_row_values(self):
+        """测试返回的行与原始数据一致，缺失的维度为 None"""
+        rows, _ = self.index.query(limit=len(self.rows))
+        self.assertEqual([tuple(r.values()) for r in rows], self.rows)
+
+if __name__ == '__main__':
+    unittest.main()
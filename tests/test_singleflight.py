@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from singleflight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    """测试并发调用合并"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.flight = SingleFlight()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def slow(self, value):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.1)
+        return value * 2
+
+    def run_concurrently(self, count, target):
+        results = [None] * count
+        errors = [None] * count
+
+        def worker(i):
+            try:
+                results[i] = target()
+            except Exception as e:
+                errors[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_calls_are_coalesced(self):
+        """测试同一个键的并发调用只执行一次"""
+        results, errors = self.run_concurrently(8, lambda: self.flight.do("k", self.slow, 21))
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(self.calls, 1)
+        stats = self.flight.stats()
+        self.assertEqual(stats["executed"], 1)
+        self.assertEqual(stats["coalesced"], 7)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_different_keys_run_separately(self):
+        """测试不同的键互不合并"""
+        self.run_concurrently(4, lambda: self.flight.do(threading.get_ident(), self.slow, 1))
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(self.flight.stats()["coalesced"], 0)
+
+    def test_sequential_calls_execute_again(self):
+        """测试调用完成后不保留结果"""
+        self.flight.do("k", self.slow, 1)
+        self.flight.do("k", self.slow, 1)
+        self.assertEqual(self.calls, 2)
+
+    def test_error_is_shared(self):
+        """测试执行者的异常会抛给所有等待者"""
+        def fail():
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        results, errors = self.run_concurrently(3, lambda: self.flight.do("k", fail))
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(self.flight.in_flight(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from thumb_cache import TieredThumbnailCache, MemoryThumbnailCache, PixelBuffer, thumbnail_key
+
+def make_buffer(color, size=(10, 10)):
+    return PixelBuffer.from_image(Image.new("RGBA", size, color))
+
+def cache_key(img_id):
+    return thumbnail_key(img_id, (10, 10), "")
+
+class TestMemoryThumbnailCache(unittest.TestCase):
+    """测试按字节数限制的内存缓存"""
+
+    def test_evicts_by_bytes(self):
+        """测试超过字节上限时淘汰最久未使用的条目"""
+        cache = MemoryThumbnailCache(max_bytes=1000)  # 每个10x10 RGBA缓冲区400字节
+        cache.put("a", make_buffer((1, 0, 0, 255)))
+        cache.put("b", make_buffer((2, 0, 0, 255)))
+        cache.get("a")
+        cache.put("c", make_buffer((3, 0, 0, 255)))
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.current_bytes, 800)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_oversized_item_skipped(self):
+        """测试超过上限的单个条目不会进入缓存"""
+        cache = MemoryThumbnailCache(max_bytes=100)
+        cache.put("a", make_buffer((1, 0, 0, 255)))
+        self.assertEqual(cache.size(), 0)
+
+    def test_unused_prefetch_bytes(self):
+        """测试预取的条目在第一次正常读取前计为未使用，淘汰时单独计数"""
+        cache = MemoryThumbnailCache(max_bytes=1000)
+        cache.put("a", make_buffer((1, 0, 0, 255)), speculative=True)
+        cache.put("b", make_buffer((2, 0, 0, 255)), speculative=True)
+        self.assertEqual(cache.unused_bytes, 800)
+        self.assertIsNotNone(cache.get("a", speculative=True))
+        self.assertEqual(cache.unused_bytes, 800)
+        cache.get("a")
+        self.assertEqual(cache.unused_bytes, 400)
+        self.assertAlmostEqual(cache.unused_ratio(), 0.4)
+
+        cache.put("c", make_buffer((3, 0, 0, 255)))
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.unused_bytes, 0)
+        self.assertEqual(cache.unused_evictions, 1)
+
+class TestTieredThumbnailCache(unittest.TestCase):
+    """测试分层缩略图缓存"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_key_includes_size(self):
+        """测试不同尺寸不会互相命中"""
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        cache.put(1, (10, 10), make_buffer((0, 0, 0, 255)))
+        self.assertIsNotNone(cache.get(1, (10, 10)))
+        self.assertIsNone(cache.get(1, (20, 20)))
+        self.assertIsNone(cache.get(1, (10, 10), "preview"))
+
+    def test_disk_survives_restart(self):
+        """测试新的缓存实例可以从磁盘层读取"""
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        cache.put(7, (10, 10), make_buffer((5, 6, 7, 255)))
+
+        restarted = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        buf = restarted.get(7, (10, 10))
+        self.assertIsNotNone(buf)
+        self.assertEqual(buf.to_image().getpixel((0, 0)), (5, 6, 7, 255))
+        self.assertEqual(restarted.disk.hits, 1)
+        # 读取后提升到内存层
+        self.assertIsNotNone(restarted.get(7, (10, 10)))
+        self.assertEqual(restarted.memory.hits, 1)
+
+    def test_identical_content_stored_once(self):
+        """测试相同内容的缩略图只存一份"""
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        cache.put(1, (10, 10), make_buffer((0, 0, 0, 255)))
+        cache.put(2, (10, 10), make_buffer((0, 0, 0, 255)))
+        objects = []
+        for _, _, files in os.walk(os.path.join(self.tmp_dir, "objects")):
+            objects.extend(files)
+        self.assertEqual(len(objects), 1)
+
+    def disk_object_size(self):
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=os.path.join(self.tmp_dir, "probe"))
+        cache.put(1, (10, 10), make_buffer((0, 0, 0, 255)))
+        return cache.stats()["disk_bytes"]
+
+    def test_disk_evicts_by_bytes(self):
+        """测试磁盘层超过字节上限时淘汰最久未使用的缩略图，失效的引用在查找时删除"""
+        size = self.disk_object_size()
+        disk_dir = os.path.join(self.tmp_dir, "thumbs")
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=disk_dir, disk_bytes=size * 2 + size // 2)
+        cache.put(1, (10, 10), make_buffer((1, 0, 0, 255)))
+        cache.put(2, (10, 10), make_buffer((2, 0, 0, 255)))
+        self.assertIsNotNone(cache.disk.get(cache_key(1)))
+        cache.put(3, (10, 10), make_buffer((3, 0, 0, 255)))
+
+        stats = cache.stats()
+        self.assertEqual(stats["disk_items"], 2)
+        self.assertLessEqual(stats["disk_bytes"], stats["disk_max_bytes"])
+        self.assertEqual(stats["disk_evictions"], 1)
+        self.assertIsNone(cache.disk.get(cache_key(2)))
+        self.assertFalse(os.path.exists(cache.disk._ref_path(cache_key(2))))
+        self.assertIsNotNone(cache.disk.get(cache_key(1)))
+
+        # 重启后按上限继续计算
+        restarted = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=disk_dir, disk_bytes=size)
+        self.assertEqual(restarted.stats()["disk_items"], 1)
+
+    def test_legacy_objects_migrated(self):
+        """测试旧版本的 <摘要>.png 对象仍可读取并计入上限"""
+        cache = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        digest = cache.disk.put(cache_key(5), make_buffer((5, 5, 5, 255)))
+        entry = cache.disk.objects.get(digest)
+        os.replace(entry.path, os.path.join(os.path.dirname(entry.path), digest + ".png"))
+
+        restarted = TieredThumbnailCache(memory_bytes=1024 * 1024, disk_dir=self.tmp_dir)
+        self.assertEqual(restarted.stats()["disk_items"], 1)
+        self.assertEqual(restarted.get(5, (10, 10)).to_image().getpixel((0, 0)), (5, 5, 5, 255))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 导入项目模块
+from thumb_cache import PixelBuffer
+from thumb_store import ThumbStore, ThumbStoreWriter, INDEX_FILE, PACK_FILE
+from tools.build_thumbs import build_store, load_checkpoint
+from tests.sample_db import create_sample_db
+from tests.stub_server import StubImageServer
+
+def make_buffer(value, size=(4, 4)):
+    return PixelBuffer("RGBA", size, bytes([value]) * (size[0] * size[1] * 4))
+
+class TestThumbStore(unittest.TestCase):
+    """测试预生成的缩略图存储"""
+
+    def setUp(self):
+        """测试前的准备工作"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.tmp_dir, 'store')
+
+    def tearDown(self):
+        """测试后的清理工作"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_write_and_read(self):
+        """测试写入后可以按图片ID和尺寸读取"""
+        writer = ThumbStoreWriter(self.store_dir)
+        writer.add(1, make_buffer(10))
+        writer.add(1, make_buffer(20, (2, 2)))
+        writer.add(2, make_buffer(30))
+        writer.close()
+
+        store = ThumbStore(self.store_dir)
+        self.assertEqual(store.size(), 3)
+        self.assertEqual(store.get(1, (4, 4)).data, bytes([10]) * 64)
+        self.assertEqual(store.get(1, (2, 2)).data, bytes([20]) * 16)
+        self.assertIsNone(store.get(3, (4, 4)))
+        self.assertEqual(store.get(2, (4, 4)).to_image().size, (4, 4))
+
+    def test_reader_picks_up_new_records(self):
+        """测试读取端可以加载构建过程中新增的记录"""
+        writer = ThumbStoreWriter(self.store_dir)
+        writer.add(1, make_buffer(1))
+        writer.flush()
+        store = ThumbStore(self.store_dir, check_interval=0)
+        writer.add(2, make_buffer(2))
+        writer.close()
+        self.assertEqual(store.get(2, (4, 4)).data, bytes([2]) * 64)
+
+    def test_recovers_from_torn_tail(self):
+        """测试中断留下的不完整尾部会被丢弃"""
+        writer = ThumbStoreWriter(self.store_dir)
+        writer.add(1, make_buffer(1))
+        writer.add(2, make_buffer(2))
+        writer.close()
+        # 模拟像素数据只写了一半、索引多出半条记录
+        with open(os.path.join(self.store_dir, PACK_FILE), "r+b") as f:
+            f.truncate(64 + 10)
+        with open(os.path.join(self.store_dir, INDEX_FILE), "ab") as f:
+            f.write(b"\x00" * 7)
+
+        writer = ThumbStoreWriter(self.store_dir)
+        self.assertTrue(writer.contains(1, (4, 4)))
+        self.assertFalse(writer.contains(2, (4, 4)))
+        writer.add(2, make_buffer(5))
+        writer.close()
+        store = ThumbStore(self.store_dir)
+        self.assertEqual(store.get(2, (4, 4)).data, bytes([5]) * 64)
+        self.assertEqual(os.path.getsize(os.path.join(self.store_dir, PACK_FILE)), 128)
+
+    def test_contains_reads_index_on_disk(self):
+        """测试乱序追加的记录分段保存，重新打开后仍能在磁盘索引上查到"""
+        writer = ThumbStoreWriter(self.store_dir)
+        for img_id in range(1, 6):
+            writer.add(img_id, make_buffer(img_id))
+        # 重试或追加尺寸时写入的旧图片ID
+        writer.add(2, make_buffer(9, (2, 2)))
+        self.assertTrue(writer.contains(2, (2, 2)))
+        writer.close()
+
+        writer = ThumbStoreWriter(self.store_dir)
+        self.assertEqual(writer._runs, [[0, 5], [5, 6]])
+        for img_id in range(1, 6):
+            self.assertTrue(writer.contains(img_id, (4, 4)))
+        self.assertTrue(writer.contains(2, (2, 2)))
+        self.assertFalse(writer.contains(1, (2, 2)))
+        self.assertFalse(writer.contains(6, (4, 4)))
+        writer.close()
+
+    def test_disabled(self):
+        """测试目录为空字符串时禁用"""
+        self.assertIsNone(ThumbStore("").get(1, (4, 4)))
+
+    def test_build_store_resumes(self):
+        """测试构建工具写入各个尺寸，并从检查点继续"""
+        server = StubImageServer().start()
+        try:
+            db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'), server.url('img'))
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE images SET url = ? WHERE id = 3", (server.url('missing/3.png'),))
+            conn.commit()
+            conn.close()
+
+            first = build_store(db_path, self.store_dir, sizes=[30, 60], workers=2, batch_size=4, limit=4)
+            self.assertEqual(first["processed"], 4)
+            self.assertEqual(first["failed"], 1)
+            self.assertEqual(load_checkpoint(self.store_dir)["last_id"], 4)
+
+            second = build_store(db_path, self.store_dir, sizes=[30, 60], workers=2, batch_size=4)
+            self.assertEqual(second["processed"], 5)
+            self.assertEqual(server.requests, 9)
+            self.assertEqual(load_checkpoint(self.store_dir)["failed_ids"], [3])
+        finally:
+            server.stop()
+
+        store = ThumbStore(self.store_dir)
+        self.assertEqual(store.size(), 16)
+        self.assertEqual(store.get(1, (60, 60)).size, (60, 60))
+        self.assertIsNone(store.get(3, (60, 60)))
+        # 示例图片是灰度的，按 L 模式每像素 1 字节存储
+        self.assertEqual(store.get(1, (60, 60)).mode, "L")
+        self.assertEqual(store.stats()["pack_bytes"], 8 * (30 * 30 + 60 * 60))
+
+    def test_build_store_retry_failed(self):
+        """测试 --retry-failed 只重试失败的图片，不改变检查点的位置"""
+        server = StubImageServer().start()
+        try:
+            db_path = create_sample_db(os.path.join(self.tmp_dir, 'shufadb.db'), server.url('img'))
+            conn = sqlite3.connect(db_path)
+            conn.execute("UPDATE images SET url = ? WHERE id = 3", (server.url('missing/3.png'),))
+            conn.commit()
+            first = build_store(db_path, self.store_dir, sizes=[30], workers=2, batch_size=4)
+            self.assertEqual(load_checkpoint(self.store_dir)["failed_ids"], [3])
+
+            # 普通的再次运行从检查点继续，不重试失败的图片
+            self.assertEqual(build_store(db_path, self.store_dir, sizes=[30])["processed"], 0)
+
+            conn.execute("UPDATE images SET url = ? WHERE id = 3", (server.url('img/3.png'),))
+            conn.commit()
+            conn.close()
+            requests = server.requests
+            retry = build_store(db_path, self.store_dir, sizes=[30], workers=2, batch_size=4, retry_failed=True)
+            self.assertEqual(server.requests, requests + 1)
+        finally:
+            server.stop()
+
+        self.assertEqual((retry["processed"], retry["written"], retry["failed_ids"]), (1, 1, 0))
+        checkpoint = load_checkpoint(self.store_dir)
+        self.assertEqual(checkpoint["failed_ids"], [])
+        self.assertEqual(checkpoint["last_id"], first["last_id"])
+        self.assertEqual(ThumbStore(self.store_dir).get(3, (30, 30)).size, (30, 30))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+"""
+分层缩略图缓存
+
+导出集字图片时需要把每个字的原图缩放到统一尺寸。这个模块缓存缩放后的结果，分两层：
+
+- 内存层：按字节数限制大小的 LRU，存放紧凑的像素缓冲区（模式、尺寸、原始字节），
+  不保存 PIL 对象
+- 磁盘层：内容寻址的缩略图存储，PNG 文件按内容的 SHA-256 命名，
+  另有一层引用文件把 (图片ID, 尺寸) 映射到内容摘要，相同内容只存一份；
+  与导出缓存一样按字节数限制大小，超出时淘汰最久未使用的文件
+
+缓存键包含目标尺寸和渲染变体（质量档位），不同尺寸、不同档位互不干扰。进程重启后磁盘层仍然有效，
+之前导出过的图片不需要重新下载。
+
+后台预取写入的条目标记为“预取”（speculative），第一次被正常读取后才算使用过。
+内存层统计预取后尚未使用的字节数，预取队列据此判断是否在挤占正在使用的缩略图；
+缓存装满本身不代表压力（LRU 正常运行时使用率总是接近 1）。
+
+环境变量：
+    MOTU_THUMB_CACHE_DIR: 磁盘缓存目录（默认 cache/thumbs，设为空字符串则禁用磁盘层）
+    MOTU_THUMB_CACHE_MB: 内存层大小上限，单位 MB（默认 64）
+    MOTU_THUMB_DISK_CACHE_MB: 磁盘层大小上限，单位 MB（默认 1024）
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from export_cache import ExportCache
+from logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "thumbs")
+DEFAULT_MEMORY_MB = 64
+DEFAULT_DISK_MB = 1024
+
+
+class PixelBuffer:
+    """紧凑的像素缓冲区，可以在线程、进程之间传递，不依赖 PIL 对象"""
+
+    __slots__ = ("mode", "size", "data")
+
+    def __init__(self, mode, size, data):
+        self.mode = mode
+        self.size = tuple(size)
+        self.data = data
+
+    @classmethod
+    def from_image(cls, img):
+        return cls(img.mode, img.size, img.tobytes())
+
+    def to_image(self):
+        return Image.frombytes(self.mode, self.size, self.data)
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+
+def thumbnail_key(img_id, target_size, variant=""):
+    """缓存键：图片ID + 目标尺寸 + 渲染变体（如质量档位）"""
+    key = f"{img_id}:{target_size[0]}x{target_size[1]}"
+    return f"{key}:{variant}" if variant else key
+
+
+class MemoryThumbnailCache:
+    """按字节数限制大小的 LRU 缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 预取后尚未被正常读取过的条目
+        self._unused = set()
+        self.unused_bytes = 0
+        self.unused_evictions = 0
+
+    def _discard_unused(self, key, buf):
+        # 调用时已持有 self._lock
+        if key in self._unused:
+            self._unused.discard(key)
+            self.unused_bytes -= buf.nbytes
+            return True
+        return False
+
+    def get(self, key, speculative=False):
+        """查找条目；speculative 为 True 时是预取的检查，不算作使用，也不刷新 LRU 顺序"""
+        with self._lock:
+            buf = self._items.get(key)
+            if buf is None:
+                self.misses += 1
+                return None
+            if not speculative:
+                self._items.move_to_end(key)
+                self._discard_unused(key, buf)
+                self.hits += 1
+            return buf
+
+    def put(self, key, buf, speculative=False):
+        if buf.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+                self._discard_unused(key, old)
+            self._items[key] = buf
+            self.current_bytes += buf.nbytes
+            if speculative:
+                self._unused.add(key)
+                self.unused_bytes += buf.nbytes
+            while self.current_bytes > self.max_bytes:
+                evicted_key, evicted = self._items.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+                if self._discard_unused(evicted_key, evicted):
+                    self.unused_evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+            self._unused.clear()
+            self.unused_bytes = 0
+
+    def size(self):
+        return len(self._items)
+
+    def usage(self):
+        """内存层使用率（0~1）"""
+        return self.current_bytes / self.max_bytes if self.max_bytes else 1.0
+
+    def unused_ratio(self):
+        """预取后尚未使用的条目占内存层上限的比例（0~1），用作预取的压力信号"""
+        return self.unused_bytes / self.max_bytes if self.max_bytes else 1.0
+
+
+class DiskThumbnailStore:
+    """内容寻址的磁盘缩略图存储
+
+    目录结构：
+        objects/ab/abcdef....<ETag>.png   以PNG内容的SHA-256命名，由 ExportCache 按字节数做LRU淘汰
+        refs/12/1234....                  内容为对应的SHA-256，文件名是缓存键的哈希
+
+    引用文件只有几十字节，不计入上限；指向的内容被淘汰后，下次查找时删除。
+    """
+
+    def __init__(self, root, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('MOTU_THUMB_DISK_CACHE_MB', DEFAULT_DISK_MB)) * 1024 * 1024
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_dir = os.path.join(root, "refs")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+        self._migrate_objects()
+        self.objects = ExportCache(self.objects_dir, max_bytes)
+        if not self.objects.enabled:
+            raise OSError(f"无法使用缩略图对象目录 {self.objects_dir}")
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _migrate_objects(self):
+        """把旧版本的 <摘要>.png 重命名为 <摘要>.<ETag>.png，纳入字节数限制
+
+        ETag 是内容 SHA-256 的前 32 位，正好是摘要的前缀，不需要读取文件。
+        """
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                parts = filename.split(".")
+                if len(parts) == 2 and parts[1] == "png":
+                    digest = parts[0]
+                    try:
+                        os.replace(os.path.join(dirpath, filename),
+                                   os.path.join(dirpath, f"{digest}.{digest[:32]}.png"))
+                    except OSError:
+                        pass
+
+    def _ref_path(self, key):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.refs_dir, name[:2], name)
+
+    @staticmethod
+    def _atomic_write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key):
+        ref_path = self._ref_path(key)
+        try:
+            with open(ref_path, "r", encoding="ascii") as f:
+                digest = f.read().strip()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        entry = self.objects.get(digest)
+        if entry is None:
+            # 内容已被淘汰，引用随之失效
+            try:
+                os.remove(ref_path)
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        try:
+            with Image.open(entry.path) as img:
+                img.load()
+                buf = PixelBuffer.from_image(img)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return buf
+
+    def put(self, key, buf):
+        out = io.BytesIO()
+        buf.to_image().save(out, format="PNG")
+        data = out.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        # 相同内容已存在时只更新它在LRU中的位置
+        if self.objects.get(digest) is None and self.objects.put(digest, data, "png") is None:
+            raise OSError(f"缩略图对象 {digest} 写入失败")
+        self._atomic_write(self._ref_path(key), digest.encode("ascii"))
+        self.writes += 1
+        return digest
+
+    def stats(self):
+        objects = self.objects.stats()
+        return {
+            "disk_dir": self.root,
+            "disk_hits": self.hits,
+            "disk_misses": self.misses,
+            "disk_writes": self.writes,
+            "disk_items": objects["items"],
+            "disk_bytes": objects["bytes"],
+            "disk_max_bytes": objects["max_bytes"],
+            "disk_evictions": objects["evictions"],
+        }
+
+
+class TieredThumbnailCache:
+    """内存层 + 磁盘层的缩略图缓存"""
+
+    def __init__(self, memory_bytes=None, disk_dir=None, disk_bytes=None):
+        if memory_bytes is None:
+            memory_bytes = int(os.environ.get('MOTU_THUMB_CACHE_MB', DEFAULT_MEMORY_MB)) * 1024 * 1024
+        if disk_dir is None:
+            disk_dir = os.environ.get('MOTU_THUMB_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.memory = MemoryThumbnailCache(memory_bytes)
+        self.disk = None
+        if disk_dir:
+            try:
+                self.disk = DiskThumbnailStore(disk_dir, disk_bytes)
+            except OSError as e:
+                logger.warning(f"无法创建缩略图磁盘缓存目录 {disk_dir}: {e}，只使用内存缓存")
+
+    def get(self, img_id, target_size, variant="", speculative=False):
+        """查找缩略图，返回 PixelBuffer 或 None；speculative 表示预取的检查，不算作使用"""
+        key = thumbnail_key(img_id, target_size, variant)
+        buf = self.memory.get(key, speculative)
+        if buf is not None:
+            return buf
+        if self.disk is not None:
+            buf = self.disk.get(key)
+            if buf is not None:
+                # 提升到内存层
+                self.memory.put(key, buf, speculative)
+                return buf
+        return None
+
+    def put(self, img_id, target_size, buf, variant="", speculative=False):
+        key = thumbnail_key(img_id, target_size, variant)
+        self.memory.put(key, buf, speculative)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, buf)
+            except OSError as e:
+                logger.warning(f"写入缩略图磁盘缓存失败: {key}, 错误: {e}")
+
+    def stats(self):
+        result = {
+            "memory_items": self.memory.size(),
+            "memory_bytes": self.memory.current_bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "memory_hits": self.memory.hits,
+            "memory_misses": self.memory.misses,
+            "memory_evictions": self.memory.evictions,
+            "memory_unused_prefetch_bytes": self.memory.unused_bytes,
+            "memory_unused_prefetch_evictions": self.memory.unused_evictions,
+            "disk_enabled": self.disk is not None,
+        }
+        if self.disk is not None:
+            result.update(self.disk.stats())
+        return result
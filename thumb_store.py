@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+"""
+预生成的缩略图存储
+
+由 tools/build_thumbs.py 离线遍历 images 表，把每张图片缩放为若干尺寸（默认 120）
+后写入这个存储，灰度图片按 L/LA 模式保存。导出时直接从内存映射的文件中读取像素，不需要访问源站，也不需要解码。
+
+存储目录结构：
+    thumbs.pack   所有缩略图的原始像素字节，顺序追加
+    thumbs.idx    定长索引记录，每条对应 pack 中的一段：
+                  图片ID(u64) 宽(u16) 高(u16) 模式(u8) 填充(3) 偏移(u64) 长度(u32)
+
+写入时先追加像素再追加索引记录，进程中断后重新打开时会丢弃不完整的尾部，
+因此可以在应用运行期间增量构建：读取端会定期检查索引文件是否变长并加载新记录。
+
+环境变量：
+    MOTU_THUMB_STORE_DIR: 存储目录（默认 cache/thumbstore，设为空字符串则禁用）
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+from logger import get_logger
+from thumb_cache import PixelBuffer
+
+logger = get_logger()
+
+DEFAULT_STORE_DIR = os.path.join("cache", "thumbstore")
+PACK_FILE = "thumbs.pack"
+INDEX_FILE = "thumbs.idx"
+RECORD = struct.Struct("<QHHB3xQI")
+MODES = {1: "RGBA", 2: "RGB", 3: "LA", 4: "L"}
+MODE_CODES = {mode: code for code, mode in MODES.items()}
+# 两次检查索引文件是否增长的最小间隔（秒）
+DEFAULT_CHECK_INTERVAL = 5.0
+
+
+def _read_records(index_path, start=0):
+    """从索引文件的 start 字节处读取完整的记录，返回 (记录列表, 读到的位置)"""
+    try:
+        with open(index_path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+    except OSError:
+        return [], start
+    usable = len(data) - len(data) % RECORD.size
+    return list(RECORD.iter_unpack(data[:usable])), start + usable
+
+
+class ThumbStoreWriter:
+    """追加写入缩略图，由构建工具单线程使用
+
+    已有的键不放在内存中：索引文件由若干段按 (图片ID, 宽, 高) 递增的记录组成
+    （按ID顺序构建时只有一段，重试或追加尺寸时各新增一段），contains() 在每段上
+    对磁盘上的索引做二分查找，内存中只记录各段的起止位置。
+    """
+
+    # 恢复时每次读取的记录数
+    SCAN_RECORDS = 65536
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.pack_path = os.path.join(root, PACK_FILE)
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._runs = []  # [[起始记录号, 结束记录号], ...]，每段内的键严格递增
+        self._last_key = None
+        self._count = 0
+        self._pending = set()  # 已写入但尚未落盘的键
+        self._recover()
+        self._flushed = self._count
+        self._pack = open(self.pack_path, "ab")
+        self._index = open(self.index_path, "ab")
+        self._reader = open(self.index_path, "rb", buffering=0)
+        self.written = 0
+
+    def _recover(self):
+        """丢弃上次中断留下的不完整尾部，同时找出索引中的递增段"""
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        end = 0
+        complete = True
+        if index_size >= RECORD.size:
+            with open(self.index_path, "rb") as f:
+                while complete:
+                    data = f.read(RECORD.size * self.SCAN_RECORDS)
+                    usable = len(data) - len(data) % RECORD.size
+                    if not usable:
+                        break
+                    for img_id, w, h, _, offset, length in RECORD.iter_unpack(data[:usable]):
+                        if offset + length > pack_size:
+                            complete = False
+                            break
+                        self._append_key((img_id, w, h))
+                        end = max(end, offset + length)
+        valid_size = self._count * RECORD.size
+        if os.path.exists(self.index_path) and index_size != valid_size:
+            with open(self.index_path, "r+b") as f:
+                f.truncate(valid_size)
+        if os.path.exists(self.pack_path) and pack_size != end:
+            with open(self.pack_path, "r+b") as f:
+                f.truncate(end)
+        if index_size != valid_size:
+            logger.warning(f"缩略图存储尾部不完整，已截断到 {self._count} 条记录")
+
+    def _append_key(self, key):
+        if self._runs and key > self._last_key:
+            self._runs[-1][1] += 1
+        else:
+            self._runs.append([self._count, self._count + 1])
+        self._last_key = key
+        self._count += 1
+
+    def _key_at(self, position):
+        self._reader.seek(position * RECORD.size)
+        img_id, w, h, _, _, _ = RECORD.unpack(self._reader.read(RECORD.size))
+        return img_id, w, h
+
+    def contains(self, img_id, size):
+        key = (img_id, size[0], size[1])
+        if key in self._pending:
+            return True
+        for start, end in reversed(self._runs):
+            lo, hi = start, min(end, self._flushed)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                found = self._key_at(mid)
+                if found == key:
+                    return True
+                if found < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return False
+
+    def add(self, img_id, buf):
+        """追加一张缩略图"""
+        w, h = buf.size
+        offset = self._pack.tell()
+        self._pack.write(buf.data)
+        self._index.write(RECORD.pack(img_id, w, h, MODE_CODES[buf.mode], offset, len(buf.data)))
+        self._append_key((img_id, w, h))
+        self._pending.add((img_id, w, h))
+        self.written += 1
+
+    def flush(self):
+        """把已写入的数据落盘：先像素再索引，保证索引指向的数据完整"""
+        self._pack.flush()
+        os.fsync(self._pack.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._flushed = self._count
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._pack.close()
+        self._index.close()
+        self._reader.close()
+
+
+class ThumbStore:
+    """只读的缩略图存储，像素通过内存映射读取"""
+
+    def __init__(self, root=None, check_interval=DEFAULT_CHECK_INTERVAL):
+        if root is None:
+            root = os.environ.get('MOTU_THUMB_STORE_DIR', DEFAULT_STORE_DIR)
+        self.root = root or None
+        self.check_interval = check_interval
+        self._entries = {}
+        self._index_pos = 0
+        self._mmap = None
+        self._mapped_size = 0
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.root:
+            self.refresh()
+
+    @property
+    def enabled(self):
+        return self.root is not None
+
+    def refresh(self):
+        """加载索引文件中新增的记录，pack 文件变大时重新映射"""
+        if not self.root:
+            return
+        with self._lock:
+            self._last_check = time.monotonic()
+            pack_path = os.path.join(self.root, PACK_FILE)
+            try:
+                pack_size = os.path.getsize(pack_path)
+            except OSError:
+                return
+            start = self._index_pos
+            records, _ = _read_records(os.path.join(self.root, INDEX_FILE), start)
+            if pack_size > self._mapped_size:
+                with open(pack_path, "rb") as f:
+                    # 旧的映射可能仍被其他线程引用，交给垃圾回收关闭
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapped_size = pack_size
+            loaded = 0
+            for img_id, w, h, mode, offset, length in records:
+                if offset + length > self._mapped_size:
+                    # 像素数据还没有落盘，下次再加载
+                    break
+                self._entries[(img_id, w, h)] = (MODES[mode], offset, length)
+                loaded += 1
+            self._index_pos = start + loaded * RECORD.size
+            if loaded:
+                logger.info(f"缩略图存储已加载 {loaded} 条新记录，共 {len(self._entries)} 条")
+
+    def get(self, img_id, size):
+        """读取缩略图，返回 PixelBuffer 或 None"""
+        if not self.root:
+            return None
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh()
+        entry = self._entries.get((img_id, size[0], size[1]))
+        mm = self._mmap
+        if entry is None or mm is None:
+            self.misses += 1
+            return None
+        mode, offset, length = entry
+        self.hits += 1
+        return PixelBuffer(mode, size, mm[offset:offset + length])
+
+    def size(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "dir": self.root,
+            "items": len(self._entries),
+            "pack_bytes": self._mapped_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库模式基准测试
+
+分别以磁盘模式和内存模式（MOTU_DB_IN_MEMORY）的连接池运行应用，用 Flask 测试客户端
+发出随机的 /api/search 和 /api/generate_calligraphy 请求，比较两种模式的 p50/p99 延迟，
+并报告内存副本的大小。
+
+不指定 --db 时生成一个合成数据库；搜索总数缓存在每次请求前清空，内存搜索索引和
+后台预取保持关闭，测得的是数据库查询本身的差别。
+
+使用方法：
+    python tools/bench_db.py
+    python tools/bench_db.py --glyphs 200000 --requests 500 --threads 4
+    python tools/bench_db.py --db data/shufadb.db
+"""
+
+import argparse
+import concurrent.futures
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import app_new
+from db_pool import ConnectionPool
+from prefetch import PrefetchQueue
+from search_index import GlyphSearchIndex
+from tests.sample_db import SCHEMA, INDEXES
+
+# 合成数据库使用的常用字
+COMMON_CHARS = "之不人永和天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏闰余成岁律吕调阳云腾致雨露结为霜"
+
+
+def make_database(path, glyph_count, seed=42):
+    """生成合成数据库：每个字形一张图片，维度取值分布与真实字库相近"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO fonts (name) VALUES (?)", [(f"字体{i}",) for i in range(1, 6)])
+    conn.executemany("INSERT INTO authors (name) VALUES (?)", [(f"书法家{i}",) for i in range(1, 301)])
+    conn.executemany("INSERT INTO books (title) VALUES (?)", [(f"典籍{i}",) for i in range(1, 1001)])
+    chars = COMMON_CHARS + "".join(chr(0x4E00 + i) for i in range(3000))
+    # 生产库的 (han, font_id, author_id, book_id) 有唯一索引，重复的组合只保留一个
+    combos = {}
+    while len(combos) < glyph_count:
+        combo = (rng.choice(chars), rng.randint(1, 5), rng.randint(1, 300), rng.randint(1, 1000))
+        combos.setdefault(combo, len(combos) + 1)
+    conn.executemany(
+        "INSERT INTO glyphs (id, han, font_id, author_id, book_id) VALUES (?, ?, ?, ?, ?)",
+        ((i, *combo) for combo, i in combos.items()))
+    conn.executemany(
+        "INSERT INTO images (glyph_id, url) VALUES (?, ?)",
+        ((i, f"http://example.invalid/img/{i}.png") for i in range(1, glyph_count + 1)))
+    conn.executescript(INDEXES)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def make_requests(count, seed):
+    """生成随机的搜索和集字请求URL"""
+    rng = random.Random(seed)
+    search, generate = [], []
+    for _ in range(count):
+        params = [f"han={rng.choice(COMMON_CHARS)}"]
+        if rng.random() < 0.5:
+            params.append(f"author=书法家{rng.randint(1, 300)}")
+        if rng.random() < 0.3:
+            params.append(f"font=字体{rng.randint(1, 5)}")
+        params.append(f"page={rng.randint(1, 3)}")
+        search.append("/api/search?" + "&".join(params))
+        text = "".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(4, 20)))
+        generate.append(f"/api/generate_calligraphy?text={text}")
+    return search, generate
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def run(urls, threads):
+    """并发发出请求，返回每个请求的耗时（毫秒）"""
+    def fetch(chunk):
+        client = app_new.app.test_client()
+        timings = []
+        for url in chunk:
+            app_new.search_count_cache.clear()
+            start = time.perf_counter()
+            resp = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{url} 返回 {resp.status_code}")
+        return timings
+
+    chunks = [urls[i::threads] for i in range(threads)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        return [t for timings in pool.map(fetch, chunks) for t in timings]
+
+
+def bench_mode(db_path, in_memory, search_urls, generate_urls, threads):
+    """以指定模式替换应用的连接池，返回 (结果, 内存副本信息)"""
+    pool = ConnectionPool(db_path, max_size=max(threads, 2), in_memory=in_memory, reload_interval=0)
+    app_new.db_pool = pool
+    app_new.dimension_cache.invalidate()
+    app_new.char_facet_index.invalidate()
+    try:
+        # 预热：建立连接、加载维度表，不计入结果
+        run(search_urls[:20] + generate_urls[:20], threads)
+        results = {
+            "/api/search": run(search_urls, threads),
+            "/api/generate_calligraphy": run(generate_urls, threads),
+        }
+        return results, pool.memory_stats()
+    finally:
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较磁盘模式与内存模式数据库的接口延迟")
+    parser.add_argument("--db", help="使用已有的数据库文件（默认生成合成数据库）")
+    parser.add_argument("--glyphs", type=int, default=200000, help="合成数据库的字形数量")
+    parser.add_argument("--requests", type=int, default=500, help="每个接口的请求数")
+    parser.add_argument("--threads", type=int, default=1, help="并发请求线程数")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db
+    if db_path is None:
+        tmp_dir = tempfile.mkdtemp()
+        start = time.perf_counter()
+        db_path = make_database(os.path.join(tmp_dir, "shufadb.db"), args.glyphs)
+        print(f"已生成合成数据库: {args.glyphs} 个字形，耗时 {time.perf_counter() - start:.1f} 秒")
+
+    # 只测数据库查询：关闭内存搜索索引和后台预取
+    app_new.search_index = GlyphSearchIndex(app_new.get_db, app_new.dimension_cache, enabled=False)
+    app_new.prefetcher = PrefetchQueue(app_new._prefetch_thumbnail, workers=0)
+    search_urls, generate_urls = make_requests(args.requests, seed=7)
+
+    try:
+        print(f"数据库: {db_path}（{os.path.getsize(db_path) / 1024 / 1024:.1f}MB），"
+              f"每个接口 {args.requests} 个请求，并发 {args.threads}")
+        rows = []
+        for label, in_memory in (("磁盘", False), ("内存", True)):
+            results, memory = bench_mode(db_path, in_memory, search_urls, generate_urls, args.threads)
+            if in_memory:
+                print(f"内存副本: {memory['mb']}MB，加载耗时 {memory['last_load_time_ms']:.0f} 毫秒")
+            for endpoint, timings in results.items():
+                rows.append((endpoint, label, statistics.median(timings), percentile(timings, 99)))
+
+        print(f"{'接口':<28} {'模式':<4} {'p50(毫秒)':>10} {'p99(毫秒)':>10}")
+        for endpoint, label, p50, p99 in sorted(rows, key=lambda row: row[0], reverse=True):
+            print(f"{endpoint:<28} {label:<4} {p50:>10.2f} {p99:>10.2f}")
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
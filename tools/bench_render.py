@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+渲染后端基准测试
+
+生成一组合成的原图（模拟扫描件大小），分别用 thread 和 process 后端把它们
+缩放为导出尺寸，比较 70 字和 500 字导出的耗时。两个后端使用相同的并发度，
+thread 后端的并发由线程池提供，与导出时下载引擎的行为一致。
+
+使用方法：
+    python tools/bench_render.py
+    python tools/bench_render.py --counts 70 500 --workers 8 --source-size 1600
+"""
+
+import argparse
+import concurrent.futures
+import io
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from PIL import Image, ImageDraw
+
+from render_pool import ThreadRenderBackend, ProcessRenderBackend
+
+TARGET_SIZE = (120, 120)
+
+
+def make_sources(count, source_size, distinct):
+    """生成 distinct 张不同的 JPEG 原图，按导出顺序重复到 count 张"""
+    rng = random.Random(42)
+    sources = []
+    for i in range(distinct):
+        img = Image.new("RGB", (source_size, source_size), (245, 240, 230))
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x0, y0 = rng.randrange(source_size), rng.randrange(source_size)
+            x1, y1 = rng.randrange(source_size), rng.randrange(source_size)
+            draw.line((x0, y0, x1, y1), fill=(20, 20, 20), width=source_size // 40)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=90)
+        sources.append(out.getvalue())
+    return [sources[i % distinct] for i in range(count)]
+
+
+def run(backend, sources, workers):
+    """用 workers 个请求线程并发调用后端，返回耗时（秒）"""
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda content: backend.render(content, TARGET_SIZE), sources))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 thread 与 process 渲染后端的耗时")
+    parser.add_argument("--counts", type=int, nargs="+", default=[70, 500], help="导出字数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并发度/工作进程数")
+    parser.add_argument("--source-size", type=int, default=1200, help="原图边长（像素）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最小值")
+    args = parser.parse_args()
+
+    print(f"CPU 核数: {os.cpu_count()}，并发度: {args.workers}，原图: {args.source_size}px JPEG")
+    if (os.cpu_count() or 1) < 8:
+        print("提示: 核数少于 8，process 后端的加速比会受限")
+
+    thread_backend = ThreadRenderBackend()
+    process_backend = ProcessRenderBackend(workers=args.workers)
+    try:
+        # 预热工作进程，避免把进程启动时间计入结果
+        run(process_backend, make_sources(args.workers, 64, 1), args.workers)
+
+        print(f"{'字数':>6} {'thread(秒)':>12} {'process(秒)':>12} {'加速比':>8}")
+        for count in args.counts:
+            sources = make_sources(count, args.source_size, min(count, 50))
+            thread_time = min(run(thread_backend, sources, args.workers) for _ in range(args.repeat))
+            process_time = min(run(process_backend, sources, args.workers) for _ in range(args.repeat))
+            print(f"{count:>6} {thread_time:>12.3f} {process_time:>12.3f} {thread_time / process_time:>7.2f}x")
+    finally:
+        process_backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
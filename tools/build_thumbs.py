@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+缩略图预生成工具
+
+按ID顺序遍历 images 表，下载每张图片并缩放为若干尺寸，写入 thumb_store 的
+打包存储（thumbs.pack + thumbs.idx）。应用导出时直接从存储中读取像素，
+冷启动的导出不再需要等待源站。
+
+- 并发下载和缩放，并发数由 --workers 限制（同时受 MOTU_HTTP_PER_HOST 的每源站上限约束）
+- 每处理完一批就落盘并写入检查点（checkpoint.json），中断后再次运行会从检查点继续；
+  失败的图片ID记录在检查点中，用 --retry-failed 重试
+- 已经存在于存储中的尺寸会跳过，可以随时追加新的尺寸
+- 默认只生成应用实际读取的 120 像素（导出、预取、/thumb 和雪碧图的默认尺寸）；
+  灰度的书法图片存为 L/LA，每张 120 像素的缩略图约 14KB，RGBA 需要 56KB
+
+使用方法：
+    python tools/build_thumbs.py
+    python tools/build_thumbs.py --sizes 60 120 240 --workers 8 --batch 200  # 同时生成雪碧图的其他尺寸
+    python tools/build_thumbs.py --store cache/thumbstore --limit 1000
+    python tools/build_thumbs.py --restart   # 忽略检查点，从头检查每张图片
+    python tools/build_thumbs.py --retry-failed   # 只重试检查点中记录的失败图片
+
+同一个存储目录同一时间只能运行一个构建进程。
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到系统路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from logger import get_logger
+from http_client import ImageHttpClient
+from render_pool import decode_thumbnail, compact_mode
+from thumb_cache import PixelBuffer
+from thumb_store import ThumbStoreWriter, DEFAULT_STORE_DIR
+
+logger = get_logger()
+
+# 应用读取的默认尺寸；雪碧图和 /thumb 的 60/240 像素可以用 --sizes 追加
+DEFAULT_SIZES = [120]
+# 三个颜色通道与灰度值相差不超过这么多级时按灰度图存储
+GRAY_TOLERANCE = 4
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def load_checkpoint(store_dir):
+    path = os.path.join(store_dir, CHECKPOINT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(store_dir, checkpoint):
+    """原子地写入检查点"""
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, CHECKPOINT_FILE))
+
+
+def process_image(client, img_id, url, sizes):
+    """下载一张图片并渲染所需的各个尺寸，返回 [(尺寸, PixelBuffer), ...]"""
+    content = client.fetch(url)
+    return [(size, PixelBuffer.from_image(compact_mode(decode_thumbnail(content, size), GRAY_TOLERANCE)))
+            for size in sizes]
+
+
+def fetch_rows(conn, last_id, count, retry_ids):
+    """取下一批 (图片ID, URL)：正常构建按ID顺序，重试时取 retry_ids 中的下一批"""
+    if retry_ids is None:
+        return conn.execute(
+            "SELECT id, url FROM images WHERE id > ? ORDER BY id LIMIT ?", (last_id, count)).fetchall()
+    batch_ids = retry_ids[:count]
+    del retry_ids[:count]
+    placeholders = ", ".join("?" * len(batch_ids))
+    return conn.execute(
+        f"SELECT id, url FROM images WHERE id IN ({placeholders}) ORDER BY id", batch_ids).fetchall()
+
+
+def build_store(db_path, store_dir, sizes=None, workers=8, batch_size=200, limit=None,
+                restart=False, retry_failed=False, client=None):
+    """构建缩略图存储，返回本次运行的统计信息
+
+    retry_failed 为 True 时只重新处理检查点中记录的失败图片，不改变 last_id。
+    """
+    # 各尺寸按从小到大写入，同一张图片的记录在索引中保持递增
+    sizes = sorted((s, s) for s in (sizes or DEFAULT_SIZES))
+    own_client = client is None
+    if own_client:
+        # 原图不需要再保存一份到原图缓存
+        client = ImageHttpClient(cache_dir="")
+    writer = ThumbStoreWriter(store_dir)
+    checkpoint = {} if restart else load_checkpoint(store_dir)
+    last_id = checkpoint.get("last_id", 0)
+    failed_ids = set(checkpoint.get("failed_ids", []))
+    retry_ids = sorted(failed_ids) if retry_failed else None
+    summary = {"processed": 0, "written": 0, "skipped": 0, "failed": 0}
+    start_time = time.time()
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            while limit is None or summary["processed"] < limit:
+                if retry_ids is not None and not retry_ids:
+                    break
+                count = batch_size if limit is None else min(batch_size, limit - summary["processed"])
+                if retry_ids is not None:
+                    # 这一批重新处理；已从 images 表删除的图片不再记为失败
+                    failed_ids.difference_update(retry_ids[:count])
+                rows = fetch_rows(conn, last_id, count, retry_ids)
+                if not rows and retry_ids is None:
+                    break
+
+                futures = []
+                for img_id, url in rows:
+                    missing = [size for size in sizes if not writer.contains(img_id, size)]
+                    if not missing:
+                        summary["skipped"] += 1
+                        continue
+                    futures.append((img_id, pool.submit(process_image, client, img_id, url, missing)))
+
+                # 按ID顺序写入，pack 文件中的数据与 images 表顺序一致
+                for img_id, future in futures:
+                    try:
+                        for size, buf in future.result():
+                            writer.add(img_id, buf)
+                            summary["written"] += 1
+                    except Exception as e:
+                        logger.warning(f"处理图片ID {img_id} 失败: {e}")
+                        failed_ids.add(img_id)
+                        summary["failed"] += 1
+
+                writer.flush()
+                if retry_ids is None:
+                    last_id = rows[-1][0]
+                summary["processed"] += len(rows)
+                save_checkpoint(store_dir, {
+                    "last_id": last_id,
+                    "sizes": [s[0] for s in sizes],
+                    "failed_ids": sorted(failed_ids),
+                    "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                })
+                elapsed = time.time() - start_time
+                logger.info(f"已处理到图片ID {rows[-1][0] if rows else last_id}：本次 {summary['processed']} 张，"
+                            f"写入 {summary['written']}，失败 {summary['failed']}，耗时 {elapsed:.1f} 秒")
+    finally:
+        conn.close()
+        writer.close()
+        if own_client:
+            client.close()
+
+    summary["last_id"] = last_id
+    summary["failed_ids"] = len(failed_ids)
+    summary["elapsed"] = round(time.time() - start_time, 2)
+    return summary
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="预生成缩略图存储")
+    parser.add_argument("--db", default=os.path.join(project_root, "data", "shufadb.db"), help="数据库文件路径")
+    parser.add_argument("--store", default=os.environ.get('MOTU_THUMB_STORE_DIR') or DEFAULT_STORE_DIR,
+                        help="缩略图存储目录")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="缩略图边长（像素）")
+    parser.add_argument("--workers", type=int, default=8, help="并发下载数")
+    parser.add_argument("--batch", type=int, default=200, help="每批处理的图片数（每批写一次检查点）")
+    parser.add_argument("--limit", type=int, help="本次最多处理的图片数")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--restart", action="store_true", help="忽略检查点，从第一张图片开始检查")
+    mode.add_argument("--retry-failed", action="store_true", help="只重新处理检查点中记录的失败图片")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"数据库文件不存在: {args.db}")
+        return 1
+
+    try:
+        summary = build_store(args.db, args.store, args.sizes, args.workers, args.batch,
+                              args.limit, args.restart, args.retry_failed)
+    except KeyboardInterrupt:
+        print("\n已中断，再次运行会从最近的检查点继续")
+        return 1
+
+    print(f"完成：处理 {summary['processed']} 张图片，写入 {summary['written']} 张缩略图，"
+          f"跳过 {summary['skipped']}，失败 {summary['failed']}，耗时 {summary['elapsed']} 秒")
+    print(f"检查点：最后处理的图片ID {summary['last_id']}，待重试的失败图片 {summary['failed_ids']} 张")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,12 +15,16 @@
     --stats: 显示统计信息
     --samples: 显示示例数据
     --all: 显示所有信息（默认）
+    --explain: 对应用使用的查询执行 EXPLAIN QUERY PLAN，报告全表扫描
+    --migrate: 补充缺少的索引并执行 ANALYZE，打印迁移前后的查询耗时
 """
 
 import sqlite3
 import os
 import sys
+import time
 import argparse
+import statistics
 from datetime import datetime
 
 # 添加项目根目录到系统路径
@@ -29,6 +33,158 @@ sys.path.insert(0, project_root)
 
 from logger import get_logger
 
+# app_new.py 中发出的查询，参数名对应 DatabaseChecker.get_query_samples() 返回的示例值
+APP_QUERIES = [
+    {
+        "name": "维度表-字体",
+        "sql": "SELECT id, name FROM fonts",
+        "params": [],
+    },
+    {
+        "name": "维度表-书法家",
+        "sql": "SELECT id, name FROM authors",
+        "params": [],
+    },
+    {
+        "name": "维度表-典籍",
+        "sql": "SELECT id, title FROM books",
+        "params": [],
+    },
+    {
+        "name": "单字分面索引构建",
+        "sql": """
+            SELECT han, author_id, book_id, COUNT(*) AS n
+            FROM glyphs
+            GROUP BY han, author_id, book_id
+        """,
+        "params": [],
+    },
+    {
+        "name": "搜索-计数",
+        "sql": "SELECT COUNT(*) FROM glyphs g WHERE g.han = ?",
+        "params": ["han"],
+    },
+    {
+        "name": "搜索-按字",
+        "sql": """
+            SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
+            FROM glyphs g
+            WHERE g.han = ?
+            ORDER BY g.id LIMIT 20 OFFSET 0
+        """,
+        "params": ["han"],
+    },
+    {
+        "name": "搜索-游标分页",
+        "sql": """
+            SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
+            FROM glyphs g
+            WHERE g.han = ? AND g.id > ?
+            ORDER BY g.id LIMIT 21
+        """,
+        "params": ["han", "glyph_id"],
+    },
+    {
+        "name": "搜索-按书法家",
+        "sql": """
+            SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
+            FROM glyphs g
+            WHERE g.author_id = ?
+            ORDER BY g.id LIMIT 20 OFFSET 0
+        """,
+        "params": ["author_id"],
+    },
+    {
+        "name": "搜索-全部条件",
+        "sql": """
+            SELECT g.id, g.han, g.font_id, g.author_id, g.book_id
+            FROM glyphs g
+            WHERE g.han = ? AND g.font_id = ? AND g.author_id = ? AND g.book_id = ?
+            ORDER BY g.id LIMIT 20 OFFSET 0
+        """,
+        "params": ["han", "font_id", "author_id", "book_id"],
+    },
+    {
+        "name": "搜索分面-字体",
+        "sql": "SELECT g.font_id, COUNT(*) FROM glyphs g WHERE g.han = ? AND g.author_id = ? GROUP BY g.font_id",
+        "params": ["han", "author_id"],
+    },
+    {
+        "name": "搜索分面-书法家",
+        "sql": "SELECT g.author_id, COUNT(*) FROM glyphs g WHERE g.han = ? AND g.font_id = ? GROUP BY g.author_id",
+        "params": ["han", "font_id"],
+    },
+    {
+        "name": "搜索分面-典籍",
+        "sql": "SELECT g.book_id, COUNT(*) FROM glyphs g WHERE g.han = ? GROUP BY g.book_id",
+        "params": ["han"],
+    },
+    {
+        "name": "搜索分面-无单字条件",
+        "sql": "SELECT g.author_id, COUNT(*) FROM glyphs g WHERE g.font_id = ? GROUP BY g.author_id",
+        "params": ["font_id"],
+    },
+    {
+        "name": "单张图片",
+        "sql": "SELECT url FROM images WHERE glyph_id = ? LIMIT 1",
+        "params": ["glyph_id"],
+    },
+    {
+        "name": "缩略图-按图片ID",
+        "sql": "SELECT url FROM images WHERE id = ?",
+        "params": ["image_id"],
+    },
+    {
+        "name": "字形全部图片",
+        "sql": "SELECT url FROM images WHERE glyph_id = ?",
+        "params": ["glyph_id"],
+    },
+    {
+        "name": "批量图片",
+        "sql": "SELECT glyph_id, id, url FROM images WHERE glyph_id IN (?) ORDER BY glyph_id, id",
+        "params": ["glyph_id"],
+    },
+    {
+        "name": "集字-每字首个字形",
+        "sql": """
+            SELECT id, han, font_id, author_id, book_id FROM (
+                SELECT g.id, g.han, g.font_id, g.author_id, g.book_id,
+                       ROW_NUMBER() OVER (PARTITION BY g.han ORDER BY g.id) AS rn
+                FROM glyphs g
+                WHERE g.han IN (?) AND g.author_id = ?
+            )
+            WHERE rn = 1
+        """,
+        "params": ["han", "author_id"],
+    },
+    {
+        "name": "导出-按图片ID",
+        "sql": "SELECT id, url FROM images WHERE id IN (?)",
+        "params": ["image_id"],
+    },
+]
+
+# 幂等迁移：补充 data/sql/fix_split2.sql 没有覆盖的热点查询索引
+# SQLite 的每个索引都以 rowid（即 id）结尾，glyphs(han, id) 与 glyphs(han) 等价，
+# 数据库中已有列相同的索引时不再重复创建
+INDEX_MIGRATIONS = [
+    # 按字搜索和游标分页：han 相等时按 id 顺序读取，无需临时排序
+    ("idx_glyphs_han_id", "glyphs", ("han", "id"),
+     "CREATE INDEX IF NOT EXISTS idx_glyphs_han_id ON glyphs(han, id)"),
+    # 按典籍筛选，fix_split2.sql 只为字体和书法家建了索引
+    ("idx_glyphs_book_cover", "glyphs", ("book_id", "id"),
+     "CREATE INDEX IF NOT EXISTS idx_glyphs_book_cover ON glyphs(book_id, id)"),
+    # 字形的图片列表只读索引，不回表
+    ("idx_images_glyph_cover", "images", ("glyph_id", "id", "url"),
+     "CREATE INDEX IF NOT EXISTS idx_images_glyph_cover ON images(glyph_id, id, url)"),
+]
+
+# 早期迁移创建、与 fix_split2.sql 的索引重复的索引，迁移时删除
+OBSOLETE_INDEXES = ["idx_glyphs_han_cover", "idx_glyphs_font_cover", "idx_glyphs_author_cover"]
+
+# 维度表只有几千行，应用启动时整表读入内存，全表扫描不算问题
+DIMENSION_TABLES = ("fonts", "authors", "books")
+
 class DatabaseChecker:
     """数据库检查器类"""
     
@@ -233,6 +389,152 @@ class DatabaseChecker:
             except Exception as e:
                 print(f"  获取示例数据失败: {e}")
 
+    def get_query_samples(self):
+        """获取用于执行查询计划和计时的示例参数"""
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT g.id AS glyph_id, g.han, g.font_id, g.author_id, g.book_id,
+                       f.name AS font, a.name AS author, b.title AS book
+                FROM glyphs g
+                JOIN fonts f ON g.font_id = f.id
+                JOIN authors a ON g.author_id = a.id
+                JOIN books b ON g.book_id = b.id
+                WHERE g.id IN (SELECT glyph_id FROM images)
+                LIMIT 1
+            """).fetchone()
+            image_row = conn.execute("SELECT id FROM images LIMIT 1").fetchone()
+
+        samples = dict(row) if row else {"glyph_id": 0, "han": "", "font_id": 0, "author_id": 0, "book_id": 0,
+                                         "font": "", "author": "", "book": ""}
+        samples["image_id"] = image_row["id"] if image_row else 0
+        return samples
+
+    def explain_query(self, conn, sql, params):
+        """返回查询计划中每一步的描述"""
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        return [row["detail"] for row in rows]
+
+    @staticmethod
+    def find_full_scans(plan):
+        """找出查询计划中的全表扫描和临时排序"""
+        problems = []
+        for detail in plan:
+            if detail.startswith("SCAN (") or detail.startswith("SCAN CONSTANT ROW"):
+                # 子查询结果和常量行的扫描不涉及表数据
+                continue
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                if detail.split()[1] in DIMENSION_TABLES:
+                    continue
+                problems.append(detail)
+            elif "USE TEMP B-TREE" in detail:
+                problems.append(detail)
+        return problems
+
+    def time_query(self, conn, sql, params, repeat=5):
+        """多次执行查询，返回耗时中位数（毫秒）"""
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            durations.append((time.perf_counter() - start) * 1000)
+        return statistics.median(durations)
+
+    def analyze_queries(self, repeat=5):
+        """对所有应用查询执行查询计划分析和计时"""
+        samples = self.get_query_samples()
+        report = []
+        with self.get_connection() as conn:
+            for query in APP_QUERIES:
+                params = [samples[name] for name in query["params"]]
+                plan = self.explain_query(conn, query["sql"], params)
+                report.append({
+                    "name": query["name"],
+                    "plan": plan,
+                    "full_scans": self.find_full_scans(plan),
+                    "time_ms": self.time_query(conn, query["sql"], params, repeat),
+                })
+        return report
+
+    def check_query_plans(self, repeat=5):
+        """打印所有应用查询的查询计划"""
+        print("=" * 60)
+        print("查询计划分析")
+        print("=" * 60)
+
+        report = self.analyze_queries(repeat)
+        scan_count = 0
+        for item in report:
+            mark = "✗" if item["full_scans"] else "✓"
+            print(f"\n{mark} {item['name']} ({item['time_ms']:.3f} ms)")
+            for detail in item["plan"]:
+                print(f"    {detail}")
+            for detail in item["full_scans"]:
+                scan_count += 1
+                print(f"    ⚠ 全表扫描/临时排序: {detail}")
+
+        print("-" * 30)
+        print(f"共分析 {len(report)} 条查询，发现 {scan_count} 处全表扫描或临时排序")
+        return report
+
+    @staticmethod
+    def get_index_columns(conn, table):
+        """返回表上每个索引的列，末尾的 id 即 rowid，统一去掉"""
+        columns = {}
+        for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+            names = tuple(row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})").fetchall())
+            columns[index[1]] = names[:-1] if names and names[-1] == "id" else names
+        return columns
+
+    def apply_index_migration(self):
+        """删除重复的旧索引，创建缺少的索引并更新统计信息，可以重复执行"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for name in OBSOLETE_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            created = []
+            for name, table, columns, sql in INDEX_MIGRATIONS:
+                wanted = columns[:-1] if columns[-1] == "id" else columns
+                existing = self.get_index_columns(conn, table)
+                if name in existing or wanted in existing.values():
+                    continue
+                self.logger.info(f"创建索引: {name}")
+                conn.execute(sql)
+                created.append(name)
+            conn.execute("ANALYZE")
+            conn.commit()
+            # 只读连接无法切换日志模式，在这里为数据库设置一次 WAL
+            journal_mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        finally:
+            conn.close()
+        return created, journal_mode
+
+    def migrate(self, repeat=5):
+        """执行索引迁移，打印迁移前后的查询耗时对比"""
+        print("=" * 60)
+        print("索引迁移")
+        print("=" * 60)
+
+        before = {item["name"]: item for item in self.analyze_queries(repeat)}
+        start = time.perf_counter()
+        created, journal_mode = self.apply_index_migration()
+        migrate_time = time.perf_counter() - start
+        after = self.analyze_queries(repeat)
+
+        if created:
+            print(f"新建索引: {', '.join(created)}")
+        else:
+            print("所有索引已存在，无需创建")
+        print(f"迁移耗时: {migrate_time:.2f} 秒，日志模式: {journal_mode}")
+        print()
+
+        print(f"  {'查询':<16} {'迁移前(ms)':>12} {'迁移后(ms)':>12} {'加速':>8}  全表扫描")
+        for item in after:
+            old = before[item["name"]]
+            speedup = old["time_ms"] / item["time_ms"] if item["time_ms"] > 0 else float("inf")
+            scans = f"{len(old['full_scans'])} -> {len(item['full_scans'])}"
+            print(f"  {item['name']:<16} {old['time_ms']:>12.3f} {item['time_ms']:>12.3f} {speedup:>7.1f}x  {scans}")
+        return before, after
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="书法数据库检查工具")
@@ -240,17 +542,29 @@ def main():
     parser.add_argument("--stats", action="store_true", help="显示统计信息")
     parser.add_argument("--samples", action="store_true", help="显示示例数据")
     parser.add_argument("--all", action="store_true", help="显示所有信息")
+    parser.add_argument("--explain", action="store_true", help="分析应用查询的查询计划")
+    parser.add_argument("--migrate", action="store_true", help="补充缺少的索引并对比迁移前后耗时")
+    parser.add_argument("--repeat", type=int, default=5, help="每条查询计时的执行次数")
     parser.add_argument("--db", help="指定数据库文件路径")
     
     args = parser.parse_args()
     
     # 如果没有指定任何选项，默认显示所有信息
-    if not any([args.tables, args.stats, args.samples, args.all]):
+    if not any([args.tables, args.stats, args.samples, args.all, args.explain, args.migrate]):
         args.all = True
     
     try:
         checker = DatabaseChecker(args.db)
         
+        if args.explain or args.migrate:
+            if args.explain:
+                checker.check_query_plans(args.repeat)
+            if args.migrate:
+                if args.explain:
+                    print("\n")
+                checker.migrate(args.repeat)
+            return 0
+        
         if args.all or args.stats:
             checker.check_statistics()
             